@@ -9,25 +9,15 @@ a = Analysis(
     binaries=[],
     datas=[
         ('анкеты_данные.xlsx', '.'),
-        ('Личные карточки.docx', '.'),
-        ('Согласи Кишалов.docx', '.'),
-        ('Согласие в Россгвардию.docx', '.'),
-        ('Согласие Зотов.docx', '.'),
-        ('Согласие Кишалов.docx', '.'),
-        ('Согласие Ковех.docx', '.'),
-        ('Согласие Корпачев.docx', '.'),
-        ('Согласие Премьер Саттелит.docx', '.'),
-        ('Согласие ТРАНСБЕЗОПАСНОСТЬ.docx', '.'),
-        ('Согласие Труфанов.docx', '.'),
-        ('Согласие Фалькон.docx', '.'),
-        ('Согласие Финкин.docx', '.'),
-        ('Согласие Шишкин.docx', '.'),
+        ('Шаблоны', 'Шаблоны'),
         ('repo_config.json', '.'),
         ('version.py', '.')
     ],
     hiddenimports=[
         'main_window', 'settings', 'theme_manager', 
         'license_manager', 'update_manager', 'widgets', 'version',
+        'template_cache', 'template_index', 'template_registry', 'output_ledger',
+        'render_engine', 'record_store', 'startup_profiler',
         'PyQt5', 'docxtpl', 'openpyxl'
     ],
     noarchive=False
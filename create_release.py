@@ -1,9 +1,56 @@
 # create_release.py - скрипт для создания правильных релизов
 import os
+import json
 import shutil
+import hashlib
 import zipfile
 from datetime import datetime
 
+from version import __version__
+from update_manager import is_user_data_path
+
+
+def file_sha256(path):
+    """Посчитать SHA-256 файла"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def create_release_manifest(build_dir, assets_dir):
+    """Создать manifest.json для обновления только измененных файлов.
+
+    Каждый файл сборки копируется в assets_dir под плоским именем (путь с '__' вместо '/'),
+    чтобы его можно было загрузить в assets релиза. Данные пользователя (анкеты, шаблоны,
+    лицензия, настройки) в манифест не входят - обновление не должно их заменять.
+    """
+    os.makedirs(assets_dir, exist_ok=True)
+    files = {}
+
+    for root, dirs, names in os.walk(build_dir):
+        for name in names:
+            file_path = os.path.join(root, name)
+            path = os.path.relpath(file_path, build_dir).replace(os.sep, '/')
+            if is_user_data_path(path):
+                print(f"ℹ️ Не входит в манифест (данные пользователя): {path}")
+                continue
+
+            asset_name = path.replace('/', '__')
+            shutil.copy2(file_path, os.path.join(assets_dir, asset_name))
+            files[path] = {
+                "sha256": file_sha256(file_path),
+                "size": os.path.getsize(file_path),
+                "asset": asset_name
+            }
+
+    manifest_path = os.path.join(assets_dir, "manifest.json")
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({"version": __version__, "files": files}, f, indent=2, ensure_ascii=False)
+
+    return manifest_path
+
 
 def create_release_package():
     """Создать пакет для релиза с EXE и всеми DLL"""
@@ -54,6 +101,18 @@ def create_release_package():
                 arcname = os.path.relpath(file_path, build_dir)
                 zipf.write(file_path, arcname)
 
+    # Манифест и файлы для обновления только измененных файлов
+    assets_dir = "release_assets"
+    if os.path.exists(assets_dir):
+        shutil.rmtree(assets_dir)
+    manifest_path = create_release_manifest(build_dir, assets_dir)
+    print(f"✅ Создан манифест релиза: {manifest_path}")
+
+    # Контрольные суммы архива и манифеста для проверки при скачивании
+    with open(os.path.join(assets_dir, "SHA256SUMS"), 'w', encoding='utf-8') as f:
+        f.write(f"{file_sha256(zip_filename)}  {zip_filename}\n")
+        f.write(f"{file_sha256(manifest_path)}  {os.path.basename(manifest_path)}\n")
+
     # Также копируем отдельный EXE файл для простой установки
     exe_src = os.path.join(exe_source_dir, "DocumentFiller.exe")
     exe_dst = "DocumentFiller.exe"
@@ -65,7 +124,8 @@ def create_release_package():
     print("\n📋 Для публикации релиза:")
     print(f"1. Загрузите {zip_filename} в assets релиза")
     print("2. Загрузите DocumentFiller.exe в assets релиза")
-    print("3. Убедитесь, что version_config.json содержит правильную версию")
+    print(f"3. Загрузите все файлы из папки {assets_dir} в assets релиза")
+    print("4. Убедитесь, что version_config.json содержит правильную версию")
 
     return True
 
@@ -0,0 +1,162 @@
+# documentfiller.py - пакетное создание документов из командной строки (без графического интерфейса)
+#
+# Пример:
+#   python -m documentfiller render --xlsx анкеты_данные.xlsx --templates Шаблоны
+#                                   --out документы --rows 2-500 --jobs 8
+#   python -m documentfiller templates --templates Шаблоны
+import os
+import sys
+import argparse
+import time
+
+from record_store import iter_excel_records
+from render_engine import RenderEngine, list_templates, get_template_cache_dir, get_used_fields
+
+
+# Сколько анкет передавать в пул за один раз
+CHUNK_SIZE = 50
+
+
+def get_script_dir():
+    """Получить директорию скрипта"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    else:
+        return os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_rows(rows):
+    """Разобрать диапазон строк вида '2-500', '10' или '2-'"""
+    if not rows:
+        return 2, None
+
+    if '-' in rows:
+        start, end = rows.split('-', 1)
+        return int(start) if start else 2, int(end) if end else None
+
+    return int(rows), int(rows)
+
+
+def iter_chunks(records, size):
+    """Разбить поток записей на порции"""
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_command(args):
+    """Команда render: создать документы для анкет из Excel"""
+    if not os.path.exists(args.xlsx):
+        print(f"❌ Файл анкет не найден: {args.xlsx}")
+        return 2
+
+    if not os.path.isdir(args.templates):
+        print(f"❌ Папка шаблонов не найдена: {args.templates}")
+        return 2
+
+    template_files = list_templates(args.templates)
+    if not template_files:
+        print(f"❌ Шаблоны документов не найдены в {args.templates}")
+        return 2
+
+    try:
+        min_row, max_row = parse_rows(args.rows)
+    except ValueError:
+        print(f"❌ Неверный диапазон строк: {args.rows}")
+        return 2
+
+    os.makedirs(args.out, exist_ok=True)
+
+    engine = RenderEngine(args.jobs, not args.threads, get_template_cache_dir(args.templates))
+    started = time.time()
+    records_count = 0
+    files_count = 0
+    skipped_count = 0
+    errors = []
+
+    print(f"🚀 Шаблонов: {len(template_files)}, обработчиков: {engine.max_workers}")
+
+    try:
+        records = iter_excel_records(args.xlsx, min_row, max_row)
+        for chunk in iter_chunks(records, CHUNK_SIZE):
+            summary = engine.render_records(
+                chunk, args.templates, template_files, args.out,
+                on_record_done=lambda name, files: print(f"✅ {name}: {len(files)} файлов"),
+                on_record_error=lambda name, message: print(f"❌ {name or '(без ФИО)'}: {message}"),
+                force=args.force)
+
+            records_count += summary['records']
+            files_count += summary['files']
+            skipped_count += summary['skipped']
+            errors.extend(summary['errors'])
+    finally:
+        engine.shutdown()
+
+    print(f"\n📋 Анкет: {records_count}, файлов: {files_count} (без изменений: {skipped_count}), "
+          f"ошибок: {len(errors)}, время: {time.time() - started:.1f} с")
+    return 1 if errors else 0
+
+
+def templates_command(args):
+    """Команда templates: показать, какие поля анкеты использует каждый шаблон"""
+    if not os.path.isdir(args.templates):
+        print(f"❌ Папка шаблонов не найдена: {args.templates}")
+        return 2
+
+    template_files = list_templates(args.templates)
+    if not template_files:
+        print(f"❌ Шаблоны документов не найдены в {args.templates}")
+        return 2
+
+    engine = RenderEngine(1, False, get_template_cache_dir(args.templates))
+    failed = False
+    for template_file, variables in sorted(engine.get_template_variables(args.templates, template_files).items()):
+        if variables is None:
+            failed = True
+            print(f"❌ {template_file}: шаблон не удалось разобрать")
+        else:
+            print(f"📄 {template_file}: {', '.join(get_used_fields(variables)) or '(без полей)'}")
+    return 1 if failed else 0
+
+
+def main(argv=None):
+    """Точка входа командной строки"""
+    script_dir = get_script_dir()
+
+    parser = argparse.ArgumentParser(prog="documentfiller",
+                                     description="Создание документов по шаблонам без графического интерфейса")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    render_parser = subparsers.add_parser("render", help="создать документы для анкет из Excel")
+    render_parser.add_argument("--xlsx", default=os.path.join(script_dir, "анкеты_данные.xlsx"),
+                               help="файл Excel с анкетами")
+    render_parser.add_argument("--templates", default=os.path.join(script_dir, "Шаблоны"),
+                               help="папка с шаблонами .docx")
+    render_parser.add_argument("--out", default=os.path.join(script_dir, "документы"),
+                               help="папка для созданных документов")
+    render_parser.add_argument("--rows", default="",
+                               help="диапазон строк Excel, например 2-500 (по умолчанию все)")
+    render_parser.add_argument("--jobs", type=int, default=0,
+                               help="число параллельных обработчиков (0 - по числу ядер)")
+    render_parser.add_argument("--threads", action="store_true",
+                               help="использовать потоки вместо процессов")
+    render_parser.add_argument("--force", action="store_true",
+                               help="пересоздать все документы, даже если шаблон и анкета не менялись")
+    render_parser.set_defaults(handler=render_command)
+
+    templates_parser = subparsers.add_parser("templates", help="показать поля анкеты, используемые в шаблонах")
+    templates_parser.add_argument("--templates", default=os.path.join(script_dir, "Шаблоны"),
+                                  help="папка с шаблонами .docx")
+    templates_parser.set_defaults(handler=templates_command)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -5,15 +5,258 @@ import hashlib
 import hmac  # Добавлен импорт модуля hmac
 import platform
 import uuid
-import requests
 from datetime import datetime, timedelta
 import sys
+import time
 import sqlite3
+import threading
+from contextlib import contextmanager
+from startup_profiler import get_startup_profiler
 import winreg  # Только для Windows
 
 
+# Сколько секунд результат проверки лицензии считается актуальным
+LICENSE_VERDICT_TTL = 30 * 60
+
+
+class LicenseDatabase:
+    """Соединения с базой лицензии: одно постоянное соединение на поток.
+
+    При открытии включается журнал WAL и настраиваются параметры, подготовленные запросы
+    кэшируются соединением. Изменения из нескольких запросов выполняются в одной транзакции.
+    """
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA busy_timeout=5000",
+        "PRAGMA temp_store=MEMORY",
+    )
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+
+    def connection(self):
+        """Соединение текущего потока (открывается при первом обращении)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, cached_statements=256)
+            for pragma in self.PRAGMAS:
+                try:
+                    conn.execute(pragma)
+                except sqlite3.DatabaseError as e:
+                    print(f"Не удалось применить {pragma}: {e}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def cursor(self):
+        """Курсор для чтения"""
+        return self.connection().cursor()
+
+    @contextmanager
+    def transaction(self):
+        """Курсор для изменений: фиксация при успехе, откат при ошибке"""
+        conn = self.connection()
+        cursor = conn.cursor()
+        try:
+            yield cursor
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    def close_thread_connection(self):
+        """Закрыть соединение текущего потока (вызывается рабочим потоком перед завершением)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Закрыть все открытые соединения"""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                # Соединение другого потока закроется вместе с ним
+                pass
+        self._local = threading.local()
+
+
+# Базы лицензии на весь процесс (по пути к файлу)
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def get_license_database(path):
+    """Получить общий для процесса доступ к базе лицензии"""
+    path = os.path.abspath(path)
+    with _databases_lock:
+        if path not in _databases:
+            _databases[path] = LicenseDatabase(path)
+        return _databases[path]
+
+
+class HardwareFingerprint:
+    """Идентификатор оборудования: опрос оборудования выполняется один раз на процесс.
+
+    Если задан db_path, идентификатор сохраняется в базе вместе с именем компьютера и при
+    следующих запусках берется оттуда без опроса MAC-адреса (uuid.getnode может запускать
+    внешние программы). Полный опрос в таком случае выполняет verify() - он обнаруживает
+    смену оборудования (дрейф) и обновляет сохраненное значение.
+    """
+
+    def __init__(self, secret_key, db_path=None):
+        self.secret_key = secret_key
+        self.db_path = db_path
+        self.db = get_license_database(db_path) if db_path else None
+        self.hmac_key = hashlib.sha256(f"fingerprint{secret_key}".encode()).digest()
+        self._lock = threading.Lock()
+        self._hardware_id = None
+        # Проверен ли идентификатор полным опросом оборудования в этом процессе
+        self.verified = False
+
+    def get(self):
+        """Получить идентификатор оборудования (вычисляется один раз)"""
+        hardware_id = self._hardware_id
+        if hardware_id is not None:
+            return hardware_id
+
+        with self._lock:
+            if self._hardware_id is None:
+                if self.db:
+                    self._hardware_id = self.load_persisted()
+                if self._hardware_id is None:
+                    self._hardware_id = self.compute()
+                    self.verified = True
+                    self.persist(self._hardware_id)
+            return self._hardware_id
+
+    def compute(self):
+        """Опросить оборудование и вычислить идентификатор"""
+        try:
+            # Используем комбинацию hostname и MAC-адреса
+            system_info = platform.node()  # Hostname
+
+            # MAC-адрес
+            try:
+                mac = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff)
+                                for elements in range(0, 8 * 6, 8)][::-1])
+                system_info += mac
+            except:
+                pass
+
+            # Создаем хеш
+            hardware_hash = hashlib.sha256(
+                f"{system_info}{self.secret_key}".encode()
+            ).hexdigest()[:8].upper()
+
+            return hardware_hash
+
+        except Exception as e:
+            print(f"Ошибка получения hardware_id: {e}")
+            # Резервный вариант
+            backup_info = platform.node() + platform.system() + platform.architecture()[0]
+            return hashlib.sha256(
+                f"{backup_info}{self.secret_key}".encode()
+            ).hexdigest()[:8].upper()
+
+    def signature(self, hostname, hardware_id):
+        return hmac.new(self.hmac_key, f"{hostname}|{hardware_id}".encode('utf-8'), hashlib.sha256).hexdigest()
+
+    def create_table(self):
+        with self.db.transaction() as cursor:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS hardware_fingerprint (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    hostname TEXT NOT NULL,
+                    hardware_id TEXT NOT NULL,
+                    signature TEXT NOT NULL
+                )
+            ''')
+
+    def load_persisted(self):
+        """Сохраненный идентификатор, если он подписан и записан на этом же компьютере"""
+        try:
+            self.create_table()
+            cursor = self.db.cursor()
+            cursor.execute('SELECT hostname, hardware_id, signature FROM hardware_fingerprint WHERE id = 1')
+            row = cursor.fetchone()
+
+            if not row:
+                return None
+
+            hostname, hardware_id, signature = row
+            if hostname != platform.node() or not hmac.compare_digest(signature, self.signature(hostname, hardware_id)):
+                return None
+            return hardware_id
+
+        except Exception as e:
+            print(f"Ошибка загрузки идентификатора оборудования: {e}")
+            return None
+
+    def persist(self, hardware_id):
+        """Сохранить идентификатор (если сохранение включено)"""
+        if not self.db:
+            return
+        try:
+            hostname = platform.node()
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO hardware_fingerprint (id, hostname, hardware_id, signature)
+                    VALUES (1, ?, ?, ?)
+                ''', (hostname, hardware_id, self.signature(hostname, hardware_id)))
+        except Exception as e:
+            print(f"Ошибка сохранения идентификатора оборудования: {e}")
+
+    def verify(self):
+        """Проверить сохраненный идентификатор полным опросом.
+
+        Возвращает True, если оборудование изменилось (идентификатор обновлен).
+        """
+        if self.verified:
+            return False
+
+        current = self.get()
+        actual = self.compute()
+        with self._lock:
+            self.verified = True
+            if actual == current:
+                return False
+            self._hardware_id = actual
+        self.persist(actual)
+        return True
+
+
+# Идентификаторы оборудования на весь процесс (по секретному ключу и месту сохранения)
+_fingerprints = {}
+_fingerprints_lock = threading.Lock()
+
+
+def get_hardware_fingerprint(secret_key, db_path=None):
+    """Получить общий для процесса отпечаток оборудования"""
+    with _fingerprints_lock:
+        key = (secret_key, db_path)
+        if key not in _fingerprints:
+            _fingerprints[key] = HardwareFingerprint(secret_key, db_path)
+        return _fingerprints[key]
+
+
 class LicenseManager:
-    def __init__(self, script_dir):
+    def __init__(self, script_dir, verdict_ttl=LICENSE_VERDICT_TTL):
         self.script_dir = script_dir
         self.license_path = os.path.join(script_dir, "license.db")
         self.trial_marker_path = os.path.join(script_dir, ".trial_used")
@@ -22,57 +265,96 @@ class LicenseManager:
         self.secret_key = "document_filler_secret_2024"
         self.hmac_key = b"license_hmac_protection_key_32"
 
-        # Инициализация базы данных
-        self.init_database()
+        # Кэш результата проверки лицензии (valid, days_left, message) и информации о лицензии
+        self.verdict_ttl = verdict_ttl
+        self._verdict = None
+        self._verdict_time = 0.0
+        self._license_info = None
+
+        # Онлайн-база в памяти: (url, etag, last_modified, пользователи по hardware_id)
+        self._online_db = None
 
         # Загружаем настройки из repo_config.json
         self.repo_config = self.load_repo_config()
 
+        profiler = get_startup_profiler()
+
+        # Постоянные соединения с license.db
+        with profiler.phase("LicenseManager: база данных"):
+            self.db = get_license_database(self.license_path)
+
+            # Идентификатор оборудования вычисляется один раз; по настройке persist_hardware_id
+            # он сохраняется в license.db и проверяется на смену оборудования в фоне
+            self.hardware_changed = False
+            self.fingerprint = get_hardware_fingerprint(
+                self.secret_key, self.license_path if self.repo_config.get("persist_hardware_id") else None)
+
+            # Инициализация базы данных
+            self.init_database()
+
         # URL онлайн-базы лицензий из repo_config.json
         self.online_db_url = self.repo_config.get("online_license_db_url", "")
 
         # Загружаем или создаем лицензию
-        self.license_data = self.load_or_create_license()
+        with profiler.phase("LicenseManager: загрузка лицензии"):
+            self.license_data = self.load_or_create_license()
 
     def init_database(self):
         """Инициализировать базу данных для хранения лицензии"""
         try:
-            conn = sqlite3.connect(self.license_path)
-            cursor = conn.cursor()
-
-            # Создаем таблицу лицензий
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS licenses (
-                    id INTEGER PRIMARY KEY,
-                    hardware_id TEXT NOT NULL,
-                    license_key TEXT NOT NULL,
-                    activation_date TEXT,
-                    expiration_date TEXT,
-                    license_type TEXT,
-                    features TEXT,
-                    is_trial INTEGER DEFAULT 0,
-                    is_activated INTEGER DEFAULT 0,
-                    checksum TEXT,
-                    created_date TEXT DEFAULT CURRENT_TIMESTAMP,
-                    UNIQUE(hardware_id)
-                )
-            ''')
-
-            # Создаем таблицу для отслеживания изменений
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS license_log (
-                    id INTEGER PRIMARY KEY,
-                    license_id INTEGER,
-                    action TEXT,
-                    details TEXT,
-                    timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (license_id) REFERENCES licenses (id)
-                )
-            ''')
-
-            conn.commit()
-            conn.close()
-
+            with self.db.transaction() as cursor:
+                # Создаем таблицу лицензий
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS licenses (
+                        id INTEGER PRIMARY KEY,
+                        hardware_id TEXT NOT NULL,
+                        license_key TEXT NOT NULL,
+                        activation_date TEXT,
+                        expiration_date TEXT,
+                        license_type TEXT,
+                        features TEXT,
+                        is_trial INTEGER DEFAULT 0,
+                        is_activated INTEGER DEFAULT 0,
+                        checksum TEXT,
+                        created_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                        UNIQUE(hardware_id)
+                    )
+                ''')
+
+                # Создаем таблицу для отслеживания изменений
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS license_log (
+                        id INTEGER PRIMARY KEY,
+                        license_id INTEGER,
+                        action TEXT,
+                        details TEXT,
+                        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (license_id) REFERENCES licenses (id)
+                    )
+                ''')
+
+                # Копия онлайн-базы для условных запросов (ETag / Last-Modified)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS online_db_cache (
+                        url TEXT PRIMARY KEY,
+                        etag TEXT,
+                        last_modified TEXT,
+                        body BLOB,
+                        fetched_at TEXT
+                    )
+                ''')
+
+                # Последний результат онлайн-проверки
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS online_verdict (
+                        hardware_id TEXT PRIMARY KEY,
+                        checked_at TEXT NOT NULL,
+                        is_valid INTEGER NOT NULL,
+                        days_left INTEGER NOT NULL,
+                        message TEXT,
+                        checksum TEXT
+                    )
+                ''')
         except Exception as e:
             print(f"Ошибка инициализации базы данных: {e}")
             # Создаем резервный файл в случае ошибки
@@ -172,8 +454,7 @@ class LicenseManager:
     def load_license_from_db(self):
         """Загрузить лицензию из базы данных"""
         try:
-            conn = sqlite3.connect(self.license_path)
-            cursor = conn.cursor()
+            cursor = self.db.cursor()
 
             cursor.execute('''
                 SELECT hardware_id, license_key, activation_date, expiration_date, 
@@ -185,7 +466,6 @@ class LicenseManager:
             ''', (self.get_hardware_id(),))
 
             row = cursor.fetchone()
-            conn.close()
 
             if row:
                 # Разбираем features из строки JSON
@@ -220,58 +500,59 @@ class LicenseManager:
             data_to_hash = {k: v for k, v in license_data.items() if k != 'checksum'}
             checksum = self.generate_checksum(data_to_hash)
 
-            conn = sqlite3.connect(self.license_path)
-            cursor = conn.cursor()
-
-            # Проверяем существующую запись
-            cursor.execute('SELECT id FROM licenses WHERE hardware_id = ?',
-                           (license_data.get('hardware_id'),))
-
-            if cursor.fetchone():
-                # Обновляем существующую запись
-                cursor.execute('''
-                    UPDATE licenses 
-                    SET license_key = ?, activation_date = ?, expiration_date = ?,
-                        license_type = ?, features = ?, is_trial = ?, is_activated = ?, checksum = ?
-                    WHERE hardware_id = ?
-                ''', (
-                    license_data.get('license_key', ''),
-                    license_data.get('activation_date'),
-                    license_data.get('expiration_date'),
-                    license_data.get('type', 'trial'),
-                    json.dumps(license_data.get('features', [])),
-                    1 if license_data.get('is_trial', False) else 0,
-                    1 if license_data.get('activated', False) else 0,
-                    checksum,
-                    license_data.get('hardware_id')
-                ))
-            else:
-                # Создаем новую запись
-                cursor.execute('''
-                    INSERT INTO licenses 
-                    (hardware_id, license_key, activation_date, expiration_date, 
-                     license_type, features, is_trial, is_activated, checksum)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    license_data.get('hardware_id'),
-                    license_data.get('license_key', ''),
-                    license_data.get('activation_date'),
-                    license_data.get('expiration_date'),
-                    license_data.get('type', 'trial'),
-                    json.dumps(license_data.get('features', [])),
-                    1 if license_data.get('is_trial', False) else 0,
-                    1 if license_data.get('activated', False) else 0,
-                    checksum
-                ))
-
-            # Логируем действие
-            license_id = cursor.lastrowid
-            self.log_license_action_db(cursor, license_id, "save",
-                                       f"Сохранена лицензия типа: {license_data.get('type')}")
+            with self.db.transaction() as cursor:
+                # Проверяем существующую запись
+                cursor.execute('SELECT id FROM licenses WHERE hardware_id = ?',
+                               (license_data.get('hardware_id'),))
+
+                if cursor.fetchone():
+                    # Обновляем существующую запись
+                    cursor.execute('''
+                        UPDATE licenses 
+                        SET license_key = ?, activation_date = ?, expiration_date = ?,
+                            license_type = ?, features = ?, is_trial = ?, is_activated = ?, checksum = ?
+                        WHERE hardware_id = ?
+                    ''', (
+                        license_data.get('license_key', ''),
+                        license_data.get('activation_date'),
+                        license_data.get('expiration_date'),
+                        license_data.get('type', 'trial'),
+                        json.dumps(license_data.get('features', [])),
+                        1 if license_data.get('is_trial', False) else 0,
+                        1 if license_data.get('activated', False) else 0,
+                        checksum,
+                        license_data.get('hardware_id')
+                    ))
+                else:
+                    # Создаем новую запись
+                    cursor.execute('''
+                        INSERT INTO licenses 
+                        (hardware_id, license_key, activation_date, expiration_date, 
+                         license_type, features, is_trial, is_activated, checksum)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        license_data.get('hardware_id'),
+                        license_data.get('license_key', ''),
+                        license_data.get('activation_date'),
+                        license_data.get('expiration_date'),
+                        license_data.get('type', 'trial'),
+                        json.dumps(license_data.get('features', [])),
+                        1 if license_data.get('is_trial', False) else 0,
+                        1 if license_data.get('activated', False) else 0,
+                        checksum
+                    ))
+
+                # Логируем действие
+                license_id = cursor.lastrowid
+                self.log_license_action_db(cursor, license_id, "save",
+                                           f"Сохранена лицензия типа: {license_data.get('type')}")
 
-            conn.commit()
-            conn.close()
+                # Сохраненный результат онлайн-проверки относится к прежней лицензии
+                cursor.execute('DELETE FROM online_verdict WHERE hardware_id = ?',
+                               (license_data.get('hardware_id'),))
 
+            # Данные в памяти должны проходить проверку целостности так же, как загруженные из БД
+            license_data['checksum'] = checksum
             return True
 
         except Exception as e:
@@ -316,11 +597,9 @@ class LicenseManager:
         """Проверить, был ли уже использован пробный период"""
         # Проверяем в базе данных
         try:
-            conn = sqlite3.connect(self.license_path)
-            cursor = conn.cursor()
+            cursor = self.db.cursor()
             cursor.execute('SELECT COUNT(*) FROM licenses WHERE is_trial = 1')
             count = cursor.fetchone()[0]
-            conn.close()
 
             if count > 0:
                 return True
@@ -361,33 +640,28 @@ class LicenseManager:
         """Пометить пробный период как использованный"""
         try:
             # Записываем в базу данных
-            conn = sqlite3.connect(self.license_path)
-            cursor = conn.cursor()
-
-            # Проверяем, есть ли уже запись
-            cursor.execute('SELECT id FROM licenses WHERE hardware_id = ?',
-                           (self.get_hardware_id(),))
-
-            if not cursor.fetchone():
-                # Создаем запись о trial
-                cursor.execute('''
-                    INSERT INTO licenses 
-                    (hardware_id, license_key, license_type, is_trial, is_activated)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    self.get_hardware_id(),
-                    "TRIAL_USED_MARKER",
-                    "trial_marker",
-                    1, 1
-                ))
-
-                # Логируем
-                license_id = cursor.lastrowid
-                self.log_license_action_db(cursor, license_id, "trial_marked",
-                                           "Пробный период помечен как использованный")
-
-            conn.commit()
-            conn.close()
+            with self.db.transaction() as cursor:
+                # Проверяем, есть ли уже запись
+                cursor.execute('SELECT id FROM licenses WHERE hardware_id = ?',
+                               (self.get_hardware_id(),))
+
+                if not cursor.fetchone():
+                    # Создаем запись о trial
+                    cursor.execute('''
+                        INSERT INTO licenses 
+                        (hardware_id, license_key, license_type, is_trial, is_activated)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (
+                        self.get_hardware_id(),
+                        "TRIAL_USED_MARKER",
+                        "trial_marker",
+                        1, 1
+                    ))
+
+                    # Логируем
+                    license_id = cursor.lastrowid
+                    self.log_license_action_db(cursor, license_id, "trial_marked",
+                                               "Пробный период помечен как использованный")
 
             # Дополнительно сохраняем в реестр (если Windows)
             if platform.system() == "Windows":
@@ -452,118 +726,312 @@ class LicenseManager:
             data = self.license_data
         return self.save_license_to_db(data)
 
+    def close_thread_connection(self):
+        """Закрыть соединение с license.db, открытое текущим рабочим потоком"""
+        if self.db:
+            self.db.close_thread_connection()
+
     def get_hardware_id(self):
         """Получить идентификатор оборудования"""
+        return self.fingerprint.get()
+
+    def needs_hardware_verification(self):
+        """Нужно ли проверить сохраненный идентификатор оборудования полным опросом"""
+        return not self.fingerprint.verified
+
+    def verify_hardware_id(self):
+        """Проверить, не сменилось ли оборудование (может вызываться из фонового потока)"""
+        previous = self.fingerprint.get()
+        if self.fingerprint.verify():
+            print("Обнаружено изменение оборудования")
+            self.log_license_action("hardware_drift",
+                                    f"Было: {previous}, Стало: {self.fingerprint.get()}")
+            self.hardware_changed = True
+            return True
+        return False
+
+    @staticmethod
+    def index_online_users(online_db):
+        """Пользователи онлайн-базы по hardware_id (первая активная запись для каждого)"""
+        users_by_hardware_id = {}
+        for user in online_db.get("users", []):
+            hardware_id = user.get("hardware_id")
+            if user.get("active", True) and hardware_id not in users_by_hardware_id:
+                users_by_hardware_id[hardware_id] = user
+        return users_by_hardware_id
+
+    def load_online_db_cache(self):
+        """Загрузить сохраненную копию онлайн-базы: (etag, last_modified, body) или None"""
         try:
-            # Используем комбинацию hostname и MAC-адреса
-            system_info = platform.node()  # Hostname
+            cursor = self.db.cursor()
+            cursor.execute('SELECT etag, last_modified, body FROM online_db_cache WHERE url = ?',
+                           (self.online_db_url,))
+            row = cursor.fetchone()
+            return row if row and row[2] else None
+        except Exception as e:
+            print(f"Ошибка загрузки копии онлайн-базы: {e}")
+            return None
 
-            # MAC-адрес
+    def save_online_db_cache(self, etag, last_modified, body):
+        """Сохранить копию онлайн-базы вместе с ETag и Last-Modified"""
+        try:
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO online_db_cache (url, etag, last_modified, body, fetched_at)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (self.online_db_url, etag, last_modified, sqlite3.Binary(body), datetime.now().isoformat()))
+        except Exception as e:
+            print(f"Ошибка сохранения копии онлайн-базы: {e}")
+
+    def fetch_online_users(self):
+        """Получить пользователей онлайн-базы по hardware_id.
+
+        Отправляет условный запрос: если база не изменилась (304), используется сохраненная копия.
+        Возвращает кортеж (словарь пользователей или None, сообщение).
+        """
+        online_db = self._online_db
+        if online_db is None or online_db[0] != self.online_db_url:
+            online_db = None
+            cached = self.load_online_db_cache()
+            if cached:
+                try:
+                    etag, last_modified, body = cached
+                    online_db = (self.online_db_url, etag, last_modified,
+                                 self.index_online_users(json.loads(bytes(body))))
+                except Exception as e:
+                    print(f"Копия онлайн-базы повреждена: {e}")
+
+        headers = {}
+        if online_db is not None:
+            if online_db[1]:
+                headers["If-None-Match"] = online_db[1]
+            if online_db[2]:
+                headers["If-Modified-Since"] = online_db[2]
+
+        # requests загружается только при обращении к сети, чтобы не замедлять запуск
+        import requests
+        response = requests.get(self.online_db_url, headers=headers, timeout=10)
+        if response.status_code == 304 and online_db is not None:
+            # База не изменилась
+            self._online_db = online_db
+            return online_db[3], "Онлайн-база не изменилась"
+
+        if response.status_code != 200:
+            return None, f"Ошибка доступа к онлайн-базе: {response.status_code}"
+
+        users = self.index_online_users(response.json())
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if etag or last_modified:
+            self.save_online_db_cache(etag, last_modified, response.content)
+
+        self._online_db = (self.online_db_url, etag, last_modified, users)
+        return users, "Онлайн-база загружена"
+
+    def fetch_online_user(self):
+        """Найти нашу запись в онлайн-базе.
+
+        Выполняет только сетевой запрос и не меняет данные лицензии, поэтому может вызываться
+        из фонового потока. Возвращает кортеж (запись пользователя или None, сообщение).
+        """
+        if not self.online_db_url:
+            return None, "URL онлайн-базы не настроен"
+
+        try:
+            users, message = self.fetch_online_users()
+            if users is None:
+                return None, message
+
+            # Ищем нашу лицензию по hardware_id
+            user = users.get(self.get_hardware_id())
+            if user is not None:
+                return user, "Лицензия найдена в онлайн-базе"
+
+            return None, "Лицензия не найдена в онлайн-базе"
+
+        except Exception as e:
+            return None, f"Ошибка онлайн-проверки: {str(e)}"
+
+    def apply_online_user(self, user):
+        """Обновить локальную лицензию по записи из онлайн-базы"""
+        # Проверяем срок действия
+        expires = user.get("expires")
+        if expires:
             try:
-                mac = ':'.join(['{:02x}'.format((uuid.getnode() >> elements) & 0xff)
-                                for elements in range(0, 8 * 6, 8)][::-1])
-                system_info += mac
+                expire_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
+                if datetime.now() > expire_date:
+                    return False, "Срок действия лицензии истек"
             except:
                 pass
 
-            # Создаем хеш
-            hardware_hash = hashlib.sha256(
-                f"{system_info}{self.secret_key}".encode()
-            ).hexdigest()[:8].upper()
-
-            return hardware_hash
+        # Лицензия действительна - обновляем локальные данные
+        self.license_data.update({
+            "activated": True,
+            "license_key": "ONLINE_VALID",
+            "activation_date": datetime.now().isoformat(),
+            "expiration_date": expires or "",
+            "type": user.get("license_type", "premium"),
+            "features": ["basic", "premium"],
+            "hardware_id": self.get_hardware_id(),
+            "is_trial": False,
+            "online_valid": True,
+            "last_online_check": datetime.now().isoformat(),
+            "user_info": {
+                "name": user.get("name"),
+                "email": user.get("email"),
+                "phone": user.get("phone")
+            }
+        })
 
-        except Exception as e:
-            print(f"Ошибка получения hardware_id: {e}")
-            # Резервный вариант
-            backup_info = platform.node() + platform.system() + platform.architecture()[0]
-            return hashlib.sha256(
-                f"{backup_info}{self.secret_key}".encode()
-            ).hexdigest()[:8].upper()
+        self.save_license()
+        return True, "Онлайн-лицензия активна"
 
     def check_online_license(self):
         """Проверить лицензию в онлайн-базе"""
-        if not self.online_db_url:
-            return False, "URL онлайн-базы не настроен"
+        user, message = self.fetch_online_user()
+        if user is None:
+            return False, message
+        return self.apply_online_user(user)
+
+    def get_online_days_left(self):
+        """Оставшиеся дни онлайн-лицензии (999 - бессрочная)"""
+        expires = self.license_data.get("expiration_date")
+        if expires:
+            try:
+                expire_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
+                days_left = (expire_date - datetime.now()).days
+                if days_left < 0:
+                    days_left = 0
+            except:
+                days_left = 999  # Бессрочная
+        else:
+            days_left = 999  # Бессрочная
+        return days_left
+
+    def complete_online_check(self, user, message):
+        """Завершить проверку по результату fetch_online_user (при неудаче - оффлайн-проверка)"""
+        if self.hardware_changed:
+            # Оборудование сменилось - лицензию загружаем заново для нового идентификатора
+            self.hardware_changed = False
+            self.license_data = self.load_or_create_license()
+            self.invalidate_verdict()
+
+        if user is not None:
+            online_success, message = self.apply_online_user(user)
+            if online_success:
+                # Онлайн-лицензия действительна
+                print("Лицензия проверена онлайн")
+                verdict = (True, self.get_online_days_left(), message)
+                self.remember_verdict(verdict)
+                self.save_online_verdict(verdict)
+                return verdict
+
+        # Онлайн-проверка не удалась, используем оффлайн
+        print(f"Онлайн-проверка не удалась: {message}")
+        verdict = self.check_offline_license()
+        self.remember_verdict(verdict)
+        return verdict
 
+    def check_license(self):
+        """Проверить лицензию (сначала онлайн, потом оффлайн).
+
+        Пока результат предыдущей проверки не устарел, возвращается он.
+        """
+        verdict = self.get_cached_verdict()
+        if verdict is not None:
+            return verdict
+
+        user, message = self.fetch_online_user()
+        return self.complete_online_check(user, message)
+
+    def remember_verdict(self, verdict):
+        """Запомнить результат проверки лицензии на время verdict_ttl"""
+        self._verdict = verdict
+        self._verdict_time = time.monotonic()
+        self._license_info = None
+
+    def get_cached_verdict(self):
+        """Запомненный результат проверки, если он еще не устарел"""
+        if self._verdict is not None and time.monotonic() - self._verdict_time < self.verdict_ttl:
+            return self._verdict
+        return None
+
+    def invalidate_verdict(self):
+        """Сбросить запомненный результат проверки"""
+        self._verdict = None
+        self._license_info = None
+
+    def save_online_verdict(self, verdict):
+        """Сохранить результат онлайн-проверки в базу лицензии"""
         try:
-            # Пытаемся скачать онлайн-базу
-            response = requests.get(self.online_db_url, timeout=10)
-            if response.status_code == 200:
-                online_db = response.json()
-                users = online_db.get("users", [])
-
-                # Ищем нашу лицензию по hardware_id
-                hardware_id = self.get_hardware_id()
-                for user in users:
-                    if user.get("hardware_id") == hardware_id and user.get("active", True):
-                        # Проверяем срок действия
-                        expires = user.get("expires")
-                        if expires:
-                            try:
-                                expire_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
-                                if datetime.now() > expire_date:
-                                    return False, "Срок действия лицензии истек"
-                            except:
-                                pass
-
-                        # Лицензия действительна - обновляем локальные данные
-                        self.license_data.update({
-                            "activated": True,
-                            "license_key": "ONLINE_VALID",
-                            "activation_date": datetime.now().isoformat(),
-                            "expiration_date": expires or "",
-                            "type": user.get("license_type", "premium"),
-                            "features": ["basic", "premium"],
-                            "hardware_id": hardware_id,
-                            "is_trial": False,
-                            "online_valid": True,
-                            "last_online_check": datetime.now().isoformat(),
-                            "user_info": {
-                                "name": user.get("name"),
-                                "email": user.get("email"),
-                                "phone": user.get("phone")
-                            }
-                        })
-
-                        self.save_license()
-                        return True, "Онлайн-лицензия активна"
-
-                return False, "Лицензия не найдена в онлайн-базе"
-            else:
-                return False, f"Ошибка доступа к онлайн-базе: {response.status_code}"
+            is_valid, days_left, message = verdict
+            data = {
+                "hardware_id": self.get_hardware_id(),
+                "checked_at": datetime.now().isoformat(),
+                "is_valid": bool(is_valid),
+                "days_left": int(days_left),
+                "message": message
+            }
 
+            with self.db.transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO online_verdict
+                    (hardware_id, checked_at, is_valid, days_left, message, checksum)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (data["hardware_id"], data["checked_at"], 1 if data["is_valid"] else 0,
+                      data["days_left"], data["message"], self.generate_checksum(data)))
         except Exception as e:
-            return False, f"Ошибка онлайн-проверки: {str(e)}"
+            print(f"Ошибка сохранения результата онлайн-проверки: {e}")
 
-    def check_license(self):
-        """Проверить лицензию (сначала онлайн, потом оффлайн)"""
-        # Сначала пробуем онлайн-проверку
-        online_success, online_message = self.check_online_license()
+    def load_online_verdict(self):
+        """Загрузить сохраненный результат онлайн-проверки, если он не устарел и не изменен"""
+        try:
+            cursor = self.db.cursor()
+            cursor.execute('''
+                SELECT hardware_id, checked_at, is_valid, days_left, message, checksum
+                FROM online_verdict
+                WHERE hardware_id = ?
+            ''', (self.get_hardware_id(),))
+            row = cursor.fetchone()
 
-        if online_success:
-            # Онлайн-лицензия действительна
-            print("Лицензия проверена онлайн")
+            if not row:
+                return None
 
-            # Вычисляем оставшиеся дни
-            expires = self.license_data.get("expiration_date")
-            if expires:
-                try:
-                    expire_date = datetime.fromisoformat(expires.replace('Z', '+00:00'))
-                    days_left = (expire_date - datetime.now()).days
-                    if days_left < 0:
-                        days_left = 0
-                except:
-                    days_left = 999  # Бессрочная
-            else:
-                days_left = 999  # Бессрочная
+            data = {
+                "hardware_id": row[0],
+                "checked_at": row[1],
+                "is_valid": bool(row[2]),
+                "days_left": row[3],
+                "message": row[4]
+            }
+            if not row[5] or not self.verify_checksum(data, row[5]):
+                print("⚠️ Сохраненный результат онлайн-проверки изменен")
+                return None
 
-            return True, days_left, online_message
+            age = datetime.now() - datetime.fromisoformat(data["checked_at"])
+            if age.total_seconds() < 0 or age.total_seconds() >= self.verdict_ttl:
+                return None
 
-        else:
-            # Онлайн-проверка не удалась, используем оффлайн
-            print(f"Онлайн-проверка не удалась: {online_message}")
-            return self.check_offline_license()
+            return data["is_valid"], data["days_left"], data["message"]
+
+        except Exception as e:
+            print(f"Ошибка загрузки результата онлайн-проверки: {e}")
+            return None
+
+    def get_startup_verdict(self):
+        """Результат проверки без обращения к сети.
+
+        Берется сохраненный результат онлайн-проверки, если он не устарел, иначе выполняется
+        оффлайн-проверка. Возвращает кортеж (результат, нужна ли онлайн-проверка).
+        """
+        verdict = self.load_online_verdict()
+        if verdict is not None:
+            self.remember_verdict(verdict)
+            return verdict, False
+
+        verdict = self.check_offline_license()
+        self.remember_verdict(verdict)
+        return verdict, bool(self.online_db_url)
 
     def check_offline_license(self):
         """Проверить оффлайн-лицензию с защитой"""
@@ -742,6 +1210,9 @@ class LicenseManager:
 
             # Сохраняем с защитой
             success = self.save_license_to_db(self.license_data)
+
+            # Прежний результат проверки больше не действует
+            self.invalidate_verdict()
             if success:
                 return True, f"Лицензия успешно активирована на {license_info['days']} дней"
             else:
@@ -759,14 +1230,32 @@ class LicenseManager:
         features = self.license_data.get('features', ['basic'])
         return feature in features
 
-    def get_license_info(self):
-        """Получить информацию о лицензии с защитой"""
-        is_valid, days_left, message = self.check_license()
+    def get_license_info(self, verdict=None, online=True):
+        """Получить информацию о лицензии с защитой.
+
+        verdict - уже полученный результат проверки (valid, days_left, message). Если он не задан,
+        используется запомненный результат; при его отсутствии проверка выполняется заново
+        (при online=False - только оффлайн, без обращения к сети).
+        """
+        if verdict is None:
+            verdict = self.get_cached_verdict()
+        if verdict is None:
+            if online:
+                verdict = self.check_license()
+            else:
+                verdict = self.check_offline_license()
+                self.remember_verdict(verdict)
+
+        # Информация для того же результата проверки уже собрана
+        if self._license_info is not None and self._license_info[0] is verdict:
+            return dict(self._license_info[1])
+
+        is_valid, days_left, message = verdict
 
         # Дополнительная проверка целостности
         integrity_check = self.verify_license_integrity(self.license_data)
 
-        return {
+        info = {
             "is_valid": is_valid and integrity_check,
             "days_left": days_left,
             "message": message + (" (целостность нарушена)" if not integrity_check else ""),
@@ -778,4 +1267,6 @@ class LicenseManager:
             "hardware_id": self.get_hardware_id(),
             "integrity_check": integrity_check,
             "is_protected": True
-        }
\ No newline at end of file
+        }
+        self._license_info = (verdict, info)
+        return dict(info)
\ No newline at end of file
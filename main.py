@@ -1,6 +1,20 @@
 # main.py - ОБНОВЛЕННАЯ ВЕРСИЯ
+import time
+
+# Время запуска - для измерения времени до первой отрисовки окна
+STARTUP_STARTED = time.perf_counter()
+
 import os
 import sys
+from startup_profiler import get_startup_profiler, get_profile_mode
+
+# Профилирование запуска (--profile-startup) включается до остальных импортов, чтобы замерить и их.
+# В дочерних процессах пула (__mp_main__) профилирование не нужно
+PROFILE_MODE = get_profile_mode() if __name__ == "__main__" else None
+if PROFILE_MODE:
+    get_startup_profiler().start(STARTUP_STARTED, PROFILE_MODE)
+
+import multiprocessing
 from PyQt5.QtWidgets import QApplication
 from PyQt5.QtCore import QSettings
 from PyQt5.QtGui import QFont
@@ -8,24 +22,47 @@ from main_window import MainWindow
 from settings import Settings
 from theme_manager import ThemeManager
 
+get_startup_profiler().add_phase("Импорт модулей", STARTUP_STARTED, time.perf_counter())
+
+# Бюджет времени до первой отрисовки окна, мс
+STARTUP_BUDGET_MS = 1500
+
+
+def log_first_paint():
+    """Вывести время от запуска до первой отрисовки окна"""
+    elapsed_ms = (time.perf_counter() - STARTUP_STARTED) * 1000
+    get_startup_profiler().mark("first_paint")
+    print(f"⏱️ Окно отрисовано через {elapsed_ms:.0f} мс после запуска")
+    if elapsed_ms > STARTUP_BUDGET_MS:
+        print(f"⚠️ Превышен бюджет запуска: {elapsed_ms:.0f} мс > {STARTUP_BUDGET_MS} мс")
+
 
 def main():
     """Точка входа в приложение"""
-    app = QApplication(sys.argv)
+    profiler = get_startup_profiler()
+
+    with profiler.phase("QApplication"):
+        app = QApplication(sys.argv)
 
     # Устанавливаем глобальный шрифт для всего приложения
     font = QFont("Segoe UI", 14)  # Увеличенный шрифт
     app.setFont(font)
 
     # Загрузка настроек
-    settings = Settings()
+    with profiler.phase("Settings()"):
+        settings = Settings()
 
     # Применение темы
-    theme_manager = ThemeManager()
-    theme_manager.apply_theme(settings.get_theme())
+    with profiler.phase("ThemeManager.apply_theme"):
+        theme_manager = ThemeManager()
+        theme_manager.apply_theme(settings.get_theme())
 
     # Создание и отображение главного окна
-    window = MainWindow(settings, theme_manager)
+    with profiler.phase("MainWindow()"):
+        window = MainWindow(settings, theme_manager)
+    window.first_painted.connect(log_first_paint)
+    # Отчет о запуске сохраняется рядом с программой после загрузки данных
+    window.startup_finished.connect(lambda: profiler.finish(window.get_script_dir()))
     window.show()
 
     # Восстанавливаем геометрию окна после обновления
@@ -35,4 +72,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # Нужно для пула процессов создания документов в собранном EXE
+    multiprocessing.freeze_support()
     main()
\ No newline at end of file
@@ -4,110 +4,262 @@ import sys
 import re
 import subprocess
 import json
+import threading
 from datetime import datetime
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
                              QLabel, QLineEdit, QPushButton, QMessageBox, QFileDialog,
-                             QTableWidget, QTableWidgetItem, QHeaderView, QDialog,
+                             QHeaderView, QDialog,
                              QTabWidget, QTextEdit, QProgressBar, QMenu, QAction,
                              QSplitter, QFormLayout, QGroupBox, QScrollArea, QAbstractItemView,
-                             QComboBox)
+                             QComboBox, QSpinBox, QCheckBox, QApplication, QProgressDialog)
 from PyQt5.QtCore import Qt, QSettings, QThread, pyqtSignal, QTimer
 from PyQt5.QtGui import QFont, QIcon, QPalette, QColor, QCursor
 from PyQt5 import QtCore
-import openpyxl
-from docxtpl import DocxTemplate
-
 from widgets import ValidatedLineEdit, EditRecordDialog, RecordsTable
-from update_manager import UpdateManager
+from record_store import (FIELD_KEYS, STORAGE_BACKENDS, RECORDS_RESET, EXCEL_MIRROR_FILE, SQLiteRecordStore,
+                          create_record_store)
+from render_engine import RenderEngine, TEMPLATES_DIR_NAME, get_template_cache_dir, get_folder_name
+from update_manager import UpdateManager, ALREADY_UP_TO_DATE
 from license_manager import LicenseManager
+from startup_profiler import get_startup_profiler
+
+
+# Сколько шаблонов показывать для каждого незаполненного поля в предупреждении
+MISSING_FIELDS_TEMPLATES = 3
 
 
 class DocumentWorker(QThread):
-    """Поток для создания документов"""
+    """Поток для создания документов.
+
+    С check_missing_fields сначала проверяет, какие используемые в шаблонах поля не заполнены:
+    если такие есть, документы не создаются, а поля передаются сигналом missing_fields.
+    """
     progress = pyqtSignal(int)
-    finished = pyqtSignal(list)
+    finished = pyqtSignal(list, int)
+    missing_fields = pyqtSignal(dict)
     error = pyqtSignal(str)
 
-    def __init__(self, save_root, fields, application_path):
+    def __init__(self, save_root, fields, templates_dir, render_engine=None, check_missing_fields=False):
         super().__init__()
         self.save_root = save_root
         self.fields = fields
-        self.application_path = application_path
+        self.templates_dir = templates_dir
+        self.render_engine = render_engine or RenderEngine(max_workers=1)
+        self.check_missing_fields = check_missing_fields
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Прервать создание документов после текущего файла"""
+        self.cancel_event.set()
 
     def run(self):
         try:
-            created_files = []
+            templates_dir = self.templates_dir
+
+            # Проверяем, есть ли шаблоны (список папки хранится в памяти)
+            template_files = self.render_engine.get_template_registry(templates_dir).get_templates()
+            if not template_files:
+                self.error.emit(f"Шаблоны документов не найдены в папке {templates_dir}")
+                return
 
-            # Создаем папку для документов
-            folder_name = f"{self.fields.get('n', '')} {self.fields.get('fn', '')} {self.fields.get('mn', '')}".strip()
-            folder_path = os.path.join(self.save_root, folder_name)
-            os.makedirs(folder_path, exist_ok=True)
+            # Разбор шаблонов для проверки полей - долгий при первом запуске, поэтому здесь, а не в GUI
+            if self.check_missing_fields:
+                missing = self.find_missing_fields(templates_dir, template_files)
+                if missing:
+                    self.missing_fields.emit(missing)
+                    return
 
-            # Путь к шаблонам
-            templates_dir = self.application_path
+            # Рендерим шаблоны параллельно, прогресс - по мере готовности каждого файла.
+            # Документы, для которых не изменились ни шаблон, ни поля анкеты, не пересоздаются
+            self.progress.emit(0)
+            summary = self.render_engine.render_records(
+                [self.fields], templates_dir, template_files, self.save_root,
+                on_progress=lambda done, total: self.progress.emit(int((done / total) * 100)),
+                cancel_event=self.cancel_event)
+            if summary['cancelled']:
+                return
 
-            # Проверяем, есть ли шаблоны
-            template_files = [f for f in os.listdir(templates_dir) if f.endswith('.docx')]
-            if not template_files:
-                self.error.emit("Шаблоны документов не найдены")
+            if summary['errors']:
+                self.error.emit(summary['errors'][0][1])
                 return
 
-            total = len(template_files)
-            for i, template_file in enumerate(template_files):
-                self.progress.emit(int((i / total) * 100))
+            created_files = [os.path.join(self.save_root, get_folder_name(self.fields), template_file)
+                             for template_file in template_files]
+            self.progress.emit(100)
+            self.finished.emit(created_files, summary['skipped'])
+
+        except Exception as e:
+            self.error.emit(str(e))
+
+    def find_missing_fields(self, templates_dir, template_files):
+        """Незаполненные поля, которые используются в шаблонах (ошибка проверки не мешает созданию)"""
+        try:
+            return self.render_engine.find_missing_fields(templates_dir, template_files, self.fields)
+        except Exception as e:
+            print(f"Ошибка проверки полей шаблонов: {e}")
+            return {}
 
-                template_path = os.path.join(templates_dir, template_file)
 
-                # Загружаем шаблон
-                doc = DocxTemplate(template_path)
+class BatchDocumentWorker(QThread):
+    """Поток для пакетного создания документов по нескольким анкетам"""
+    progress = pyqtSignal(int)
+    record_finished = pyqtSignal(str, list)
+    record_error = pyqtSignal(str, str)
+    finished = pyqtSignal(dict)
+    error = pyqtSignal(str)
+
+    def __init__(self, save_root, records, templates_dir, render_engine=None):
+        super().__init__()
+        self.save_root = save_root
+        self.records = records
+        self.templates_dir = templates_dir
+        self.render_engine = render_engine or RenderEngine(max_workers=1)
+        self.cancel_event = threading.Event()
 
-                # Подготавливаем контекст - исправление для правильной подстановки ФИО
-                context = self.fields.copy()
-                context['current_date'] = datetime.now().strftime('%d.%m.%Y')
+    def cancel(self):
+        """Прервать создание документов после текущего файла"""
+        self.cancel_event.set()
 
-                # Добавляем поля в верхнем регистре
-                context.update({
-                    'n_c': context.get('n', '').upper(),
-                    'fn_c': context.get('fn', '').upper(),
-                    'mn_c': context.get('mn', '').upper(),
-                    'boss_c': context.get('boss', '').upper() if context.get('boss') else ''
-                })
+    def run(self):
+        try:
+            templates_dir = self.templates_dir
 
-                # Рендерим документ
-                doc.render(context)
+            template_files = self.render_engine.get_template_registry(templates_dir).get_templates()
+            if not template_files:
+                self.error.emit(f"Шаблоны документов не найдены в папке {templates_dir}")
+                return
 
-                # Сохраняем результат
-                output_file = os.path.join(folder_path, template_file)
-                doc.save(output_file)
-                created_files.append(output_file)
+            self.progress.emit(0)
+            summary = self.render_engine.render_records(
+                self.records, templates_dir, template_files, self.save_root,
+                on_progress=lambda done, total: self.progress.emit(int((done / total) * 100)),
+                on_record_done=self.record_finished.emit,
+                on_record_error=self.record_error.emit,
+                cancel_event=self.cancel_event)
 
             self.progress.emit(100)
-            self.finished.emit(created_files)
+            self.finished.emit(summary)
 
         except Exception as e:
             self.error.emit(str(e))
 
 
+class LicenseCheckWorker(QThread):
+    """Поток для онлайн-проверки лицензии и проверки смены оборудования"""
+    finished = pyqtSignal(object, str)
+
+    def __init__(self, license_manager, check_online=True):
+        super().__init__()
+        self.license_manager = license_manager
+        self.check_online = check_online
+
+    def run(self):
+        # Только опрос оборудования и сетевой запрос - данные лицензии обновляются в основном потоке
+        try:
+            self.license_manager.verify_hardware_id()
+            if self.check_online:
+                user, message = self.license_manager.fetch_online_user()
+            else:
+                user, message = None, ""
+        except Exception as e:
+            user, message = None, f"Ошибка онлайн-проверки: {str(e)}"
+        finally:
+            # Соединения с базой лицензии открываются на каждый поток - закрываем соединение этого потока
+            self.license_manager.close_thread_connection()
+        self.finished.emit(user, message)
+
+
+class UpdateCheckWorker(QThread):
+    """Поток для проверки обновлений, который можно отменить"""
+    finished = pyqtSignal(bool, object)
+
+    def __init__(self, update_manager, silent=False):
+        super().__init__()
+        self.update_manager = update_manager
+        self.silent = silent
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Отменить проверку - результат не будет отправлен"""
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            success, result = self.update_manager.check_for_updates(self.cancel_event)
+        except Exception as e:
+            success, result = False, f"Ошибка проверки обновлений: {str(e)}"
+        if not self.cancel_event.is_set():
+            self.finished.emit(success, result)
+
+
+class UpdateInstallWorker(QThread):
+    """Поток для скачивания и установки обновления"""
+    progress = pyqtSignal(object, object)
+    finished = pyqtSignal(bool, str)
+
+    def __init__(self, update_manager, update_info, geometry_file=None):
+        super().__init__()
+        self.update_manager = update_manager
+        self.update_info = update_info
+        self.geometry_file = geometry_file
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Отменить скачивание - скачанная часть сохранится для докачки"""
+        self.cancel_event.set()
+
+    def run(self):
+        try:
+            success, message = self.update_manager.download_and_install_update(
+                self.update_info, self.geometry_file, self.progress.emit, self.cancel_event)
+        except Exception as e:
+            success, message = False, f"Ошибка установки обновления: {str(e)}"
+        self.finished.emit(success, message)
+
+
 class MainWindow(QMainWindow):
     """Главное окно приложения"""
+    # Окно отрисовано первый раз - после этого загружаются данные
+    first_painted = pyqtSignal()
+    # Отложенная загрузка данных после первой отрисовки завершена
+    startup_finished = pyqtSignal()
 
     def __init__(self, settings, theme_manager):
         super().__init__()
+        self.first_paint_done = False
         self.settings = settings
         self.theme_manager = theme_manager
         self.fields = {}
-        self.records_data = []
         self.is_licensed = False
+        self.license_check_worker = None
+        self.update_check_worker = None
+        self.update_install_worker = None
+        # Потоки создания документов; движок рендеринга заменяется, только когда они не работают
+        self.worker = None
+        self.batch_worker = None
+        self.render_engine_outdated = False
+        self.update_progress_dialog = None
 
-        # Инициализация менеджеров
-        self.update_manager = UpdateManager()
-        self.license_manager = LicenseManager(self.get_script_dir())
+        profiler = get_startup_profiler()
 
-        self.init_ui()
-        self.load_settings()
+        # Инициализация менеджеров
+        with profiler.phase("UpdateManager.__init__"):
+            self.update_manager = UpdateManager()
+        with profiler.phase("LicenseManager.__init__"):
+            self.license_manager = LicenseManager(self.get_script_dir())
+        with profiler.phase("Хранилище анкет"):
+            self.record_store = self.create_record_store(self.settings.get_storage_backend())
+            self.record_store.add_listener(self.on_records_changed)
+        self.render_engine = self.create_render_engine()
+
+        with profiler.phase("MainWindow.init_ui"):
+            self.init_ui()
+        with profiler.phase("MainWindow.load_settings"):
+            self.load_settings()
 
         # Проверка лицензии
-        self.check_license_on_startup()
+        with profiler.phase("Проверка лицензии при запуске"):
+            self.check_license_on_startup()
         QTimer.singleShot(1000, self.check_for_updates_on_startup)
 
     def get_script_dir(self):
@@ -135,23 +287,29 @@ class MainWindow(QMainWindow):
         self.tab_widget.currentChanged.connect(self.on_tab_changed)
         layout.addWidget(self.tab_widget)
 
+        profiler = get_startup_profiler()
+
         # Вкладка ввода данных
-        input_tab = QWidget()
-        self.tab_widget.addTab(input_tab, "Ввод данных")
-        self.setup_input_tab(input_tab)
+        with profiler.phase("Вкладка «Ввод данных»"):
+            input_tab = QWidget()
+            self.tab_widget.addTab(input_tab, "Ввод данных")
+            self.setup_input_tab(input_tab)
 
         # Вкладка записей
-        records_tab = QWidget()
-        self.tab_widget.addTab(records_tab, "Сохраненные анкеты")
-        self.setup_records_tab(records_tab)
+        with profiler.phase("Вкладка «Сохраненные анкеты»"):
+            records_tab = QWidget()
+            self.tab_widget.addTab(records_tab, "Сохраненные анкеты")
+            self.setup_records_tab(records_tab)
 
         # Вкладка настроек
-        settings_tab = QWidget()
-        self.tab_widget.addTab(settings_tab, "Настройки")
-        self.setup_settings_tab(settings_tab)
+        with profiler.phase("Вкладка «Настройки»"):
+            settings_tab = QWidget()
+            self.tab_widget.addTab(settings_tab, "Настройки")
+            self.setup_settings_tab(settings_tab)
 
         # Создаем меню
-        self.create_menu()
+        with profiler.phase("Меню"):
+            self.create_menu()
 
     def on_tab_changed(self, index):
         """Обработчик смены вкладки"""
@@ -271,25 +429,45 @@ class MainWindow(QMainWindow):
 
         layout.addLayout(buttons_layout)
 
+        # Пакетное создание документов
+        batch_layout = QHBoxLayout()
+
+        batch_selected_btn = QPushButton("Создать документы для выбранных")
+        batch_selected_btn.setFont(QFont("Segoe UI", 14))
+        batch_selected_btn.clicked.connect(self.create_documents_for_selected)
+        batch_layout.addWidget(batch_selected_btn)
+
+        batch_all_btn = QPushButton("Создать документы для всех")
+        batch_all_btn.setFont(QFont("Segoe UI", 14))
+        batch_all_btn.clicked.connect(self.create_documents_for_all)
+        batch_layout.addWidget(batch_all_btn)
+
+        layout.addLayout(batch_layout)
+
+        self.batch_status_label = QLabel("")
+        self.batch_status_label.setFont(QFont("Segoe UI", 12))
+        self.batch_status_label.setVisible(False)
+        layout.addWidget(self.batch_status_label)
+
+        self.batch_progress_bar = QProgressBar()
+        self.batch_progress_bar.setVisible(False)
+        layout.addWidget(self.batch_progress_bar)
+
         # Таблица записей
-        self.records_table = RecordsTable(self.settings)
-        field_keys = self.get_field_keys()
-        self.records_table.setColumnCount(len(field_keys) + 1)
-        headers = [label for _, label in field_keys] + ["RowNum"]
-        self.records_table.setHorizontalHeaderLabels(headers)
+        self.records_table = RecordsTable(self.settings, self.get_field_keys())
 
         font = QFont("Segoe UI", 12)  # Немного уменьшим шрифт для таблицы
         self.records_table.horizontalHeader().setFont(font)
         self.records_table.setFont(font)
 
-        self.records_table.setColumnHidden(len(field_keys), True)
-        self.records_table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.records_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.records_table.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.records_table.setContextMenuPolicy(Qt.CustomContextMenu)
         self.records_table.customContextMenuRequested.connect(self.show_records_context_menu)
         self.records_table.doubleClicked.connect(self.load_selected_record_double_click)
 
         layout.addWidget(self.records_table)
-        self.load_records()
+        # Записи загружаются после первой отрисовки окна (см. paintEvent)
 
     def setup_settings_tab(self, parent):
         """Настройка вкладки настроек - упрощенная версия"""
@@ -312,6 +490,97 @@ class MainWindow(QMainWindow):
 
         layout.addWidget(theme_group)
 
+        # Группа создания документов
+        render_group = QGroupBox("Создание документов")
+        render_group.setFont(QFont("Segoe UI", 12))
+        render_layout = QHBoxLayout(render_group)
+
+        workers_label = QLabel("Параллельных обработчиков (0 - авто):")
+        workers_label.setFont(QFont("Segoe UI", 12))
+        render_layout.addWidget(workers_label)
+
+        self.render_workers_spin = QSpinBox()
+        self.render_workers_spin.setFont(QFont("Segoe UI", 12))
+        self.render_workers_spin.setRange(0, 64)
+        self.render_workers_spin.setValue(self.settings.get_render_workers())
+        self.render_workers_spin.valueChanged.connect(self.change_render_settings)
+        render_layout.addWidget(self.render_workers_spin)
+
+        self.render_processes_check = QCheckBox("Отдельные процессы")
+        self.render_processes_check.setFont(QFont("Segoe UI", 12))
+        self.render_processes_check.setToolTip("Рендерить шаблоны в отдельных процессах, "
+                                               "чтобы задействовать все ядра процессора")
+        self.render_processes_check.setChecked(self.settings.get_render_use_processes())
+        self.render_processes_check.toggled.connect(self.change_render_settings)
+        render_layout.addWidget(self.render_processes_check)
+        render_layout.addStretch()
+
+        layout.addWidget(render_group)
+
+        # Группа папки шаблонов
+        templates_group = QGroupBox("Шаблоны документов")
+        templates_group.setFont(QFont("Segoe UI", 12))
+        templates_layout = QHBoxLayout(templates_group)
+
+        self.templates_dir_edit = QLineEdit()
+        self.templates_dir_edit.setFont(QFont("Segoe UI", 12))
+        self.templates_dir_edit.setReadOnly(True)
+        templates_layout.addWidget(self.templates_dir_edit)
+
+        self.templates_count_label = QLabel()
+        self.templates_count_label.setFont(QFont("Segoe UI", 12))
+        templates_layout.addWidget(self.templates_count_label)
+
+        templates_browse_btn = QPushButton("Выбрать...")
+        templates_browse_btn.setFont(QFont("Segoe UI", 12))
+        templates_browse_btn.clicked.connect(self.choose_templates_dir)
+        templates_layout.addWidget(templates_browse_btn)
+
+        templates_reset_btn = QPushButton("По умолчанию")
+        templates_reset_btn.setFont(QFont("Segoe UI", 12))
+        templates_reset_btn.setToolTip(f"Папка {TEMPLATES_DIR_NAME} рядом с программой")
+        templates_reset_btn.clicked.connect(lambda: self.set_templates_dir(""))
+        templates_layout.addWidget(templates_reset_btn)
+
+        self.update_templates_info()
+        layout.addWidget(templates_group)
+
+        # Группа хранения анкет
+        storage_group = QGroupBox("Хранение анкет")
+        storage_group.setFont(QFont("Segoe UI", 12))
+        storage_layout = QHBoxLayout(storage_group)
+
+        self.storage_combo = QComboBox()
+        self.storage_combo.setFont(QFont("Segoe UI", 12))
+        for backend, label in STORAGE_BACKENDS:
+            self.storage_combo.addItem(label, backend)
+        self.storage_combo.setCurrentIndex(
+            max(0, self.storage_combo.findData(self.settings.get_storage_backend())))
+        self.storage_combo.currentIndexChanged.connect(self.change_storage_backend)
+        storage_layout.addWidget(self.storage_combo)
+
+        self.excel_mirror_check = QCheckBox("Дублировать в Excel")
+        self.excel_mirror_check.setFont(QFont("Segoe UI", 12))
+        self.excel_mirror_check.setToolTip(f"При хранении в базе SQLite обновлять {EXCEL_MIRROR_FILE} "
+                                           "после каждого изменения")
+        self.excel_mirror_check.setChecked(self.settings.get_excel_mirror())
+        self.excel_mirror_check.toggled.connect(self.change_excel_mirror)
+        storage_layout.addWidget(self.excel_mirror_check)
+
+        export_btn = QPushButton("Экспорт в Excel...")
+        export_btn.setFont(QFont("Segoe UI", 12))
+        export_btn.clicked.connect(self.export_records_to_excel)
+        storage_layout.addWidget(export_btn)
+
+        self.import_excel_btn = QPushButton("Импорт из Excel...")
+        self.import_excel_btn.setFont(QFont("Segoe UI", 12))
+        self.import_excel_btn.setToolTip("Загрузить анкеты из файла Excel в базу SQLite")
+        self.import_excel_btn.clicked.connect(self.import_records_from_excel)
+        storage_layout.addWidget(self.import_excel_btn)
+
+        self.update_storage_controls()
+        layout.addWidget(storage_group)
+
         # Группа лицензии
         license_group = QGroupBox("Лицензия")
         license_group.setFont(QFont("Segoe UI", 13))
@@ -483,26 +752,7 @@ class MainWindow(QMainWindow):
 
     def get_field_keys(self):
         """Получить ключи полей"""
-        return [
-            ('n', 'Фамилия'),
-            ('fn', 'Имя'),
-            ('mn', 'Отчество'),
-            ('reg', 'Регистрация'),
-            ('ps', 'Серия паспорта'),
-            ('pn', 'Номер паспорта'),
-            ('pi', 'Паспорт выдан'),
-            ('di', 'Дата выдачи'),
-            ('cs', 'Серия УЧО'),
-            ('cn', 'Номер УЧО'),
-            ('cd', 'Дата выдачи УЧО'),
-            ('ce', 'Срок окончания УЧО'),
-            ('msd', 'Дата выдачи мед. Справки'),
-            ('med', 'Дата окончания мед. Справки'),
-            ('ppd', 'Дата акта ПП'),
-            ('ppe', 'Дата окончания ПП'),
-            ('boss', 'Начальник охраны'),
-            ('note', 'Примечание')
-        ]
+        return list(FIELD_KEYS)
 
     def load_settings(self):
         """Загрузка настроек"""
@@ -528,20 +778,60 @@ class MainWindow(QMainWindow):
         """Получить папку для сохранения по умолчанию"""
         return os.path.join(self.get_script_dir(), "документы")
 
+    def get_templates_dir(self):
+        """Папка с шаблонами документов (из настроек или Шаблоны рядом с программой)"""
+        return self.settings.get_templates_dir() or os.path.join(self.get_script_dir(), TEMPLATES_DIR_NAME)
+
+    def is_rendering(self):
+        """Идет создание документов"""
+        return any(worker is not None and worker.isRunning() for worker in (self.worker, self.batch_worker))
+
+    def replace_render_engine(self):
+        """Пересоздать движок рендеринга по настройкам.
+
+        Пока идет создание документов, старый пул нужен потоку - замена откладывается до его завершения.
+        """
+        if self.is_rendering():
+            self.render_engine_outdated = True
+            return
+        self.render_engine_outdated = False
+        self.render_engine.shutdown()
+        self.render_engine = self.create_render_engine()
+
+    def on_render_worker_done(self, worker):
+        """Поток создания документов закончил работу - применить отложенную замену движка"""
+        # Сигнал приходит до выхода из run() - дожидаемся завершения потока
+        if isinstance(worker, QThread):
+            worker.wait()
+        if self.render_engine_outdated:
+            self.replace_render_engine()
+
+    def create_render_engine(self):
+        """Движок рендеринга по настройкам; кэш шаблонов - рядом с папкой шаблонов, как у командной строки"""
+        return RenderEngine(self.settings.get_render_workers(),
+                            self.settings.get_render_use_processes(),
+                            get_template_cache_dir(self.get_templates_dir()))
+
     def get_excel_file_path(self):
         """Получить путь к Excel файлу"""
         return os.path.join(self.get_script_dir(), "анкеты_данные.xlsx")
 
+    def get_excel_mirror_path(self):
+        """Получить путь к копии анкет из базы SQLite в Excel"""
+        return os.path.join(self.get_script_dir(), EXCEL_MIRROR_FILE)
+
+    def get_database_file_path(self):
+        """Получить путь к базе анкет SQLite"""
+        return os.path.join(self.get_script_dir(), "анкеты_данные.db")
+
+    def create_record_store(self, backend):
+        """Создать хранилище анкет выбранного типа"""
+        mirror_path = self.get_excel_mirror_path() if self.settings.get_excel_mirror() else None
+        return create_record_store(backend, self.get_excel_file_path(), self.get_database_file_path(), mirror_path)
+
     def ensure_excel_exists(self):
         """Создать файл Excel, если он не существует"""
-        excel_path = self.get_excel_file_path()
-        if not os.path.exists(excel_path):
-            wb = openpyxl.Workbook()
-            sheet = wb.active
-            # Заголовки столбцов
-            for col, (_, label) in enumerate(self.get_field_keys(), 1):
-                sheet.cell(row=1, column=col, value=label)
-            wb.save(excel_path)
+        self.record_store.ensure_exists()
 
     def get_field_values(self):
         """Получить значения всех полей"""
@@ -602,180 +892,64 @@ class MainWindow(QMainWindow):
 
     def is_cn_unique(self, cn, exclude_row=None):
         """Проверить уникальность номера УЧО"""
-        if not cn:
-            return True
-
-        excel_path = self.get_excel_file_path()
-        if not os.path.exists(excel_path):
-            return True
-
         try:
-            wb = openpyxl.load_workbook(excel_path)
-            sheet = wb.active
-
-            cn_col = None
-            for col in range(1, sheet.max_column + 1):
-                if sheet.cell(row=1, column=col).value == "Номер УЧО":
-                    cn_col = col
-                    break
-
-            if cn_col is None:
-                return True
-
-            for row in range(2, sheet.max_row + 1):
-                if exclude_row and row == exclude_row:
-                    continue
-                if str(sheet.cell(row=row, column=cn_col).value) == str(cn):
-                    return False
-
-            return True
+            return self.record_store.is_cn_unique(cn, exclude_row)
         except Exception:
             return True
 
     def find_row_by_fullname(self, values):
         """Найти строку по ФИО"""
-        excel_path = self.get_excel_file_path()
-        if not os.path.exists(excel_path):
-            return None
-
         try:
-            wb = openpyxl.load_workbook(excel_path)
-            sheet = wb.active
-
-            n_col, fn_col, mn_col = None, None, None
-            for col in range(1, sheet.max_column + 1):
-                header = sheet.cell(row=1, column=col).value
-                if header == "Фамилия":
-                    n_col = col
-                elif header == "Имя":
-                    fn_col = col
-                elif header == "Отчество":
-                    mn_col = col
-
-            if n_col is None or fn_col is None:
-                return None
-
-            for row in range(2, sheet.max_row + 1):
-                n_val = sheet.cell(row=row, column=n_col).value
-                fn_val = sheet.cell(row=row, column=fn_col).value
-                mn_val = sheet.cell(row=row, column=mn_col).value if mn_col else ""
-
-                if (str(n_val) == str(values.get('n', '')) and
-                        str(fn_val) == str(values.get('fn', '')) and
-                        str(mn_val or '') == str(values.get('mn', ''))):
-                    return row
-
-            return None
+            return self.record_store.find_row_by_fullname(values)
         except Exception:
             return None
 
     def save_to_excel(self, values):
         """Сохранить данные в Excel"""
-        try:
-            excel_path = self.get_excel_file_path()
-            self.ensure_excel_exists()
-
-            wb = openpyxl.load_workbook(excel_path)
-            sheet = wb.active
-
-            # Проверяем, существует ли уже запись (для обновления)
-            existing_row = values.get('_row_number')
-
-            if existing_row:
-                # Обновляем существующую запись
-                for col, (key, _) in enumerate(self.get_field_keys(), 1):
-                    sheet.cell(row=existing_row, column=col, value=values.get(key, ""))
-                action = "обновлена"
-            else:
-                # Проверяем, существует ли запись с таким ФИО
-                existing_row_by_name = self.find_row_by_fullname(values)
-
-                if existing_row_by_name:
-                    # Обновляем существующую запись
-                    for col, (key, _) in enumerate(self.get_field_keys(), 1):
-                        sheet.cell(row=existing_row_by_name, column=col, value=values.get(key, ""))
-                    action = "обновлена"
-                else:
-                    # Добавляем новую запись
-                    row_num = sheet.max_row + 1
-                    for col, (key, _) in enumerate(self.get_field_keys(), 1):
-                        sheet.cell(row=row_num, column=col, value=values.get(key, ""))
-                    action = "добавлена"
-
-            wb.save(excel_path)
-            return True, f"Анкета успешно {action}."
-        except Exception as e:
-            return False, f"Ошибка при сохранении: {str(e)}"
+        return self.record_store.save(values)
 
-    def get_record_by_row_number(self, row_number):
-        """Найти запись по номеру строки в Excel"""
-        for record in self.records_data:
-            if record.get('_row_number') == row_number:
-                return record
-        return None
+    def get_record_by_id(self, record_id):
+        """Найти запись таблицы по ее идентификатору"""
+        return self.records_table.get_record(record_id)
 
     def get_selected_record_data(self):
         """Получить данные выбранной записи с учетом сортировки"""
         try:
-            selected_items = self.records_table.selectedItems()
-            if not selected_items:
-                return None
-
-            # Получаем визуальную строку
-            visual_row = selected_items[0].row()
-
-            # Получаем номер строки в Excel из скрытой колонки
-            row_number_item = self.records_table.item(visual_row, len(self.get_field_keys()))
-            if not row_number_item:
+            # Первая выбранная запись в порядке отображения
+            record_ids = self.records_table.selected_record_ids()
+            if not record_ids:
                 return None
 
-            row_number = int(row_number_item.text())
-            return self.get_record_by_row_number(row_number)
+            return self.get_record_by_id(record_ids[0])
 
         except Exception as e:
             print(f"Ошибка получения выбранной записи: {e}")
             return None
 
-    def load_records(self):
-        """Загрузить записи в таблицу"""
+    def get_selected_records_data(self):
+        """Получить данные всех выбранных записей (в порядке отображения)"""
         try:
-            excel_path = self.get_excel_file_path()
-            if not os.path.exists(excel_path):
-                self.ensure_excel_exists()
-                return
-
-            wb = openpyxl.load_workbook(excel_path)
-            sheet = wb.active
+            records = []
+            for record_id in self.records_table.selected_record_ids():
+                record = self.get_record_by_id(record_id)
+                if record:
+                    records.append(record)
+            return records
 
-            # Получаем данные
-            data = []
-            for row in range(2, sheet.max_row + 1):
-                record = {'_row_number': row}
-                for col, (key, _) in enumerate(self.get_field_keys(), 1):
-                    cell_value = sheet.cell(row=row, column=col).value
-                    record[key] = str(cell_value) if cell_value is not None else ""
-                data.append(record)
-
-            self.records_data = data
-
-            # Временно отключаем сортировку для заполнения
-            self.records_table.setSortingEnabled(False)
-
-            # Заполняем таблицу + добавляем скрытую колонку с номером строки
-            self.records_table.setRowCount(len(data))
-            for row_idx, record in enumerate(data):
-                for col_idx, (key, _) in enumerate(self.get_field_keys()):
-                    item = QTableWidgetItem(record.get(key, ""))
-                    self.records_table.setItem(row_idx, col_idx, item)
+        except Exception as e:
+            print(f"Ошибка получения выбранных записей: {e}")
+            return []
 
-                # Добавляем скрытую колонку с номером строки в Excel
-                row_number_item = QTableWidgetItem(str(record['_row_number']))
-                self.records_table.setItem(row_idx, len(self.get_field_keys()), row_number_item)
+    def load_records(self):
+        """Загрузить записи в таблицу"""
+        try:
+            self.record_store.ensure_exists()
 
-            # Включаем сортировку обратно
-            self.records_table.setSortingEnabled(True)
+            # Данные берутся из памяти (Excel перечитывается только при изменении файла) или из базы.
+            # Модель хранит значения по колонкам, ячейки отрисовываются только видимые
+            self.records_table.set_records(self.record_store.get_records())
 
-            # Настраиваем ширину колонок
+            # Настраиваем ширину колонок (по первым строкам)
             self.records_table.resizeColumnsToContents()
 
             # После загрузки данных загружаем состояние таблицы
@@ -784,6 +958,17 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.warning(self, "Ошибка", f"Не удалось загрузить записи: {str(e)}")
 
+    def on_records_changed(self, changes):
+        """Применить изменения анкет из хранилища к таблице без полной перезагрузки"""
+        try:
+            if any(kind == RECORDS_RESET for kind, _ in changes):
+                self.load_records()
+            else:
+                self.records_table.apply_changes(changes, self.record_store.ROWS_SHIFT_ON_REMOVE)
+        except Exception as e:
+            print(f"Ошибка обновления таблицы записей: {e}")
+            self.load_records()
+
     def show_records_context_menu(self, position):
         """Показать контекстное меню для таблицы записей"""
         if not self.is_licensed:
@@ -797,6 +982,8 @@ class MainWindow(QMainWindow):
             load_action = menu.addAction("Загрузить в форму")
             edit_action = menu.addAction("Изменить")
             delete_action = menu.addAction("Удалить")
+            menu.addSeparator()
+            batch_action = menu.addAction("Создать документы для выбранных")
 
             action = menu.exec_(self.records_table.viewport().mapToGlobal(position))
 
@@ -806,6 +993,8 @@ class MainWindow(QMainWindow):
                 self.edit_selected_record()
             elif action == delete_action:
                 self.delete_selected_record()
+            elif action == batch_action:
+                self.create_documents_for_selected()
         except Exception as e:
             print(f"Ошибка в контекстном меню: {e}")
 
@@ -868,7 +1057,6 @@ class MainWindow(QMainWindow):
                 success, message = self.save_to_excel(new_values)
                 if success:
                     QMessageBox.information(self, "Успех", message)
-                    self.load_records()
                 else:
                     QMessageBox.critical(self, "Ошибка", message)
 
@@ -900,17 +1088,10 @@ class MainWindow(QMainWindow):
 
             if reply == QMessageBox.Yes:
                 try:
-                    excel_path = self.get_excel_file_path()
-                    wb = openpyxl.load_workbook(excel_path)
-                    sheet = wb.active
-
                     # Удаляем строку (используем сохраненный номер строки)
-                    row_to_delete = record['_row_number']
-                    sheet.delete_rows(row_to_delete)
-                    wb.save(excel_path)
+                    self.record_store.delete(record['_row_number'])
 
                     QMessageBox.information(self, "Удалено", "Запись удалена.")
-                    self.load_records()
 
                 except Exception as e:
                     QMessageBox.critical(self, "Ошибка", f"Не удалось удалить запись: {str(e)}")
@@ -932,6 +1113,34 @@ class MainWindow(QMainWindow):
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при выборе папки: {str(e)}")
 
+    def choose_templates_dir(self):
+        """Выбор папки с шаблонами документов"""
+        try:
+            path = QFileDialog.getExistingDirectory(self, "Выберите папку шаблонов", self.get_templates_dir())
+            if path:
+                self.set_templates_dir(path)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при выборе папки шаблонов: {str(e)}")
+
+    def set_templates_dir(self, path):
+        """Сохранить папку шаблонов (пустая строка - папка по умолчанию)"""
+        self.settings.set_templates_dir(path)
+
+        # У другой папки шаблонов свой кэш и манифест
+        self.replace_render_engine()
+        self.update_templates_info()
+
+    def update_templates_info(self):
+        """Показать папку шаблонов и число шаблонов в ней"""
+        templates_dir = self.get_templates_dir()
+        self.templates_dir_edit.setText(templates_dir)
+
+        registry = self.render_engine.get_template_registry(templates_dir)
+        if registry.exists():
+            self.templates_count_label.setText(f"Шаблонов: {len(registry.get_templates())}")
+        else:
+            self.templates_count_label.setText("Папка не найдена")
+
     def save_data(self):
         """Сохранить данные - с проверкой лицензии"""
         if not self.is_licensed:
@@ -954,7 +1163,6 @@ class MainWindow(QMainWindow):
             success, message = self.save_to_excel(values)
             if success:
                 QMessageBox.information(self, "Успех", message)
-                self.load_records()
             else:
                 QMessageBox.critical(self, "Ошибка", message)
         except Exception as e:
@@ -999,27 +1207,68 @@ class MainWindow(QMainWindow):
                 return
 
             # Запуск создания документов в отдельном потоке
-            self.progress_bar.setVisible(True)
-            self.worker = DocumentWorker(save_root, values, self.get_script_dir())
-            self.worker.progress.connect(self.progress_bar.setValue)
-            self.worker.finished.connect(self.on_documents_created)
-            self.worker.error.connect(self.on_documents_error)
-            self.worker.start()
+            # (с предупреждением о незаполненных полях, которые используются в шаблонах)
+            self.start_document_worker(save_root, values, check_missing_fields=True)
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при создании документов: {str(e)}")
 
-    def on_documents_created(self, created_files):
+    def start_document_worker(self, save_root, values, check_missing_fields=False):
+        """Запустить создание документов по анкете в отдельном потоке"""
+        self.progress_bar.setVisible(True)
+        self.worker = DocumentWorker(save_root, values, self.get_templates_dir(), self.render_engine,
+                                     check_missing_fields)
+        self.worker.progress.connect(self.progress_bar.setValue)
+        self.worker.finished.connect(self.on_documents_created)
+        self.worker.missing_fields.connect(self.on_missing_fields)
+        self.worker.error.connect(self.on_documents_error)
+        self.worker.start()
+
+    def on_missing_fields(self, missing):
+        """В шаблонах есть незаполненные поля - создать документы только после подтверждения"""
+        self.progress_bar.setVisible(False)
+        worker = self.sender()
+        self.on_render_worker_done(worker)
+        if self.confirm_missing_fields(missing):
+            self.start_document_worker(worker.save_root, worker.fields)
+
+    def confirm_missing_fields(self, missing):
+        """Показать незаполненные поля, которые используются в шаблонах, и спросить, продолжать ли"""
+        # Группируем по полям: одно и то же поле обычно используется во многих шаблонах
+        templates_by_field = {}
+        for template_file, keys in sorted(missing.items()):
+            for key in keys:
+                templates_by_field.setdefault(key, []).append(os.path.splitext(template_file)[0])
+
+        labels = dict(self.get_field_keys())
+        lines = []
+        for key, names in templates_by_field.items():
+            if len(names) > MISSING_FIELDS_TEMPLATES:
+                names = names[:MISSING_FIELDS_TEMPLATES] + [f"еще {len(names) - MISSING_FIELDS_TEMPLATES}"]
+            lines.append(f"• {labels.get(key, key)} ({', '.join(names)})")
+
+        reply = QMessageBox.question(
+            self,
+            "Незаполненные поля",
+            "В шаблонах используются незаполненные поля:\n\n" + "\n".join(lines) +
+            "\n\nСоздать документы с пустыми полями?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        return reply == QMessageBox.Yes
+
+    def on_documents_created(self, created_files, skipped):
         """Обработка завершения создания документов"""
         self.progress_bar.setVisible(False)
+        self.on_render_worker_done(self.sender())
 
         if created_files:
             values = self.get_field_values()
             folder_name = f"{values.get('n', '')} {values.get('fn', '')} {values.get('mn', '')}".strip()
+            unchanged = f"\nБез изменений (не пересоздавались): {skipped}" if skipped else ""
 
             QMessageBox.information(
                 self,
                 "Готово",
-                f"Создано {len(created_files)} файлов:\n\n"
+                f"Создано {len(created_files) - skipped} файлов:{unchanged}\n\n"
                 f"Папка: {folder_name}\n"
                 f"Путь: {os.path.join(self.save_path_edit.text(), folder_name)}"
             )
@@ -1033,8 +1282,112 @@ class MainWindow(QMainWindow):
     def on_documents_error(self, error_message):
         """Обработка ошибки создания документов"""
         self.progress_bar.setVisible(False)
+        self.on_render_worker_done(self.sender())
         QMessageBox.critical(self, "Ошибка", f"Ошибка при создании документов: {error_message}")
 
+    def create_documents_for_selected(self):
+        """Создать документы для выбранных анкет"""
+        if not self.is_licensed:
+            QMessageBox.warning(self, "Лицензия не активирована",
+                                "Для создания документов необходимо активировать лицензию.")
+            return
+
+        records = self.get_selected_records_data()
+        if not records:
+            QMessageBox.warning(self, "Не выбрано", "Выберите записи для создания документов.")
+            return
+
+        self.start_batch_documents(records)
+
+    def create_documents_for_all(self):
+        """Создать документы для всех сохраненных анкет"""
+        if not self.is_licensed:
+            QMessageBox.warning(self, "Лицензия не активирована",
+                                "Для создания документов необходимо активировать лицензию.")
+            return
+
+        records = self.records_table.get_records()
+        if not records:
+            QMessageBox.warning(self, "Нет записей", "Нет сохраненных анкет.")
+            return
+
+        reply = QMessageBox.question(
+            self,
+            "Пакетное создание документов",
+            f"Создать документы для всех анкет ({len(records)})?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.start_batch_documents(records)
+
+    def start_batch_documents(self, records):
+        """Запустить пакетное создание документов в отдельном потоке"""
+        try:
+            if self.batch_worker is not None and self.batch_worker.isRunning():
+                QMessageBox.warning(self, "Подождите", "Пакетное создание документов уже выполняется.")
+                return
+
+            save_root = self.save_path_edit.text() or self.get_default_save_folder()
+            if not os.path.isdir(save_root):
+                QMessageBox.critical(self, "Ошибка", "Путь сохранения некорректен.")
+                return
+
+            self.batch_done_count = 0
+            self.batch_total_count = len(records)
+
+            self.batch_progress_bar.setValue(0)
+            self.batch_progress_bar.setVisible(True)
+            self.batch_status_label.setText(f"Создание документов: 0 из {len(records)}")
+            self.batch_status_label.setVisible(True)
+
+            self.batch_worker = BatchDocumentWorker(save_root, records, self.get_templates_dir(), self.render_engine)
+            self.batch_worker.progress.connect(self.batch_progress_bar.setValue)
+            self.batch_worker.record_finished.connect(self.on_batch_record_finished)
+            self.batch_worker.record_error.connect(self.on_batch_record_error)
+            self.batch_worker.finished.connect(self.on_batch_documents_created)
+            self.batch_worker.error.connect(self.on_batch_documents_error)
+            self.batch_worker.start()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Ошибка при пакетном создании документов: {str(e)}")
+
+    def on_batch_record_finished(self, name, created_files):
+        """Документы одной анкеты из пакета готовы"""
+        self.batch_done_count += 1
+        self.batch_status_label.setText(
+            f"Создание документов: {self.batch_done_count} из {self.batch_total_count} - {name}")
+
+    def on_batch_record_error(self, name, error_message):
+        """Ошибка при создании документов одной анкеты из пакета"""
+        print(f"Ошибка создания документов для {name}: {error_message}")
+
+    def on_batch_documents_created(self, summary):
+        """Обработка завершения пакетного создания документов"""
+        self.batch_progress_bar.setVisible(False)
+        self.batch_status_label.setVisible(False)
+        self.on_render_worker_done(self.sender())
+
+        message = (f"Обработано анкет: {summary['records']}\n"
+                   f"Создано файлов: {summary['files'] - summary['skipped']}\n"
+                   f"Без изменений (не пересоздавались): {summary['skipped']}\n"
+                   f"Путь: {self.save_path_edit.text()}")
+
+        errors = summary['errors']
+        if errors:
+            details = "\n".join(f"{name or '(без ФИО)'}: {error}" for name, error in errors[:10])
+            if len(errors) > 10:
+                details += f"\n... и еще {len(errors) - 10}"
+            QMessageBox.warning(self, "Готово с ошибками",
+                                f"{message}\n\nОшибки ({len(errors)}):\n{details}")
+        else:
+            QMessageBox.information(self, "Готово", message)
+
+    def on_batch_documents_error(self, error_message):
+        """Обработка ошибки пакетного создания документов"""
+        self.batch_progress_bar.setVisible(False)
+        self.batch_status_label.setVisible(False)
+        self.on_render_worker_done(self.sender())
+        QMessageBox.critical(self, "Ошибка", f"Ошибка при пакетном создании документов: {error_message}")
+
     def open_excel(self):
         """Открыть файл Excel - с проверкой лицензии"""
         if not self.is_licensed:
@@ -1045,7 +1398,10 @@ class MainWindow(QMainWindow):
 
         try:
             excel_path = self.get_excel_file_path()
-            if not os.path.exists(excel_path):
+            if isinstance(self.record_store, SQLiteRecordStore):
+                # Анкеты хранятся в базе - открываем их актуальную выгрузку
+                self.record_store.export_to_excel(excel_path)
+            elif not os.path.exists(excel_path):
                 self.ensure_excel_exists()
 
             if not os.path.exists(excel_path):
@@ -1069,12 +1425,133 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Ошибка при смене темы: {e}")
 
+    def change_render_settings(self):
+        """Применить настройки параллельного создания документов"""
+        try:
+            workers = self.render_workers_spin.value()
+            use_processes = self.render_processes_check.isChecked()
+            self.settings.set_render_workers(workers)
+            self.settings.set_render_use_processes(use_processes)
+
+            # Старый пул останавливаем, новый будет создан при следующем запуске
+            self.replace_render_engine()
+        except Exception as e:
+            print(f"Ошибка при изменении настроек создания документов: {e}")
+
+    def update_storage_controls(self):
+        """Включить элементы, относящиеся только к хранению в SQLite"""
+        is_sqlite = isinstance(self.record_store, SQLiteRecordStore)
+        self.excel_mirror_check.setEnabled(is_sqlite)
+        self.import_excel_btn.setEnabled(is_sqlite)
+
+    def change_storage_backend(self, index):
+        """Переключить способ хранения анкет"""
+        try:
+            backend = self.storage_combo.itemData(index)
+            if backend == self.settings.get_storage_backend():
+                return
+
+            store = self.create_record_store(backend)
+
+            # При первом переходе на SQLite переносим анкеты из Excel
+            excel_path = self.get_excel_file_path()
+            if isinstance(store, SQLiteRecordStore) and store.count() == 0 and os.path.exists(excel_path):
+                reply = QMessageBox.question(
+                    self,
+                    "Перенос анкет",
+                    "База SQLite пуста. Загрузить в нее анкеты из анкеты_данные.xlsx?",
+                    QMessageBox.Yes | QMessageBox.No
+                )
+                if reply == QMessageBox.Yes:
+                    success, message = store.import_from_excel(excel_path)
+                    if success:
+                        QMessageBox.information(self, "Перенос анкет", message)
+                    else:
+                        QMessageBox.critical(self, "Ошибка", message)
+
+            self.record_store.remove_listener(self.on_records_changed)
+            if hasattr(self.record_store, 'close'):
+                self.record_store.close()
+
+            self.record_store = store
+            self.record_store.add_listener(self.on_records_changed)
+            self.settings.set_storage_backend(backend)
+            self.update_storage_controls()
+            self.load_records()
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось переключить хранилище анкет: {str(e)}")
+
+    def change_excel_mirror(self, enabled):
+        """Включить или выключить дублирование анкет в Excel"""
+        self.settings.set_excel_mirror(enabled)
+        if isinstance(self.record_store, SQLiteRecordStore):
+            self.record_store.excel_mirror_path = self.get_excel_mirror_path() if enabled else None
+            self.record_store.update_mirror()
+
+    def export_records_to_excel(self):
+        """Выгрузить анкеты в файл Excel"""
+        try:
+            path, _ = QFileDialog.getSaveFileName(self, "Экспорт анкет", self.get_excel_file_path(),
+                                                  "Excel (*.xlsx)")
+            if not path:
+                return
+
+            self.record_store.export_to_excel(path)
+            QMessageBox.information(self, "Экспорт", f"Анкеты выгружены в файл:\n{path}")
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось выгрузить анкеты: {str(e)}")
+
+    def import_records_from_excel(self):
+        """Загрузить анкеты из файла Excel в базу SQLite"""
+        try:
+            if not isinstance(self.record_store, SQLiteRecordStore):
+                return
+
+            path, _ = QFileDialog.getOpenFileName(self, "Импорт анкет", self.get_script_dir(), "Excel (*.xlsx)")
+            if not path:
+                return
+
+            # Таблица перечитывается по уведомлению хранилища
+            success, message = self.record_store.import_from_excel(path)
+            if success:
+                QMessageBox.information(self, "Импорт", message)
+            else:
+                QMessageBox.critical(self, "Ошибка", message)
+        except Exception as e:
+            QMessageBox.critical(self, "Ошибка", f"Не удалось загрузить анкеты: {str(e)}")
+
+    def start_update_check(self, silent=False):
+        """Запустить проверку обновлений в фоновом потоке"""
+        if self.update_check_worker is not None and self.update_check_worker.isRunning():
+            if silent or not self.update_check_worker.silent:
+                return
+            # Ручная проверка заменяет тихую - результат тихой больше не нужен
+            self.update_check_worker.cancel()
+
+        self.update_check_worker = UpdateCheckWorker(self.update_manager, silent)
+        self.update_check_worker.finished.connect(self.on_update_check_finished)
+        self.update_check_worker.start()
+
+    def on_update_check_finished(self, success, result):
+        """Обработать результат фоновой проверки обновлений"""
+        worker = self.sender()
+        if worker is not None and worker is not self.update_check_worker:
+            return
+
+        if worker is not None and worker.silent:
+            self.show_silent_update_result(success, result)
+        else:
+            self.show_update_check_result(success, result)
+
     def check_for_updates(self):
         """Проверить обновления - упрощенная версия"""
-        try:
-            print("Проверка обновлений...")
-            success, result = self.update_manager.check_for_updates()
+        print("Проверка обновлений...")
+        self.statusBar().showMessage("Проверка обновлений...", 3000)
+        self.start_update_check(silent=False)
 
+    def show_update_check_result(self, success, result):
+        """Показать результат ручной проверки обновлений"""
+        try:
             if success:
                 if result == "up_to_date":
                     QMessageBox.information(self, "Обновления",
@@ -1126,52 +1603,75 @@ class MainWindow(QMainWindow):
             if reply != QMessageBox.Yes:
                 return
 
-            # Создаем диалог прогресса
-            progress_dialog = QMessageBox(self)
-            progress_dialog.setWindowTitle("Установка обновления")
-            progress_dialog.setText("Выполняется установка обновления...\nПожалуйста, подождите.")
-            progress_dialog.setStandardButtons(QMessageBox.NoButton)
-            progress_dialog.show()
+            if self.update_install_worker is not None and self.update_install_worker.isRunning():
+                return
+
+            # Сначала сохраняем геометрию окна
+            geometry_file = self.save_window_geometry_for_update()
 
-            # Даем время отобразиться диалогу
-            QTimer.singleShot(100, lambda: self.perform_update_installation(update_info, progress_dialog))
+            # Создаем диалог прогресса
+            self.update_progress_dialog = QProgressDialog("Скачивание обновления...", "Отмена", 0, 100, self)
+            self.update_progress_dialog.setWindowTitle("Установка обновления")
+            self.update_progress_dialog.setWindowModality(Qt.WindowModal)
+            self.update_progress_dialog.setAutoClose(False)
+            self.update_progress_dialog.setAutoReset(False)
+            self.update_progress_dialog.setMinimumDuration(0)
+            self.update_progress_dialog.setValue(0)
+
+            # Скачивание и распаковка выполняются в отдельном потоке
+            self.update_install_worker = UpdateInstallWorker(self.update_manager, update_info, geometry_file)
+            self.update_install_worker.progress.connect(self.on_update_download_progress)
+            self.update_install_worker.finished.connect(self.on_update_installation_finished)
+            self.update_progress_dialog.canceled.connect(self.update_install_worker.cancel)
+            self.update_install_worker.start()
 
         except Exception as e:
             QMessageBox.critical(self, "Ошибка", f"Ошибка при установке обновления:\n{str(e)}")
 
-    def perform_update_installation(self, update_info, progress_dialog):
-        """Выполнить установку обновления - С СОХРАНЕНИЕМ ГЕОМЕТРИИ"""
-        try:
-            # Сначала сохраняем геометрию окна
-            geometry_file = self.save_window_geometry_for_update()
-
-            # Затем запускаем обновление
-            success, message = self.update_manager.download_and_install_update(update_info, geometry_file)
-            progress_dialog.close()
+    def on_update_download_progress(self, downloaded, total):
+        """Обновить диалог прогресса скачивания"""
+        dialog = self.update_progress_dialog
+        if dialog is None or dialog.wasCanceled():
+            return
 
-            if success:
-                QMessageBox.information(
-                    self,
-                    "Обновление запущено",
-                    "✅ Процесс обновления запущен!\n\n"
-                    "Программа закроется и будет автоматически обновлена.\n"
-                    "После обновления откроется новая версия."
-                )
+        if total:
+            dialog.setMaximum(100)
+            dialog.setValue(int(downloaded * 100 / total))
+            dialog.setLabelText(f"Скачивание обновления: {downloaded / 1048576:.1f} из {total / 1048576:.1f} МБ")
+            if downloaded >= total:
+                dialog.setLabelText("Распаковка обновления...")
+        else:
+            # Размер неизвестен - показываем бегущий индикатор
+            dialog.setMaximum(0)
+            dialog.setLabelText(f"Скачивание обновления: {downloaded / 1048576:.1f} МБ")
+
+    def on_update_installation_finished(self, success, message):
+        """Обработать завершение скачивания и установки обновления"""
+        if self.update_progress_dialog is not None:
+            self.update_progress_dialog.canceled.disconnect()
+            self.update_progress_dialog.close()
+            self.update_progress_dialog = None
+
+        if success and message == ALREADY_UP_TO_DATE:
+            QMessageBox.information(self, "Обновление", f"✅ {message}")
+        elif success:
+            QMessageBox.information(
+                self,
+                "Обновление запущено",
+                "✅ Процесс обновления запущен!\n\n"
+                "Программа закроется и будет автоматически обновлена.\n"
+                "После обновления откроется новая версия."
+            )
 
-                # Закрываем текущее приложение
-                self.close()
-            else:
-                QMessageBox.critical(
-                    self,
-                    "Ошибка установки",
-                    f"❌ Не удалось установить обновление:\n{message}"
-                )
-        except Exception as e:
-            progress_dialog.close()
+            # Закрываем текущее приложение
+            self.close()
+        elif self.update_install_worker is not None and self.update_install_worker.cancel_event.is_set():
+            print("Установка обновления отменена")
+        else:
             QMessageBox.critical(
                 self,
-                "Ошибка",
-                f"❌ Ошибка при установке обновления:\n{str(e)}"
+                "Ошибка установки",
+                f"❌ Не удалось установить обновление:\n{message}"
             )
 
     def activate_license(self):
@@ -1345,8 +1845,11 @@ class MainWindow(QMainWindow):
 
     def silent_update_check(self):
         """Тихая проверка обновлений без показа диалогов"""
+        self.start_update_check(silent=True)
+
+    def show_silent_update_result(self, success, result):
+        """Показать уведомление, только если тихая проверка нашла обновление"""
         try:
-            success, result = self.update_manager.check_for_updates()
             if success and result != "up_to_date":
                 # Показываем ненавязчивое уведомление
                 update_info = result
@@ -1365,8 +1868,10 @@ class MainWindow(QMainWindow):
                 reply = msg.exec_()
                 if reply == QMessageBox.Yes:
                     self.install_update(update_info)
+            elif not success:
+                # Игнорируем ошибки при тихой проверке
+                print(f"Тихая проверка обновлений: {result}")
         except Exception as e:
-            # Игнорируем ошибки при тихой проверке
             print(f"Тихая проверка обновлений: {e}")
 
     def lock_interface(self):
@@ -1434,38 +1939,70 @@ class MainWindow(QMainWindow):
             self.license_message_label.hide()
 
     def check_license_on_startup(self):
-        """Проверить лицензию при запуске программы"""
+        """Проверить лицензию при запуске программы.
+
+        Сразу применяется сохраненный результат онлайн-проверки или оффлайн-проверка,
+        онлайн-проверка (если нужна) выполняется в фоновом потоке.
+        """
         print("Проверка лицензии при запуске...")
 
-        # Проверяем лицензию
-        license_check = self.license_manager.check_license()
+        license_check, online_pending = self.license_manager.get_startup_verdict()
+
+        # Если онлайн-проверка еще может подтвердить лицензию, сообщение об ошибке показываем после нее
+        self.apply_license_verdict(license_check, show_error=not online_pending)
+
+        if online_pending and not license_check[0]:
+            self.license_status_label.setText("Статус: Проверка лицензии онлайн...")
+
+        if online_pending or self.license_manager.needs_hardware_verification():
+            self.license_check_worker = LicenseCheckWorker(self.license_manager, online_pending)
+            self.license_check_worker.finished.connect(self.on_online_license_checked)
+            self.license_check_worker.start()
+
+    def on_online_license_checked(self, user, message):
+        """Онлайн-проверка лицензии завершена"""
+        try:
+            if not self.license_check_worker.check_online and not self.license_manager.hardware_changed:
+                # Оборудование не изменилось - результат проверки при запуске остается в силе
+                return
+
+            license_check = self.license_manager.complete_online_check(user, message)
+            self.apply_license_verdict(license_check)
+        except Exception as e:
+            print(f"Ошибка при онлайн-проверке лицензии: {e}")
+
+    def apply_license_verdict(self, license_check, show_error=True):
+        """Применить результат проверки лицензии к интерфейсу"""
+        self.license_manager.remember_verdict(license_check)
         self.is_licensed = license_check[0]
 
         if not self.is_licensed:
             # Лицензия не действительна - блокируем программу
             self.lock_interface()
 
-            # Показываем критическое сообщение
-            QMessageBox.critical(
-                self,
-                "Лицензия не действительна",
-                f"Программа не может быть запущена.\n\nПричина: {license_check[2]}\n\n"
-                "Пожалуйста, активируйте лицензию во вкладке 'Настройки'."
-            )
+            if show_error:
+                # Показываем критическое сообщение
+                QMessageBox.critical(
+                    self,
+                    "Лицензия не действительна",
+                    f"Программа не может быть запущена.\n\nПричина: {license_check[2]}\n\n"
+                    "Пожалуйста, активируйте лицензию во вкладке 'Настройки'."
+                )
 
-            # Переходим на вкладку настроек
-            self.tab_widget.setCurrentIndex(2)
+                # Переходим на вкладку настроек
+                self.tab_widget.setCurrentIndex(2)
         else:
             # Лицензия действительна - разблокируем интерфейс
             self.unlock_interface()
 
-        # ОБНОВЛЯЕМ СТАТУС ЛИЦЕНЗИИ В ИНТЕРФЕЙСЕ ПРИ ЗАПУСКЕ
+        # ОБНОВЛЯЕМ СТАТУС ЛИЦЕНЗИИ В ИНТЕРФЕЙСЕ
         self.update_license_status()
 
     def update_license_status(self):
         """Обновить статус лицензии в интерфейсе"""
         try:
-            license_info = self.license_manager.get_license_info()
+            # Запомненный результат проверки, без обращения к сети
+            license_info = self.license_manager.get_license_info(online=False)
 
             is_valid = license_info['is_valid']
             days_left = license_info['days_left']
@@ -1499,6 +2036,26 @@ class MainWindow(QMainWindow):
         except Exception as e:
             print(f"Ошибка при обновлении статуса лицензии: {e}")
 
+    def paintEvent(self, event):
+        """Отложенная загрузка данных после первой отрисовки окна"""
+        super().paintEvent(event)
+        if not self.first_paint_done:
+            self.first_paint_done = True
+            self.first_painted.emit()
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Загрузить данные, которые не нужны для показа окна"""
+        with get_startup_profiler().phase("MainWindow.load_records"):
+            self.load_records()
+        self.startup_finished.emit()
+
+        # Скрипт обновления не смог заменить файлы при прошлом обновлении
+        update_error = self.update_manager.pop_update_error()
+        if update_error:
+            QMessageBox.warning(self, "Обновление не установлено",
+                                f"{update_error}\n\nПопробуйте установить обновление еще раз.")
+
     def closeEvent(self, event):
         """Обработка закрытия окна"""
         try:
@@ -1509,14 +2066,43 @@ class MainWindow(QMainWindow):
                 print("Сохранение состояния таблицы...")
                 self.records_table.save_state()
 
+            # Фоновая онлайн-проверка лицензии больше не нужна
+            if self.license_check_worker is not None and self.license_check_worker.isRunning():
+                self.license_check_worker.finished.disconnect()
+                self.license_check_worker.wait(2000)
+
+            # Незавершенная проверка обновлений отменяется
+            if self.update_check_worker is not None and self.update_check_worker.isRunning():
+                self.update_check_worker.cancel()
+                self.update_check_worker.finished.disconnect()
+                self.update_check_worker.wait(2000)
+
+            # Прерываем скачивание обновления - скачанная часть останется для докачки
+            if self.update_install_worker is not None and self.update_install_worker.isRunning():
+                self.update_install_worker.cancel()
+                self.update_install_worker.finished.disconnect()
+                self.update_install_worker.wait(5000)
+
+            # Прерываем создание документов - уже созданные файлы остаются, пул останавливается после потоков
+            for worker in (self.worker, self.batch_worker):
+                if worker is not None and worker.isRunning():
+                    worker.cancel()
+                    worker.blockSignals(True)
+                    worker.wait()
+
             # Сохраняем информацию о лицензии
             if hasattr(self, 'license_manager'):
-                license_info = self.license_manager.get_license_info()
+                # Используем последний результат проверки - при закрытии сеть не нужна
+                license_info = self.license_manager.get_license_info(online=False)
                 self.settings.settings.setValue("license/is_licensed", license_info['is_valid'])
                 self.settings.settings.setValue("license/type", license_info['type'])
                 self.settings.settings.setValue("license/days_left", license_info['days_left'])
                 self.settings.settings.setValue("license/is_trial", license_info.get('is_trial', False))
 
+            # Останавливаем пул процессов создания документов
+            if hasattr(self, 'render_engine'):
+                self.render_engine.shutdown()
+
             self.save_settings()
             print("Настройки успешно сохранены")
             event.accept()
@@ -0,0 +1,71 @@
+# output_ledger.py - журнал созданных документов для пересоздания только устаревших файлов
+import os
+import json
+import sqlite3
+import hashlib
+
+
+# Файл журнала в корневой папке документов
+LEDGER_FILE = ".documents_ledger.db"
+
+
+def get_inputs_hash(template_hash, context):
+    """Хэш входных данных документа: версия шаблона и значения переменных, которые он использует.
+
+    В хэш входит и метка версии рендеринга - после его изменений документы создаются заново.
+    """
+    from template_cache import get_cache_tag
+    payload = json.dumps([get_cache_tag(), template_hash, context], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class OutputLedger:
+    """Журнал созданных документов в папке save_root.
+
+    Для каждого файла хранится хэш входных данных, с которыми он создан, а также размер и время
+    изменения файла. Документ не пересоздается, пока не изменились ни шаблон, ни используемые
+    им поля анкеты, а сам файл не удален и не изменен вручную.
+    """
+
+    def __init__(self, save_root):
+        self.save_root = os.path.abspath(save_root)
+        self.db_path = os.path.join(self.save_root, LEDGER_FILE)
+        self.conn = sqlite3.connect(self.db_path)
+        self.ensure_exists()
+
+    def ensure_exists(self):
+        """Создать таблицу журнала"""
+        with self.conn:
+            self.conn.execute("CREATE TABLE IF NOT EXISTS outputs ("
+                              "path TEXT PRIMARY KEY, inputs_hash TEXT NOT NULL, "
+                              "size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL)")
+
+    def get_key(self, output_file):
+        """Путь файла относительно корневой папки - журнал не зависит от ее расположения"""
+        return os.path.relpath(os.path.abspath(output_file), self.save_root).replace(os.sep, '/')
+
+    def is_fresh(self, output_file, inputs_hash):
+        """Файл создан с теми же входными данными и с тех пор не изменялся"""
+        row = self.conn.execute("SELECT inputs_hash, size, mtime_ns FROM outputs WHERE path = ?",
+                                (self.get_key(output_file),)).fetchone()
+        if not row or row[0] != inputs_hash:
+            return False
+
+        try:
+            stat = os.stat(output_file)
+        except OSError:
+            return False
+        return row[1] == stat.st_size and row[2] == stat.st_mtime_ns
+
+    def record(self, output_file, inputs_hash):
+        """Запомнить созданный файл (сохраняется при close)"""
+        stat = os.stat(output_file)
+        self.conn.execute("INSERT OR REPLACE INTO outputs (path, inputs_hash, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                          (self.get_key(output_file), inputs_hash, stat.st_size, stat.st_mtime_ns))
+
+    def close(self):
+        """Сохранить изменения и закрыть журнал"""
+        try:
+            self.conn.commit()
+        finally:
+            self.conn.close()
@@ -0,0 +1,732 @@
+# record_store.py - хранение анкет (Excel или SQLite) без графического интерфейса
+import os
+import sqlite3
+import itertools
+import zipfile
+import posixpath
+
+# openpyxl и lxml импортируются внутри функций: они нужны только при работе с книгой Excel,
+# а их загрузка заметно замедляет запуск программы
+
+
+# Пространства имен XML книги Excel
+SHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+DOC_REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PKG_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+# Доступные способы хранения анкет
+STORAGE_BACKENDS = [
+    ('excel', 'Excel (анкеты_данные.xlsx)'),
+    ('sqlite', 'База SQLite (анкеты_данные.db)')
+]
+
+# Копия анкет из базы SQLite в Excel - отдельный файл, исходная книга анкет не перезаписывается
+EXCEL_MIRROR_FILE = "анкеты_данные_из_базы.xlsx"
+
+# Сколько пропущенных при импорте анкет перечислять в сообщении
+IMPORT_SKIPPED_LINES = 10
+
+# Виды изменений анкет, о которых хранилище сообщает подписчикам
+RECORD_INSERTED = 'inserted'
+RECORD_UPDATED = 'updated'
+RECORD_REMOVED = 'removed'
+RECORDS_RESET = 'reset'
+
+# Поля анкеты в порядке столбцов Excel
+FIELD_KEYS = [
+    ('n', 'Фамилия'),
+    ('fn', 'Имя'),
+    ('mn', 'Отчество'),
+    ('reg', 'Регистрация'),
+    ('ps', 'Серия паспорта'),
+    ('pn', 'Номер паспорта'),
+    ('pi', 'Паспорт выдан'),
+    ('di', 'Дата выдачи'),
+    ('cs', 'Серия УЧО'),
+    ('cn', 'Номер УЧО'),
+    ('cd', 'Дата выдачи УЧО'),
+    ('ce', 'Срок окончания УЧО'),
+    ('msd', 'Дата выдачи мед. Справки'),
+    ('med', 'Дата окончания мед. Справки'),
+    ('ppd', 'Дата акта ПП'),
+    ('ppe', 'Дата окончания ПП'),
+    ('boss', 'Начальник охраны'),
+    ('note', 'Примечание')
+]
+
+
+def row_to_record(row_number, values):
+    """Преобразовать значения строки Excel в запись анкеты"""
+    record = {'_row_number': row_number}
+    for col, (key, _) in enumerate(FIELD_KEYS):
+        cell_value = values[col] if col < len(values) else None
+        record[key] = str(cell_value) if cell_value is not None else ""
+    return record
+
+
+_column_indexes = {}
+
+
+def column_index(coordinate):
+    """Номер столбца (с 1) по адресу ячейки вида 'AB12'"""
+    letters = coordinate.rstrip('0123456789')
+    index = _column_indexes.get(letters)
+    if index is None:
+        index = 0
+        for char in letters:
+            index = index * 26 + ord(char.upper()) - 64
+        _column_indexes[letters] = index
+    return index
+
+
+def text_content(element):
+    """Текст строки Excel: простой текст и фрагменты форматированного текста (без фонетики)"""
+    if len(element) == 1 and element[0].tag == SHEET_NS + 't':
+        # Обычный случай - один элемент с текстом
+        text = element[0].text or ""
+        return text.replace('x005F_', '') if 'x005F_' in text else text
+
+    parts = []
+    plain = element.find(SHEET_NS + 't')
+    if plain is not None:
+        parts.append(plain.text or "")
+    for run in element.findall(SHEET_NS + 'r'):
+        run_text = run.find(SHEET_NS + 't')
+        if run_text is not None:
+            parts.append(run_text.text or "")
+    return "".join(parts).replace('x005F_', '')
+
+
+class SheetReader:
+    """Потоковое чтение значений активного листа .xlsx напрямую из XML.
+
+    Не создает объектов ячеек openpyxl: строки разбираются по одной и сразу освобождаются.
+    Значения приводятся к тем же типам, что и у openpyxl (числа, даты, логические значения).
+    """
+
+    def __init__(self, excel_path):
+        self.zip = zipfile.ZipFile(excel_path)
+        try:
+            self.sheet_path, self.epoch = self.find_active_sheet()
+            self.shared_strings = self.read_shared_strings()
+            self.date_styles, self.timedelta_styles = self.read_date_styles()
+        except Exception:
+            self.zip.close()
+            raise
+
+    def find_active_sheet(self):
+        """Найти файл активного листа и календарь дат книги"""
+        from lxml import etree
+
+        root = etree.fromstring(self.zip.read('xl/workbook.xml'))
+        if root.tag != SHEET_NS + 'workbook':
+            raise ValueError("Неподдерживаемый формат книги Excel")
+
+        from openpyxl.utils.datetime import CALENDAR_WINDOWS_1900, CALENDAR_MAC_1904
+
+        workbook_pr = root.find(SHEET_NS + 'workbookPr')
+        is_1904 = workbook_pr is not None and workbook_pr.get('date1904') in ('1', 'true')
+        epoch = CALENDAR_MAC_1904 if is_1904 else CALENDAR_WINDOWS_1900
+
+        view = root.find(f'{SHEET_NS}bookViews/{SHEET_NS}workbookView')
+        active = int(view.get('activeTab', 0)) if view is not None else 0
+        sheets = root.findall(f'{SHEET_NS}sheets/{SHEET_NS}sheet')
+        rel_id = sheets[active].get(DOC_REL_NS + 'id')
+
+        rels = etree.fromstring(self.zip.read('xl/_rels/workbook.xml.rels'))
+        for rel in rels.findall(PKG_REL_NS + 'Relationship'):
+            if rel.get('Id') == rel_id:
+                target = rel.get('Target')
+                if target.startswith('/'):
+                    return target.lstrip('/'), epoch
+                return posixpath.normpath(posixpath.join('xl', target)), epoch
+
+        raise KeyError(f"Лист {rel_id} не найден")
+
+    def read_shared_strings(self):
+        """Прочитать таблицу общих строк"""
+        from lxml import etree
+
+        if 'xl/sharedStrings.xml' not in self.zip.namelist():
+            return []
+
+        strings = []
+        with self.zip.open('xl/sharedStrings.xml') as f:
+            for _, element in etree.iterparse(f, events=('end',), tag=SHEET_NS + 'si'):
+                strings.append(text_content(element))
+                element.clear()
+        return strings
+
+    def read_date_styles(self):
+        """Номера стилей ячеек с форматом даты и с форматом интервала времени"""
+        if 'xl/styles.xml' not in self.zip.namelist():
+            return set(), set()
+
+        from lxml import etree
+        from openpyxl.styles.numbers import BUILTIN_FORMATS, is_date_format, is_timedelta_format
+
+        root = etree.fromstring(self.zip.read('xl/styles.xml'))
+        formats = dict(BUILTIN_FORMATS)
+        for num_fmt in root.iter(SHEET_NS + 'numFmt'):
+            formats[int(num_fmt.get('numFmtId'))] = num_fmt.get('formatCode')
+
+        date_styles, timedelta_styles = set(), set()
+        cell_xfs = root.find(SHEET_NS + 'cellXfs')
+        if cell_xfs is not None:
+            for style_id, xf in enumerate(cell_xfs.findall(SHEET_NS + 'xf')):
+                code = formats.get(int(xf.get('numFmtId', 0)))
+                if code and is_date_format(code):
+                    date_styles.add(style_id)
+                    if is_timedelta_format(code):
+                        timedelta_styles.add(style_id)
+        return date_styles, timedelta_styles
+
+    def cell_value(self, cell):
+        """Значение ячейки с приведением типа как в openpyxl"""
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            inline = cell.find(SHEET_NS + 'is')
+            return text_content(inline) if inline is not None else None
+
+        formula = cell.find(SHEET_NS + 'f')
+        if formula is not None:
+            return "=" + (formula.text or "")
+
+        value = cell.findtext(SHEET_NS + 'v') or None
+        if value is None:
+            return None
+
+        if data_type == 'n':
+            value = float(value) if ('.' in value or 'E' in value or 'e' in value) else int(value)
+            style_id = int(cell.get('s', 0))
+            if style_id in self.date_styles:
+                from openpyxl.utils.datetime import from_excel
+                try:
+                    return from_excel(value, self.epoch, timedelta=style_id in self.timedelta_styles)
+                except (OverflowError, ValueError):
+                    return "#VALUE!"
+            return value
+        if data_type == 's':
+            return self.shared_strings[int(value)]
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            from openpyxl.utils.datetime import from_ISO8601
+            return from_ISO8601(value)
+        return value
+
+    def iter_rows(self, min_row=1, max_row=None, max_col=None):
+        """Выдавать (номер строки, значения) по одной строке; пропущенные в файле строки - пустые"""
+        from lxml import etree
+
+        cell_tag = SHEET_NS + 'c'
+        row_counter = 0
+        next_row = min_row
+
+        with self.zip.open(self.sheet_path) as f:
+            for _, element in etree.iterparse(f, events=('end',), tag=SHEET_NS + 'row'):
+                row_number = int(element.get('r') or row_counter + 1)
+                row_counter = row_number
+                if max_row is not None and row_number > max_row:
+                    break
+
+                if row_number >= min_row:
+                    # Строки, которых нет в файле, возвращаем пустыми
+                    while next_row < row_number:
+                        yield next_row, [None] * (max_col or 0)
+                        next_row += 1
+
+                    values = [None] * (max_col or 0)
+                    col = 0
+                    for cell in element.iterchildren(cell_tag):
+                        coordinate = cell.get('r')
+                        col = column_index(coordinate) if coordinate else col + 1
+                        if max_col is not None and col > max_col:
+                            continue
+                        if col > len(values):
+                            values.extend([None] * (col - len(values)))
+                        values[col - 1] = self.cell_value(cell)
+
+                    yield row_number, values
+                    next_row = row_number + 1
+
+                # Освобождаем разобранную строку и уже обработанные строки перед ней
+                element.clear()
+                while element.getprevious() is not None:
+                    del element.getparent()[0]
+
+    def close(self):
+        self.zip.close()
+
+
+def iter_excel_records(excel_path, min_row=2, max_row=None):
+    """Построчно читать анкеты из Excel, не загружая книгу целиком"""
+    min_row = max(min_row, 2)
+
+    try:
+        reader = SheetReader(excel_path)
+    except Exception as e:
+        # Нестандартная книга - читаем через openpyxl в режиме только для чтения
+        print(f"Быстрое чтение Excel недоступно ({e}), используется openpyxl")
+        reader = None
+
+    if reader is not None:
+        try:
+            for row_number, values in reader.iter_rows(min_row, max_row, len(FIELD_KEYS)):
+                yield row_to_record(row_number, values)
+        finally:
+            reader.close()
+        return
+
+    import openpyxl
+    wb = openpyxl.load_workbook(excel_path, read_only=True)
+    try:
+        sheet = wb.active
+        for row_number, values in enumerate(
+                sheet.iter_rows(min_row=min_row, max_row=max_row,
+                                max_col=len(FIELD_KEYS), values_only=True),
+                min_row):
+            yield row_to_record(row_number, values)
+    finally:
+        wb.close()
+
+
+def export_records_to_excel(records, excel_path):
+    """Выгрузить анкеты в файл Excel (файл перезаписывается целиком)"""
+    import openpyxl
+    wb = openpyxl.Workbook(write_only=True)
+    sheet = wb.create_sheet()
+    sheet.append([label for _, label in FIELD_KEYS])
+    for record in records:
+        sheet.append([record.get(key, "") for key, _ in FIELD_KEYS])
+
+    # Пишем во временный файл, чтобы не испортить книгу при ошибке
+    temp_path = excel_path + ".tmp"
+    wb.save(temp_path)
+    os.replace(temp_path, excel_path)
+
+
+class RecordChangeNotifier:
+    """Рассылка изменений анкет подписчикам.
+
+    Подписчик получает список изменений (вид, данные): для RECORD_INSERTED и RECORD_UPDATED данные -
+    запись, для RECORD_REMOVED - ее постоянный идентификатор '_id', для RECORDS_RESET - None
+    (данные нужно перечитать целиком). Если ROWS_SHIFT_ON_REMOVE, после удаления '_row_number'
+    записей ниже удаленной уменьшается на единицу - отдельные изменения для них не рассылаются.
+    """
+
+    ROWS_SHIFT_ON_REMOVE = False
+
+    def __init__(self):
+        self._listeners = []
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def notify(self, changes):
+        if not changes:
+            return
+        for callback in list(self._listeners):
+            try:
+                callback(changes)
+            except Exception as e:
+                print(f"Ошибка обработки изменений анкет: {e}")
+
+
+class ExcelRecordStore(RecordChangeNotifier):
+    """Анкеты из Excel в памяти с индексами по номеру УЧО и ФИО.
+
+    Файл читается один раз и перечитывается только при изменении его времени изменения или размера.
+    Номер строки меняется при удалении строк выше, поэтому каждой записи в памяти присваивается
+    постоянный идентификатор '_id'.
+    """
+
+    ROWS_SHIFT_ON_REMOVE = True
+
+    def __init__(self, excel_path):
+        super().__init__()
+        self.excel_path = excel_path
+        self.records = []
+        self._ids = itertools.count(1)
+        self._file_key = None
+        self._loaded = False
+        self._by_row = {}
+        self._by_cn = {}
+        self._by_fullname = {}
+
+    @staticmethod
+    def fullname_key(values):
+        """Ключ индекса по ФИО"""
+        return (str(values.get('n', '')), str(values.get('fn', '')), str(values.get('mn', '') or ''))
+
+    def get_file_key(self):
+        """Время изменения и размер файла (None, если файла нет)"""
+        try:
+            stat = os.stat(self.excel_path)
+            return stat.st_mtime_ns, stat.st_size
+        except OSError:
+            return None
+
+    def ensure_exists(self):
+        """Создать файл Excel, если он не существует"""
+        if not os.path.exists(self.excel_path):
+            import openpyxl
+            wb = openpyxl.Workbook()
+            sheet = wb.active
+            # Заголовки столбцов
+            for col, (_, label) in enumerate(FIELD_KEYS, 1):
+                sheet.cell(row=1, column=col, value=label)
+            wb.save(self.excel_path)
+
+    def refresh(self):
+        """Перечитать файл, если он изменился с момента последней загрузки.
+
+        При повторной загрузке все записи получают новые '_id', поэтому подписчикам
+        отправляется RECORDS_RESET - кто бы ни вызвал перечитывание.
+        """
+        file_key = self.get_file_key()
+        if self._loaded and file_key == self._file_key:
+            return False
+
+        if file_key is None:
+            self.records = []
+        else:
+            self.records = list(iter_excel_records(self.excel_path))
+            for record in self.records:
+                record['_id'] = next(self._ids)
+
+        self._file_key = file_key
+        self.rebuild_indexes()
+
+        if self._loaded:
+            self.notify([(RECORDS_RESET, None)])
+        self._loaded = True
+        return True
+
+    def rebuild_indexes(self):
+        """Построить индексы по номеру строки, номеру УЧО и ФИО"""
+        self._by_row = {}
+        self._by_cn = {}
+        self._by_fullname = {}
+        for record in self.records:
+            self.add_to_indexes(record)
+
+    def add_to_indexes(self, record):
+        row_number = record['_row_number']
+        self._by_row[row_number] = record
+        if record.get('cn'):
+            self._by_cn.setdefault(record['cn'], set()).add(row_number)
+        self._by_fullname.setdefault(self.fullname_key(record), set()).add(row_number)
+
+    def remove_from_indexes(self, record):
+        row_number = record['_row_number']
+        self._by_row.pop(row_number, None)
+
+        for index, key in ((self._by_cn, record.get('cn')), (self._by_fullname, self.fullname_key(record))):
+            rows = index.get(key)
+            if rows is not None:
+                rows.discard(row_number)
+                if not rows:
+                    del index[key]
+
+    def get_records(self):
+        """Получить все записи"""
+        self.refresh()
+        return list(self.records)
+
+    def get_record(self, row_number):
+        """Найти запись по номеру строки в Excel"""
+        self.refresh()
+        return self._by_row.get(row_number)
+
+    def find_row_by_fullname(self, values):
+        """Найти строку по ФИО"""
+        self.refresh()
+        rows = self._by_fullname.get(self.fullname_key(values))
+        # При совпадении ФИО берем первую строку, как при поиске по файлу
+        return min(rows) if rows else None
+
+    def is_cn_unique(self, cn, exclude_row=None):
+        """Проверить уникальность номера УЧО"""
+        if not cn:
+            return True
+
+        self.refresh()
+        rows = self._by_cn.get(str(cn), ())
+        return not any(row != exclude_row for row in rows)
+
+    def save(self, values):
+        """Сохранить анкету: обновить существующую строку или добавить новую.
+
+        Возвращает кортеж (успех, сообщение).
+        """
+        try:
+            self.ensure_exists()
+            # Если файл изменили извне, refresh сам сообщит подписчикам о перечитывании
+            self.refresh()
+            changes = []
+
+            # Проверяем, существует ли уже запись (по номеру строки или по ФИО)
+            row_number = values.get('_row_number') or self.find_row_by_fullname(values)
+
+            import openpyxl
+            wb = openpyxl.load_workbook(self.excel_path)
+            sheet = wb.active
+
+            if row_number:
+                action = "обновлена"
+            else:
+                row_number = sheet.max_row + 1
+                action = "добавлена"
+
+            for col, (key, _) in enumerate(FIELD_KEYS, 1):
+                sheet.cell(row=row_number, column=col, value=values.get(key, ""))
+
+            wb.save(self.excel_path)
+
+            # Обновляем данные в памяти вместо повторного чтения файла
+            record = {'_row_number': row_number}
+            for key, _ in FIELD_KEYS:
+                value = values.get(key, "")
+                record[key] = str(value) if value is not None else ""
+
+            old_record = self._by_row.get(row_number)
+            if old_record is not None:
+                record['_id'] = old_record['_id']
+                self.remove_from_indexes(old_record)
+                self.records[self.records.index(old_record)] = record
+                changes.append((RECORD_UPDATED, dict(record)))
+            else:
+                record['_id'] = next(self._ids)
+                self.records.append(record)
+                changes.append((RECORD_INSERTED, dict(record)))
+            self.add_to_indexes(record)
+
+            self._file_key = self.get_file_key()
+            self.notify(changes)
+            return True, f"Анкета успешно {action}."
+        except Exception as e:
+            return False, f"Ошибка при сохранении: {str(e)}"
+
+    def delete(self, row_number):
+        """Удалить строку анкеты из файла"""
+        self.refresh()
+        changes = []
+
+        import openpyxl
+        wb = openpyxl.load_workbook(self.excel_path)
+        sheet = wb.active
+        sheet.delete_rows(row_number)
+        wb.save(self.excel_path)
+
+        removed = self._by_row.get(row_number)
+        if removed is not None:
+            changes.append((RECORD_REMOVED, removed['_id']))
+
+        # Строки ниже удаленной сдвигаются вверх - подписчики сдвигают их сами (ROWS_SHIFT_ON_REMOVE)
+        self.records = [record for record in self.records if record['_row_number'] != row_number]
+        for record in self.records:
+            if record['_row_number'] > row_number:
+                record['_row_number'] -= 1
+        self.rebuild_indexes()
+
+        self._file_key = self.get_file_key()
+        self.notify(changes)
+
+    def export_to_excel(self, excel_path):
+        """Выгрузить анкеты в другой файл Excel"""
+        export_records_to_excel(self.get_records(), excel_path)
+
+
+class SQLiteRecordStore(RecordChangeNotifier):
+    """Анкеты в базе SQLite: добавление и изменение - одна строка в одной транзакции.
+
+    В качестве '_row_number' и '_id' записи используется ее идентификатор в базе.
+    Если задан excel_mirror_path, после каждого изменения анкеты дублируются в этот файл Excel
+    (отдельный от книги, из которой анкеты импортировались).
+    """
+
+    def __init__(self, db_path, excel_mirror_path=None):
+        super().__init__()
+        self.db_path = db_path
+        self.excel_mirror_path = excel_mirror_path
+        self.conn = sqlite3.connect(db_path)
+        self.columns = [key for key, _ in FIELD_KEYS]
+        self.ensure_exists()
+
+    def ensure_exists(self):
+        """Создать таблицу анкет и индексы, добавить недостающие столбцы"""
+        columns = ", ".join(f"{key} TEXT NOT NULL DEFAULT ''" for key in self.columns)
+        with self.conn:
+            self.conn.execute(f"CREATE TABLE IF NOT EXISTS records (id INTEGER PRIMARY KEY AUTOINCREMENT, {columns})")
+
+            existing = {row[1] for row in self.conn.execute("PRAGMA table_info(records)")}
+            for key in self.columns:
+                if key not in existing:
+                    self.conn.execute(f"ALTER TABLE records ADD COLUMN {key} TEXT NOT NULL DEFAULT ''")
+
+            # Номер УЧО уникален среди заполненных значений
+            self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_records_cn ON records (cn) WHERE cn <> ''")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_records_fullname ON records (n, fn, mn)")
+
+    def refresh(self):
+        """Данные всегда читаются из базы - перечитывать нечего"""
+        return False
+
+    def row_to_record(self, row):
+        record = {'_row_number': row[0], '_id': row[0]}
+        record.update(zip(self.columns, row[1:]))
+        return record
+
+    def get_records(self):
+        """Получить все записи"""
+        cursor = self.conn.execute(f"SELECT id, {', '.join(self.columns)} FROM records ORDER BY id")
+        return [self.row_to_record(row) for row in cursor]
+
+    def get_record(self, row_number):
+        """Найти запись по идентификатору"""
+        row = self.conn.execute(f"SELECT id, {', '.join(self.columns)} FROM records WHERE id = ?",
+                                (row_number,)).fetchone()
+        return self.row_to_record(row) if row else None
+
+    def find_row_by_fullname(self, values):
+        """Найти запись по ФИО"""
+        row = self.conn.execute("SELECT MIN(id) FROM records WHERE n = ? AND fn = ? AND mn = ?",
+                                ExcelRecordStore.fullname_key(values)).fetchone()
+        return row[0] if row else None
+
+    def is_cn_unique(self, cn, exclude_row=None):
+        """Проверить уникальность номера УЧО"""
+        if not cn:
+            return True
+
+        for (record_id,) in self.conn.execute("SELECT id FROM records WHERE cn = ?", (str(cn),)):
+            if record_id != exclude_row:
+                return False
+        return True
+
+    def write_record(self, values):
+        """Обновить или добавить запись в текущей транзакции. Возвращает (id, действие)"""
+        data = [str(values.get(key, "")) if values.get(key) is not None else "" for key in self.columns]
+        record_id = values.get('_row_number') or self.find_row_by_fullname(values)
+
+        if record_id:
+            assignments = ", ".join(f"{key} = ?" for key in self.columns)
+            cursor = self.conn.execute(f"UPDATE records SET {assignments} WHERE id = ?", data + [record_id])
+            if cursor.rowcount:
+                return record_id, "обновлена"
+
+        placeholders = ", ".join("?" for _ in self.columns)
+        cursor = self.conn.execute(f"INSERT INTO records ({', '.join(self.columns)}) VALUES ({placeholders})", data)
+        return cursor.lastrowid, "добавлена"
+
+    def save(self, values):
+        """Сохранить анкету. Возвращает кортеж (успех, сообщение)"""
+        try:
+            with self.conn:
+                record_id, action = self.write_record(values)
+            self.update_mirror()
+
+            kind = RECORD_UPDATED if action == "обновлена" else RECORD_INSERTED
+            self.notify([(kind, self.get_record(record_id))])
+            return True, f"Анкета успешно {action}."
+        except sqlite3.IntegrityError:
+            return False, "Ошибка при сохранении: номер УЧО должен быть уникальным"
+        except Exception as e:
+            return False, f"Ошибка при сохранении: {str(e)}"
+
+    def delete(self, row_number):
+        """Удалить запись"""
+        with self.conn:
+            cursor = self.conn.execute("DELETE FROM records WHERE id = ?", (row_number,))
+        self.update_mirror()
+
+        if cursor.rowcount:
+            self.notify([(RECORD_REMOVED, row_number)])
+
+    def is_mirror_path(self, path):
+        """Файл path - копия анкет в Excel"""
+        return bool(self.excel_mirror_path) and os.path.abspath(path) == os.path.abspath(self.excel_mirror_path)
+
+    @staticmethod
+    def fullname_key(values):
+        return ExcelRecordStore.fullname_key(values)
+
+    def update_mirror(self):
+        """Продублировать анкеты в Excel, если включено зеркалирование"""
+        if not self.excel_mirror_path:
+            return
+        try:
+            self.export_to_excel(self.excel_mirror_path)
+        except Exception as e:
+            print(f"Ошибка обновления копии анкет в Excel: {e}")
+
+    def count(self):
+        """Количество записей в базе"""
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def export_to_excel(self, excel_path):
+        """Выгрузить анкеты в файл Excel"""
+        export_records_to_excel(self.get_records(), excel_path)
+
+    def import_from_excel(self, excel_path):
+        """Загрузить анкеты из Excel одной транзакцией.
+
+        Анкеты с тем же ФИО обновляются, с повторяющимся номером УЧО - пропускаются
+        и перечисляются в сообщении. Возвращает кортеж (успех, сообщение).
+        """
+        try:
+            imported, skipped = 0, []
+            with self.conn:
+                # Явно открываем общую транзакцию, иначе первая точка сохранения зафиксирует только свою запись
+                self.conn.execute("BEGIN")
+                for record in iter_excel_records(excel_path):
+                    if not any(record.get(key) for key in self.columns):
+                        continue
+
+                    values = {key: record[key] for key in self.columns}
+                    self.conn.execute("SAVEPOINT import_record")
+                    try:
+                        self.write_record(values)
+                        self.conn.execute("RELEASE import_record")
+                        imported += 1
+                    except sqlite3.IntegrityError:
+                        self.conn.execute("ROLLBACK TO import_record")
+                        self.conn.execute("RELEASE import_record")
+                        fullname = " ".join(part for part in self.fullname_key(values) if part)
+                        skipped.append(f"строка {record['_row_number']}: {fullname}, УЧО {values['cn']}")
+
+            # Копию в Excel не пишем поверх книги, из которой часть анкет не загрузилась
+            if skipped and self.is_mirror_path(excel_path):
+                print(f"Копия анкет в Excel не обновлена: {excel_path} - исходный файл импорта")
+            else:
+                self.update_mirror()
+            self.notify([(RECORDS_RESET, None)])
+
+            message = f"Загружено анкет: {imported}"
+            if skipped:
+                message += (f"\n\nНе загружены - номер УЧО уже занят ({len(skipped)}):\n" +
+                            "\n".join(skipped[:IMPORT_SKIPPED_LINES]))
+                if len(skipped) > IMPORT_SKIPPED_LINES:
+                    message += f"\n... и еще {len(skipped) - IMPORT_SKIPPED_LINES}"
+                message += "\n\nИсправьте номера УЧО в файле Excel и повторите импорт."
+            return True, message
+        except Exception as e:
+            return False, f"Ошибка загрузки из Excel: {str(e)}"
+
+    def close(self):
+        self.conn.close()
+
+
+def create_record_store(backend, excel_path, db_path, excel_mirror_path=None):
+    """Создать хранилище анкет выбранного типа.
+
+    excel_mirror_path - файл копии анкет из базы SQLite (None - без копии)
+    """
+    if backend == 'sqlite':
+        return SQLiteRecordStore(db_path, excel_mirror_path)
+    return ExcelRecordStore(excel_path)
@@ -0,0 +1,321 @@
+# render_engine.py - параллельный рендеринг шаблонов документов
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+from template_index import TemplateIndex, MANIFEST_FILE
+from template_registry import TemplateRegistry, is_template_file
+from output_ledger import OutputLedger, get_inputs_hash
+
+
+# Папка с шаблонами документов по умолчанию (рядом с программой)
+TEMPLATES_DIR_NAME = "Шаблоны"
+
+# Папка дискового кэша скомпилированных шаблонов (создается рядом с папкой шаблонов)
+TEMPLATE_CACHE_DIR_NAME = ".templates_cache"
+
+# Поля в верхнем регистре и поля анкеты, из которых они получаются
+DERIVED_FIELDS = {
+    'n_c': 'n',
+    'fn_c': 'fn',
+    'mn_c': 'mn',
+    'boss_c': 'boss'
+}
+
+# Переменные, которые вычисляются при рендеринге и не зависят от анкеты
+COMPUTED_FIELDS = ('current_date',)
+
+
+def build_context(fields):
+    """Подготовить контекст для подстановки в шаблоны"""
+    context = dict(fields)
+    context['current_date'] = datetime.now().strftime('%d.%m.%Y')
+
+    # Добавляем поля в верхнем регистре
+    for key, source in DERIVED_FIELDS.items():
+        context[key] = (context.get(source) or '').upper()
+    return context
+
+
+def get_used_fields(variables):
+    """Поля анкеты, от которых зависит шаблон с переменными variables"""
+    return sorted({DERIVED_FIELDS.get(name, name) for name in variables} - set(COMPUTED_FIELDS))
+
+
+def limit_context(context, variables):
+    """Оставить в контексте только переменные шаблона (None - контекст целиком)"""
+    if variables is None:
+        return context
+    return {name: context[name] for name in variables if name in context}
+
+
+def get_folder_name(fields):
+    """Имя папки с документами человека (ФИО)"""
+    return f"{fields.get('n', '')} {fields.get('fn', '')} {fields.get('mn', '')}".strip()
+
+
+def list_templates(templates_dir):
+    """Список файлов шаблонов .docx в папке"""
+    return sorted(f for f in os.listdir(templates_dir) if is_template_file(f))
+
+
+def get_template_cache_dir(templates_dir):
+    """Папка кэша скомпилированных шаблонов рядом с папкой шаблонов"""
+    return os.path.join(os.path.dirname(os.path.abspath(templates_dir)), TEMPLATE_CACHE_DIR_NAME)
+
+
+def init_render_worker(template_cache_dir):
+    """Настроить процесс рендеринга: папка дискового кэша скомпилированных шаблонов"""
+    from template_cache import get_template_cache
+    get_template_cache().set_cache_dir(template_cache_dir)
+
+
+def render_template(template_path, context, output_file):
+    """Отрендерить один шаблон и сохранить результат (выполняется в рабочем процессе)"""
+    # docxtpl, jinja2 и python-docx загружаются только при первом создании документа
+    from template_cache import get_template_cache
+
+    get_template_cache().get(template_path).render_to_file(context, output_file)
+    return output_file
+
+
+class RenderEngine:
+    """Распределяет рендеринг шаблонов по пулу процессов или потоков"""
+
+    def __init__(self, max_workers=0, use_processes=True, template_cache_dir=None):
+        # 0 - по числу ядер процессора
+        self.max_workers = max_workers if max_workers > 0 else (os.cpu_count() or 1)
+        self.use_processes = use_processes
+        # Кэш скомпилированных шаблонов на диске - общий для всех процессов и запусков
+        self.template_cache_dir = template_cache_dir
+        self._executor = None
+        self._template_index = None
+        self._template_registry = None
+        self._local_initialized = False
+
+    def get_template_index(self):
+        """Манифест переменных шаблонов (хранится в папке кэша шаблонов)"""
+        if self._template_index is None:
+            # Шаблоны для манифеста разбираются в этом процессе - с кэшем этого движка
+            self.init_local()
+            manifest_path = os.path.join(self.template_cache_dir, MANIFEST_FILE) if self.template_cache_dir else None
+            self._template_index = TemplateIndex(manifest_path)
+        return self._template_index
+
+    def get_template_registry(self, templates_dir):
+        """Список шаблонов папки с метаданными (перечитывается только при изменении папки)"""
+        path = os.path.abspath(templates_dir)
+        registry = self._template_registry
+        if registry is None or registry.templates_dir != path:
+            registry = TemplateRegistry(path, self.get_template_index())
+            self._template_registry = registry
+        return registry
+
+    def get_template_entries(self, templates_dir, template_files):
+        """Записи манифеста шаблонов {имя файла: запись или None, если шаблон не разобрался}"""
+        # Для неразобранного шаблона контекст передается целиком, ошибку покажет рендеринг
+        return self.get_template_index().get_entries(templates_dir, template_files)
+
+    def get_template_variables(self, templates_dir, template_files):
+        """Переменные каждого шаблона {имя файла: список или None, если шаблон не разобрался}"""
+        return {template_file: entry["variables"] if entry else None
+                for template_file, entry in self.get_template_entries(templates_dir, template_files).items()}
+
+    def find_missing_fields(self, templates_dir, template_files, fields):
+        """Незаполненные поля анкеты, которые используются в шаблонах {имя файла: [ключи полей]}"""
+        missing = {}
+        for template_file, variables in self.get_template_variables(templates_dir, template_files).items():
+            if variables is None:
+                continue
+            empty = [key for key in get_used_fields(variables) if not fields.get(key)]
+            if empty:
+                missing[template_file] = empty
+        return missing
+
+    def init_local(self):
+        """Настроить рендеринг в текущем процессе (последовательно или в потоках)"""
+        if not self._local_initialized:
+            init_render_worker(self.template_cache_dir)
+            self._local_initialized = True
+
+    def get_executor(self):
+        """Получить пул исполнителей (создается один раз и переиспользуется)"""
+        if self._executor is None:
+            if self.use_processes:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     initializer=init_render_worker,
+                                                     initargs=(self.template_cache_dir,))
+            else:
+                self.init_local()
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    def iter_results(self, jobs):
+        """Выполнить задания (template_path, context, output_file) и выдавать результаты по мере готовности.
+
+        Выдает кортежи (index, output_file, error): error - исключение или None.
+        """
+        if self.max_workers <= 1 or len(jobs) <= 1:
+            self.init_local()
+            for index, job in enumerate(jobs):
+                try:
+                    yield index, render_template(*job), None
+                except Exception as e:
+                    yield index, None, e
+            return
+
+        executor = self.get_executor()
+        futures = {executor.submit(render_template, *job): index for index, job in enumerate(jobs)}
+
+        try:
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    yield index, future.result(), None
+                except BrokenProcessPool:
+                    raise
+                except Exception as e:
+                    yield index, None, e
+        except BrokenProcessPool:
+            # Пул больше непригоден - при следующем запуске создадим новый
+            self._executor = None
+            raise
+        finally:
+            # Если обработку прервали, оставшиеся задания не нужны
+            for future in futures:
+                future.cancel()
+
+    def render_templates(self, jobs, on_done=None):
+        """Отрендерить задания (template_path, context, output_file).
+
+        on_done(done, total, output_file) вызывается по мере готовности каждого файла.
+        Возвращает список созданных файлов в порядке заданий, при первой ошибке выбрасывает исключение.
+        """
+        total = len(jobs)
+        results = [None] * total
+
+        for done, (index, output_file, error) in enumerate(self.iter_results(jobs), 1):
+            if error is not None:
+                raise error
+            results[index] = output_file
+            if on_done:
+                on_done(done, total, output_file)
+
+        return results
+
+    def render_records(self, records, templates_dir, template_files, save_root,
+                       on_progress=None, on_record_done=None, on_record_error=None, force=False,
+                       cancel_event=None):
+        """Отрендерить все шаблоны для каждой записи.
+
+        Задания всех записей выполняются в общем пуле, шаблоны разбираются один раз на процесс.
+        Каждый шаблон получает только нужные ему переменные - меньше данных передается в процессы.
+        Документы, для которых по журналу в save_root не изменились ни шаблон, ни используемые
+        поля анкеты, не пересоздаются (force=True - пересоздать все).
+        on_progress(done, total) - после каждого созданного файла,
+        on_record_done(name, files) - когда все документы записи готовы,
+        on_record_error(name, message) - при ошибке записи.
+        cancel_event (threading.Event) прерывает рендеринг: оставшиеся задания отменяются.
+        Возвращает сводку {'records': ..., 'files': ..., 'skipped': ..., 'errors': [(name, message), ...],
+        'cancelled': ...}.
+        """
+        jobs = []
+        job_records = []
+        pending = {}
+        created = {}
+        errors = {}
+        names = []
+        skipped = 0
+        cancelled = False
+        entries = self.get_template_entries(templates_dir, template_files)
+        ledger = OutputLedger(save_root)
+        results = None
+
+        try:
+            for record_index, fields in enumerate(records):
+                folder_name = get_folder_name(fields)
+                names.append(folder_name)
+
+                if not fields.get('n') or not fields.get('fn'):
+                    errors[record_index] = "Фамилия и имя обязательны"
+                    continue
+
+                try:
+                    folder_path = os.path.join(save_root, folder_name)
+                    os.makedirs(folder_path, exist_ok=True)
+                except Exception as e:
+                    errors[record_index] = str(e)
+                    continue
+
+                context = build_context(fields)
+                pending[record_index] = 0
+                created[record_index] = [None] * len(template_files)
+                for template_index, template_file in enumerate(template_files):
+                    output_file = os.path.join(folder_path, template_file)
+                    entry = entries[template_file]
+                    template_context = limit_context(context, entry["variables"] if entry else None)
+                    inputs_hash = get_inputs_hash(entry["hash"], template_context) if entry else None
+
+                    if not force and inputs_hash and ledger.is_fresh(output_file, inputs_hash):
+                        created[record_index][template_index] = output_file
+                        skipped += 1
+                        continue
+
+                    jobs.append((os.path.join(templates_dir, template_file), template_context, output_file))
+                    job_records.append((record_index, template_index, inputs_hash))
+                    pending[record_index] += 1
+
+            # Записи, отклоненные до рендеринга
+            for record_index, message in errors.items():
+                if on_record_error:
+                    on_record_error(names[record_index], message)
+
+            # Записи, все документы которых уже актуальны
+            for record_index, count in pending.items():
+                if count == 0 and on_record_done:
+                    on_record_done(names[record_index], created[record_index])
+
+            total = len(jobs)
+            results = self.iter_results(jobs)
+            for done, (index, output_file, error) in enumerate(results, 1):
+                record_index, template_index, inputs_hash = job_records[index]
+
+                if error is not None and record_index not in errors:
+                    errors[record_index] = f"{os.path.basename(jobs[index][0])}: {error}"
+                    if on_record_error:
+                        on_record_error(names[record_index], errors[record_index])
+                elif error is None:
+                    created[record_index][template_index] = output_file
+                    if inputs_hash:
+                        ledger.record(output_file, inputs_hash)
+
+                pending[record_index] -= 1
+                if pending[record_index] == 0 and record_index not in errors and on_record_done:
+                    on_record_done(names[record_index], created[record_index])
+
+                if on_progress:
+                    on_progress(done, total)
+
+                if cancel_event is not None and cancel_event.is_set():
+                    cancelled = True
+                    break
+        finally:
+            if results is not None:
+                # Отменяет задания, которые еще не начались
+                results.close()
+            ledger.close()
+
+        return {
+            'records': sum(1 for record_index in created if record_index not in errors),
+            'files': sum(1 for files in created.values() for f in files if f),
+            'skipped': skipped,
+            'errors': [(names[record_index], message) for record_index, message in sorted(errors.items())],
+            'cancelled': cancelled
+        }
+
+    def shutdown(self):
+        """Остановить пул исполнителей"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
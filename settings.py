@@ -1,6 +1,5 @@
 # settings.py - управление настройками
-from PyQt5.QtCore import QSettings, QByteArray
-from PyQt5.Qt import Qt
+from PyQt5.QtCore import QSettings, QByteArray, Qt
 
 
 class Settings:
@@ -26,6 +25,13 @@ class Settings:
     def get_last_save_path(self):
         return self.settings.value("paths/last_save_path", "")
 
+    def set_templates_dir(self, path):
+        self.settings.setValue("paths/templates_dir", path)
+
+    def get_templates_dir(self):
+        # Пустая строка - папка Шаблоны рядом с программой
+        return self.settings.value("paths/templates_dir", "")
+
     # Настройки темы
     def set_theme(self, theme):
         self.settings.setValue("app/theme", theme)
@@ -54,4 +60,31 @@ class Settings:
         self.settings.setValue("table/sort_order", order)
 
     def get_table_sort_order(self):
-        return int(self.settings.value("table/sort_order", Qt.AscendingOrder))
\ No newline at end of file
+        return int(self.settings.value("table/sort_order", Qt.AscendingOrder))
+
+    # Настройки создания документов
+    def set_render_workers(self, workers):
+        self.settings.setValue("render/workers", workers)
+
+    def get_render_workers(self):
+        # 0 - по числу ядер процессора
+        return int(self.settings.value("render/workers", 0))
+
+    def set_render_use_processes(self, use_processes):
+        self.settings.setValue("render/use_processes", use_processes)
+
+    def get_render_use_processes(self):
+        return self.settings.value("render/use_processes", True, type=bool)
+
+    # Настройки хранения анкет
+    def set_storage_backend(self, backend):
+        self.settings.setValue("storage/backend", backend)
+
+    def get_storage_backend(self):
+        return self.settings.value("storage/backend", "excel")
+
+    def set_excel_mirror(self, enabled):
+        self.settings.setValue("storage/excel_mirror", enabled)
+
+    def get_excel_mirror(self):
+        return self.settings.value("storage/excel_mirror", False, type=bool)
\ No newline at end of file
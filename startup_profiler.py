@@ -0,0 +1,191 @@
+# startup_profiler.py - замер времени этапов запуска программы
+#
+# Включается ключом --profile-startup (или --profile-startup=cprofile) либо переменной
+# окружения DOCUMENTFILLER_PROFILE_STARTUP=1 (=cprofile) для собранного EXE.
+# Отчет startup_profile_<дата>.json (и .prof для cProfile) сохраняется рядом с программой.
+import os
+import sys
+import json
+import time
+import builtins
+import platform
+from contextlib import contextmanager
+from datetime import datetime
+
+
+PROFILE_FLAG = "--profile-startup"
+PROFILE_ENV = "DOCUMENTFILLER_PROFILE_STARTUP"
+
+# Сколько самых долгих импортов попадает в отчет
+IMPORTS_IN_REPORT = 40
+
+
+def get_profile_mode(argv=None):
+    """Режим профилирования из командной строки или окружения: None, 'phases' или 'cprofile'"""
+    argv = sys.argv if argv is None else argv
+    for arg in argv[1:]:
+        if arg == PROFILE_FLAG:
+            return 'phases'
+        if arg.startswith(PROFILE_FLAG + '='):
+            return 'cprofile' if arg.split('=', 1)[1].lower() == 'cprofile' else 'phases'
+
+    value = os.environ.get(PROFILE_ENV, '').strip().lower()
+    if value in ('', '0', 'false', 'no'):
+        return None
+    return 'cprofile' if value == 'cprofile' else 'phases'
+
+
+class StartupProfiler:
+    """Замер длительности этапов запуска и времени импорта модулей.
+
+    Пока профилирование не включено, phase() и mark() ничего не делают.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.started = time.perf_counter()
+        self.phases = []
+        self.marks = {}
+        self.imports = []
+        self._depth = 0
+        self._import_depth = 0
+        self._original_import = None
+        self._cprofile = None
+
+    def start(self, started=None, mode='phases'):
+        """Включить профилирование; started - время запуска по time.perf_counter()"""
+        self.enabled = True
+        if started is not None:
+            self.started = started
+        self.install_import_timer()
+
+        if mode == 'cprofile':
+            import cProfile
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def elapsed_ms(self, moment=None):
+        return ((moment if moment is not None else time.perf_counter()) - self.started) * 1000
+
+    @contextmanager
+    def phase(self, name):
+        """Замерить этап запуска (этапы могут быть вложенными)"""
+        if not self.enabled:
+            yield
+            return
+
+        started = time.perf_counter()
+        depth = self._depth
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.add_phase(name, started, time.perf_counter(), depth)
+
+    def add_phase(self, name, started, finished, depth=0):
+        """Записать этап, замеренный вручную"""
+        if self.enabled:
+            self.phases.append({
+                "name": name,
+                "start_ms": round(self.elapsed_ms(started), 2),
+                "duration_ms": round((finished - started) * 1000, 2),
+                "depth": depth
+            })
+
+    def mark(self, name):
+        """Отметить момент запуска (например, первую отрисовку окна)"""
+        if self.enabled:
+            self.marks[name] = round(self.elapsed_ms(), 2)
+
+    def install_import_timer(self):
+        """Замерять время первого импорта каждого модуля (как python -X importtime)"""
+        if self._original_import is not None:
+            return
+
+        original_import = builtins.__import__
+        self._original_import = original_import
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or name in sys.modules:
+                return original_import(name, globals, locals, fromlist, level)
+
+            started = time.perf_counter()
+            depth = self._import_depth
+            self._import_depth += 1
+            try:
+                return original_import(name, globals, locals, fromlist, level)
+            finally:
+                self._import_depth -= 1
+                self.imports.append({
+                    "module": name,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    "depth": depth
+                })
+
+        builtins.__import__ = timed_import
+
+    def uninstall_import_timer(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def build_report(self):
+        """Собрать отчет о запуске"""
+        try:
+            from version import __version__ as version
+        except Exception:
+            version = None
+
+        imports = sorted(self.imports, key=lambda item: item["duration_ms"], reverse=True)
+        return {
+            "version": version,
+            "created": datetime.now().isoformat(),
+            "frozen": bool(getattr(sys, 'frozen', False)),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "total_ms": round(self.elapsed_ms(), 2),
+            "marks": self.marks,
+            "phases": sorted(self.phases, key=lambda item: item["start_ms"]),
+            "imports_total": len(self.imports),
+            "imports": imports[:IMPORTS_IN_REPORT]
+        }
+
+    def finish(self, output_dir):
+        """Остановить профилирование и сохранить отчет.
+
+        Возвращает путь к JSON-отчету или None, если профилирование не включено.
+        """
+        if not self.enabled:
+            return None
+
+        self.enabled = False
+        self.uninstall_import_timer()
+        stamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        report_path = os.path.join(output_dir, f"startup_profile_{stamp}.json")
+
+        try:
+            report = self.build_report()
+            with open(report_path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            print(f"⏱️ Отчет о запуске сохранен: {report_path} ({report['total_ms']:.0f} мс)")
+
+            if self._cprofile is not None:
+                self._cprofile.disable()
+                prof_path = os.path.join(output_dir, f"startup_profile_{stamp}.prof")
+                self._cprofile.dump_stats(prof_path)
+                self._cprofile = None
+                print(f"⏱️ Профиль cProfile сохранен: {prof_path}")
+        except Exception as e:
+            print(f"Ошибка сохранения отчета о запуске: {e}")
+            return None
+
+        return report_path
+
+
+_startup_profiler = StartupProfiler()
+
+
+def get_startup_profiler():
+    """Получить общий для процесса профилировщик запуска"""
+    return _startup_profiler
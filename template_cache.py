@@ -0,0 +1,391 @@
+# template_cache.py - кэш разобранных шаблонов документов
+import io
+import os
+import re
+import copy
+import zlib
+import struct
+import hashlib
+import marshal
+import zipfile
+import threading
+import importlib.util
+
+import docxtpl
+import jinja2
+from docxtpl import DocxTemplate
+from jinja2 import Environment, meta
+from lxml import etree
+
+
+# Версия формата файлов дискового кэша скомпилированных шаблонов
+CACHE_FORMAT = 3
+
+# Метка на месте тела документа при разбиении document.xml на начало и конец
+BODY_PLACEHOLDER = "documentfiller:body"
+
+# Свойства документа, которые docxtpl рендерит как шаблоны
+RENDERED_CORE_PROPERTIES = ("author", "comments", "identifier", "language", "subject", "title")
+
+# Записи архива ZIP (APPNOTE.TXT): локальный заголовок, запись оглавления и конец оглавления
+ZIP_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+ZIP_CENTRAL_HEADER = struct.Struct("<4s6H3L5H2L")
+ZIP_END_RECORD = struct.Struct("<4s4H2LH")
+ZIP_VERSION = 20
+# Бит флагов: имя файла в UTF-8
+ZIP_UTF8_FLAG = 0x800
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+
+def dos_date_time(date_time):
+    """Дата и время файла архива в формате MS-DOS"""
+    year, month, day, hour, minute, second = date_time
+    return (year - 1980) << 9 | month << 5 | day, hour << 11 | minute << 5 | second // 2
+
+
+def write_zip(output_file, members):
+    """Записать архив ZIP из уже сжатых файлов.
+
+    members - кортежи (имя, date_time, способ сжатия, CRC-32, исходный размер, сжатые данные,
+    external_attr). Данные записываются как есть, без распаковки и повторного сжатия.
+    """
+    central = []
+    with open(output_file, 'wb') as f:
+        for name, date_time, compress_type, crc, file_size, raw_data, external_attr in members:
+            try:
+                name_bytes, flags = name.encode('ascii'), 0
+            except UnicodeEncodeError:
+                name_bytes, flags = name.encode('utf-8'), ZIP_UTF8_FLAG
+            offset = f.tell()
+            if max(offset, file_size, len(raw_data)) > ZIP_MAX_SIZE:
+                raise ValueError("Архив слишком большой для записи без ZIP64")
+
+            dos_date, dos_time = dos_date_time(date_time)
+            fields = (flags, compress_type, dos_time, dos_date, crc, len(raw_data), file_size, len(name_bytes))
+            f.write(ZIP_LOCAL_HEADER.pack(b"PK\x03\x04", ZIP_VERSION, *fields, 0))
+            f.write(name_bytes)
+            f.write(raw_data)
+            central.append(ZIP_CENTRAL_HEADER.pack(b"PK\x01\x02", ZIP_VERSION, ZIP_VERSION, *fields,
+                                                   0, 0, 0, 0, external_attr, offset) + name_bytes)
+
+        central_offset = f.tell()
+        for record in central:
+            f.write(record)
+        central_size = f.tell() - central_offset
+        if len(central) > 0xFFFF or f.tell() > ZIP_MAX_SIZE:
+            raise ValueError("Архив слишком большой для записи без ZIP64")
+        f.write(ZIP_END_RECORD.pack(b"PK\x05\x06", 0, 0, len(central), len(central),
+                                    central_size, central_offset, 0))
+
+
+def deflate(data):
+    """Сжать данные для архива ZIP (deflate без заголовка zlib)"""
+    compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+FOOTNOTES_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.footnotes+xml"
+
+
+def get_cache_tag():
+    """Метка совместимости кэша: байткод зависит от версий Python, Jinja и docxtpl"""
+    return (f"{CACHE_FORMAT}-{importlib.util.MAGIC_NUMBER.hex()}-"
+            f"{jinja2.__version__}-{docxtpl.__version__}")
+
+
+class CachedTemplate:
+    """Разобранный шаблон: содержимое файла и скомпилированные Jinja-шаблоны частей документа.
+
+    Очистка XML и компиляция выполняются один раз на версию шаблона: результат (байткод Jinja)
+    сохраняется в cache_dir под хэшем содержимого файла и загружается оттуда в других процессах
+    и при следующих запусках.
+
+    Вместе с байткодом сохраняется список переменных, которые использует шаблон.
+
+    Готовый документ записывается без python-docx: в архив шаблона подставляются только
+    отрендеренные части, остальные файлы архива копируются без повторного сжатия.
+    """
+
+    def __init__(self, template_path, jinja_env, cache_dir=None):
+        self.template_path = template_path
+
+        with open(template_path, 'rb') as f:
+            self.blob = f.read()
+
+        self.content_hash = hashlib.sha256(self.blob).hexdigest()
+        cache_path = None
+        if cache_dir:
+            cache_key = hashlib.sha256(f"{self.content_hash}-{get_cache_tag()}".encode()).hexdigest()
+            cache_path = os.path.join(cache_dir, cache_key + ".bin")
+
+        compiled = self.load_compiled(cache_path) if cache_path else None
+        if compiled is None:
+            compiled = self.compile_template(jinja_env)
+            if cache_path:
+                self.save_compiled(cache_path, compiled)
+
+        body_code, parts, self.package_info, variables = compiled
+        self.variables = frozenset(variables)
+        self.body_template = self.template_from_code(jinja_env, body_code)
+
+        # Колонтитулы храним по ключу связи (rId) вместе с кодировкой и именем части в архиве
+        self.part_templates = {rel_key: (self.template_from_code(jinja_env, code), encoding, part_name)
+                               for rel_key, (code, encoding, part_name) in parts.items()}
+
+        # Сжатые данные неизменяемых файлов архива - заполняются при первой записи документа
+        self._raw_members = None
+
+    def compile_template(self, jinja_env):
+        """Разобрать шаблон: очистка XML и компиляция Jinja в байткод"""
+        parser = DocxTemplate(io.BytesIO(self.blob))
+        parser.init_docx()
+
+        variables = set()
+        body_code = self.compile_part(parser, parser.get_xml(), jinja_env, variables)
+
+        parts = {}
+        for uri in (DocxTemplate.HEADER_URI, DocxTemplate.FOOTER_URI):
+            for rel_key, part in parser.get_headers_footers(uri):
+                xml = parser.get_part_xml(part)
+                encoding = parser.get_headers_footers_encoding(xml)
+                parts[rel_key] = (self.compile_part(parser, xml, jinja_env, variables), encoding,
+                                  part.partname.lstrip('/'))
+
+        # Сноски и свойства документа docxtpl тоже рендерит - их переменные нужны в контексте
+        for text in self.get_extra_sources(parser):
+            variables.update(self.find_variables(jinja_env, text))
+
+        return body_code, parts, self.get_package_info(parser), sorted(variables)
+
+    def get_extra_sources(self, parser):
+        """Тексты с тегами Jinja вне тела и колонтитулов: свойства документа и сноски"""
+        sources = []
+        core_properties = parser.docx.core_properties
+        for name in RENDERED_CORE_PROPERTIES:
+            text = getattr(core_properties, name) or ''
+            if self.has_template_tags(text):
+                sources.append(text)
+
+        for part in parser.docx.part.package.parts:
+            if part.content_type == FOOTNOTES_CONTENT_TYPE:
+                blob = part.blob.decode('utf-8') if isinstance(part.blob, bytes) else part.blob
+                xml = parser.patch_xml(blob)
+                if self.has_template_tags(xml):
+                    sources.append(xml)
+        return sources
+
+    def get_package_info(self, parser):
+        """Сведения для записи документа на уровне архива: (имя document.xml, начало, конец).
+
+        Возвращает None, если шаблон нужно рендерить через python-docx: в свойствах документа
+        или сносках есть теги Jinja, либо тело документа не удалось выделить.
+        """
+        if self.get_extra_sources(parser):
+            return None
+
+        # Документ без тела: на его место потом вставляется отрендеренное тело
+        root = copy.deepcopy(parser.docx.element)
+        root.replace(root.body, etree.Comment(BODY_PLACEHOLDER))
+        xml = etree.tostring(root, encoding='UTF-8', standalone=True)
+        marker = f"<!--{BODY_PLACEHOLDER}-->".encode('utf-8')
+        if xml.count(marker) != 1:
+            return None
+
+        prefix, suffix = xml.split(marker)
+        return parser.docx.part.partname.lstrip('/'), prefix, suffix
+
+    @staticmethod
+    def has_template_tags(text):
+        return '{{' in text or '{%' in text or '{#' in text
+
+    @staticmethod
+    def compile_part(parser, xml, jinja_env, variables):
+        """Очистить XML части документа и скомпилировать его в байткод Jinja.
+
+        Переменные, которые использует часть, добавляются в множество variables.
+        """
+        xml = parser.patch_xml(xml)
+        # Та же подготовка, что и в DocxTemplate.render_xml_part
+        xml = re.sub(r"<w:p([ >])", r"\n<w:p\1", xml)
+        source = jinja_env.parse(xml)
+        variables.update(meta.find_undeclared_variables(source))
+        return jinja_env.compile(source)
+
+    @staticmethod
+    def find_variables(jinja_env, text):
+        """Переменные контекста, на которые ссылается текст шаблона Jinja"""
+        return meta.find_undeclared_variables(jinja_env.parse(text))
+
+    @staticmethod
+    def template_from_code(jinja_env, code):
+        """Создать Jinja-шаблон из готового байткода без повторной компиляции"""
+        return jinja_env.template_class.from_code(jinja_env, code, jinja_env.make_globals(None))
+
+    def load_compiled(self, cache_path):
+        """Загрузить скомпилированный шаблон из дискового кэша"""
+        try:
+            with open(cache_path, 'rb') as f:
+                return marshal.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Ошибка чтения кэша шаблона {os.path.basename(self.template_path)}: {e}")
+            return None
+
+    def save_compiled(self, cache_path, compiled):
+        """Сохранить скомпилированный шаблон в дисковый кэш"""
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            # Несколько процессов могут сохранять один шаблон одновременно - пишем через временный файл
+            temp_path = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'wb') as f:
+                marshal.dump(compiled, f)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"Ошибка сохранения кэша шаблона {os.path.basename(self.template_path)}: {e}")
+
+    def new_document(self):
+        """Получить свежую копию шаблона для рендеринга"""
+        return CachedDocxTemplate(self)
+
+    def render_to_file(self, context, output_file):
+        """Отрендерить шаблон и сохранить документ"""
+        doc = self.new_document()
+        if self.package_info is None:
+            doc.render(context)
+            doc.save(output_file)
+            return
+
+        # Рендерим те же части, что и DocxTemplate.render
+        doc.docx_ids_index = 1000
+        tree = doc.fix_tables(doc.render_compiled(self.body_template, context))
+        doc.fix_docpr_ids(tree)
+
+        document_name, prefix, suffix = self.package_info
+        replaced = {document_name: prefix + etree.tostring(tree, encoding='UTF-8') + suffix}
+        for template, encoding, part_name in self.part_templates.values():
+            replaced[part_name] = doc.render_compiled(template, context).encode(encoding)
+
+        try:
+            self.write_package(output_file, replaced)
+        except Exception as e:
+            # Нестандартный архив - сохраняем обычным способом
+            print(f"Быстрая запись {os.path.basename(self.template_path)} недоступна ({e}), "
+                  f"используется python-docx")
+            self.package_info = None
+            self.render_to_file(context, output_file)
+
+    def get_raw_members(self):
+        """Файлы архива шаблона со сжатыми данными, как они лежат в архиве"""
+        if self._raw_members is None:
+            members = []
+            with zipfile.ZipFile(io.BytesIO(self.blob)) as source:
+                for info in source.infolist():
+                    fields = ZIP_LOCAL_HEADER.unpack_from(self.blob, info.header_offset)
+                    # Длины имени файла и дополнительного поля локального заголовка
+                    data_offset = info.header_offset + ZIP_LOCAL_HEADER.size + fields[-2] + fields[-1]
+                    members.append((info, self.blob[data_offset:data_offset + info.compress_size]))
+            self._raw_members = members
+        return self._raw_members
+
+    def write_package(self, output_file, replaced):
+        """Записать .docx: отрендеренные части сжимаются заново, остальные копируются как есть"""
+        members = []
+        for info, raw_data in self.get_raw_members():
+            if info.filename in replaced:
+                data = replaced[info.filename]
+                members.append((info.filename, info.date_time, zipfile.ZIP_DEFLATED, zlib.crc32(data),
+                                len(data), deflate(data), info.external_attr))
+            else:
+                # Сжатые данные копируются без распаковки
+                members.append((info.filename, info.date_time, info.compress_type, info.CRC,
+                                info.file_size, raw_data, info.external_attr))
+        write_zip(output_file, members)
+
+
+class CachedDocxTemplate(DocxTemplate):
+    """DocxTemplate, который рендерит части документа из кэшированных скомпилированных шаблонов"""
+
+    def __init__(self, cached):
+        super().__init__(io.BytesIO(cached.blob))
+        self.cached = cached
+
+    def render_compiled(self, template, context):
+        """Выполнить скомпилированный шаблон и постобработать XML как DocxTemplate.render_xml_part"""
+        dst_xml = template.render(context)
+        dst_xml = re.sub(r"\n<w:p([ >])", r"<w:p\1", dst_xml)
+        dst_xml = (
+            dst_xml.replace("{_{", "{{")
+            .replace("}_}", "}}")
+            .replace("{_%", "{%")
+            .replace("%_}", "%}")
+        )
+        return self.resolve_listing(dst_xml)
+
+    def build_xml(self, context, jinja_env=None):
+        self.current_rendering_part = self.docx._part
+        return self.render_compiled(self.cached.body_template, context)
+
+    def build_headers_footers_xml(self, context, uri, jinja_env=None):
+        for rel_key, part in self.get_headers_footers(uri):
+            compiled = self.cached.part_templates.get(rel_key)
+            if compiled is None:
+                # Часть отсутствовала при разборе - рендерим обычным способом
+                xml = self.get_part_xml(part)
+                encoding = self.get_headers_footers_encoding(xml)
+                xml = self.render_xml_part(self.patch_xml(xml), part, context, jinja_env)
+                yield rel_key, xml.encode(encoding)
+                continue
+
+            template, encoding, _ = compiled
+            self.current_rendering_part = part
+            yield rel_key, self.render_compiled(template, context).encode(encoding)
+
+
+class TemplateCache:
+    """Кэш шаблонов на весь процесс с проверкой по пути, времени изменения и размеру файла"""
+
+    def __init__(self, cache_dir=None):
+        self._lock = threading.Lock()
+        self._entries = {}
+        self.jinja_env = Environment()
+        # Папка дискового кэша скомпилированных шаблонов (None - только в памяти)
+        self.cache_dir = cache_dir
+
+    def set_cache_dir(self, cache_dir):
+        """Задать папку дискового кэша скомпилированных шаблонов"""
+        self.cache_dir = cache_dir
+
+    def get(self, template_path):
+        """Получить разобранный шаблон, перечитав файл только при его изменении"""
+        path = os.path.abspath(template_path)
+        stat = os.stat(path)
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry and entry[0] == key:
+                return entry[1]
+
+        cached = CachedTemplate(path, self.jinja_env, self.cache_dir)
+
+        with self._lock:
+            self._entries[path] = (key, cached)
+
+        return cached
+
+    def invalidate(self, template_path=None):
+        """Сбросить кэш для одного шаблона или целиком"""
+        with self._lock:
+            if template_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(template_path), None)
+
+
+_template_cache = TemplateCache()
+
+
+def get_template_cache():
+    """Получить общий для процесса кэш шаблонов"""
+    return _template_cache
@@ -0,0 +1,118 @@
+# template_index.py - манифест шаблонов: какие поля анкеты использует каждый шаблон
+import os
+import json
+import threading
+
+
+# Файл манифеста в папке кэша шаблонов
+MANIFEST_FILE = "manifest.json"
+
+# Версия формата манифеста
+MANIFEST_FORMAT = 1
+
+
+class TemplateIndex:
+    """Манифест шаблонов: хэш содержимого и переменные Jinja каждого шаблона.
+
+    Запись шаблона проверяется по времени изменения и размеру файла - пока файл не менялся,
+    шаблон не нужно ни читать, ни разбирать. Манифест хранится в JSON-файле (None - только в памяти).
+    """
+
+    def __init__(self, manifest_path=None):
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        self._entries = self.load()
+        self._dirty = False
+
+    def load(self):
+        """Загрузить манифест с диска"""
+        if not self.manifest_path or not os.path.exists(self.manifest_path):
+            return {}
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("format") != MANIFEST_FORMAT:
+                return {}
+            return data.get("templates", {})
+        except Exception as e:
+            print(f"Ошибка загрузки манифеста шаблонов: {e}")
+            return {}
+
+    def save(self):
+        """Сохранить манифест на диск, если в нем что-то изменилось"""
+        with self._lock:
+            if not self.manifest_path or not self._dirty:
+                return
+            data = {"format": MANIFEST_FORMAT, "templates": dict(self._entries)}
+            self._dirty = False
+
+        try:
+            os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+            temp_path = f"{self.manifest_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, self.manifest_path)
+        except Exception as e:
+            print(f"Ошибка сохранения манифеста шаблонов: {e}")
+
+    def get(self, template_path, save=True):
+        """Запись манифеста шаблона: {'size', 'mtime_ns', 'hash', 'variables'}.
+
+        Шаблон разбирается, только если файл изменился с момента последнего индексирования.
+        """
+        path = os.path.abspath(template_path)
+        stat = os.stat(path)
+
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry
+
+        # Разбор шаблона попадает в общий кэш и используется потом при рендеринге
+        from template_cache import get_template_cache
+        template_cache = get_template_cache()
+        if template_cache.cache_dir is None and self.manifest_path:
+            # Манифест лежит в папке дискового кэша скомпилированных шаблонов
+            template_cache.set_cache_dir(os.path.dirname(self.manifest_path))
+        cached = template_cache.get(path)
+
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "hash": cached.content_hash,
+            "variables": sorted(cached.variables)
+        }
+        with self._lock:
+            self._entries[path] = entry
+            self._dirty = True
+
+        if save:
+            self.save()
+        return entry
+
+    def get_entries(self, templates_dir, template_files):
+        """Записи манифеста для списка шаблонов {имя файла: запись или None, если шаблон не разобрался}"""
+        entries = {}
+        for template_file in template_files:
+            try:
+                entries[template_file] = self.get(os.path.join(templates_dir, template_file), save=False)
+            except Exception as e:
+                # Ошибку шаблона покажет рендеринг
+                print(f"Ошибка индексирования шаблона {template_file}: {e}")
+                entries[template_file] = None
+        self.save()
+        return entries
+
+    def get_variables(self, template_path):
+        """Переменные Jinja, которые использует шаблон"""
+        return self.get(template_path)["variables"]
+
+    def invalidate(self, template_path=None):
+        """Сбросить запись одного шаблона или весь манифест"""
+        with self._lock:
+            if template_path is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(os.path.abspath(template_path), None)
+            self._dirty = True
@@ -0,0 +1,70 @@
+# template_registry.py - список шаблонов документов в папке с их метаданными
+import os
+import threading
+
+
+TEMPLATE_EXTENSION = ".docx"
+
+# Временные файлы Word для открытых документов (~$имя.docx)
+WORD_LOCK_PREFIX = "~$"
+
+
+def is_template_file(name):
+    """Файл шаблона документа (без временных файлов Word)"""
+    return name.lower().endswith(TEMPLATE_EXTENSION) and not name.startswith(WORD_LOCK_PREFIX)
+
+
+class TemplateRegistry:
+    """Шаблоны документов в папке templates_dir: список файлов и сведения о каждом.
+
+    Список хранится в памяти и перечитывается, только когда меняется время изменения папки
+    (файлы добавлены, удалены или переименованы) - для выбора шаблонов достаточно одного stat.
+    Хэш и переменные шаблонов берутся из манифеста template_index.
+    """
+
+    def __init__(self, templates_dir, template_index):
+        self.templates_dir = os.path.abspath(templates_dir)
+        self.template_index = template_index
+        self._lock = threading.Lock()
+        self._dir_mtime_ns = None
+        self._templates = []
+
+    def refresh(self):
+        """Перечитать папку, если она изменилась. Возвращает True, если список обновлен"""
+        try:
+            dir_mtime_ns = os.stat(self.templates_dir).st_mtime_ns
+        except OSError:
+            dir_mtime_ns = None
+
+        with self._lock:
+            if dir_mtime_ns is not None and dir_mtime_ns == self._dir_mtime_ns:
+                return False
+
+        templates = []
+        if dir_mtime_ns is not None:
+            with os.scandir(self.templates_dir) as entries:
+                templates = sorted(entry.name for entry in entries
+                                   if is_template_file(entry.name) and entry.is_file())
+
+        with self._lock:
+            self._templates = templates
+            self._dir_mtime_ns = dir_mtime_ns
+        return True
+
+    def exists(self):
+        """Папка шаблонов существует"""
+        self.refresh()
+        return self._dir_mtime_ns is not None
+
+    def get_templates(self):
+        """Имена файлов шаблонов по алфавиту"""
+        self.refresh()
+        with self._lock:
+            return list(self._templates)
+
+    def get_metadata(self):
+        """Сведения о шаблонах {имя файла: {'size', 'mtime_ns', 'hash', 'variables'}}.
+
+        Хэш и переменные - из манифеста; шаблоны, которые не удалось разобрать, получают None.
+        """
+        return self.template_index.get_entries(self.templates_dir, self.get_templates())
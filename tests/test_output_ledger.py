@@ -0,0 +1,56 @@
+# test_output_ledger.py - журнал созданных документов
+from output_ledger import LEDGER_FILE, OutputLedger, get_inputs_hash
+
+
+def test_inputs_hash_depends_on_template_and_context():
+    inputs_hash = get_inputs_hash("template", {'n': "Иванов"})
+    assert inputs_hash == get_inputs_hash("template", {'n': "Иванов"})
+    assert inputs_hash != get_inputs_hash("other", {'n': "Иванов"})
+    assert inputs_hash != get_inputs_hash("template", {'n': "Петров"})
+
+
+def test_fresh_until_file_or_inputs_change(tmp_path):
+    output_file = tmp_path / "Иванов" / "Документ.docx"
+    output_file.parent.mkdir()
+    output_file.write_bytes(b"document")
+
+    ledger = OutputLedger(str(tmp_path))
+    assert not ledger.is_fresh(str(output_file), "hash")
+    ledger.record(str(output_file), "hash")
+    ledger.close()
+
+    # Журнал сохранен в корневой папке и читается заново
+    assert (tmp_path / LEDGER_FILE).exists()
+    ledger = OutputLedger(str(tmp_path))
+    try:
+        assert ledger.is_fresh(str(output_file), "hash")
+        assert not ledger.is_fresh(str(output_file), "other hash")
+
+        # Файл изменен вручную
+        output_file.write_bytes(b"edited document")
+        assert not ledger.is_fresh(str(output_file), "hash")
+
+        # Файл удален
+        output_file.unlink()
+        assert not ledger.is_fresh(str(output_file), "hash")
+    finally:
+        ledger.close()
+
+
+def test_records_are_relative_to_save_root(tmp_path):
+    first_root = tmp_path / "first"
+    output_file = first_root / "Документ.docx"
+    first_root.mkdir()
+    output_file.write_bytes(b"document")
+
+    ledger = OutputLedger(str(first_root))
+    ledger.record(str(output_file), "hash")
+    ledger.close()
+
+    # Перенесенная папка документов остается актуальной
+    moved_root = first_root.rename(tmp_path / "moved")
+    ledger = OutputLedger(str(moved_root))
+    try:
+        assert ledger.is_fresh(str(moved_root / "Документ.docx"), "hash")
+    finally:
+        ledger.close()
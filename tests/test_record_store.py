@@ -0,0 +1,145 @@
+# test_record_store.py - хранение анкет в Excel
+import os
+
+import openpyxl
+
+from record_store import (FIELD_KEYS, RECORD_INSERTED, RECORD_UPDATED, RECORD_REMOVED, RECORDS_RESET,
+                          ExcelRecordStore, SQLiteRecordStore, iter_excel_records)
+
+
+class TableListener:
+    """Подписчик, который ведет записи так же, как модель таблицы: по '_id'"""
+
+    def __init__(self, store):
+        self.store = store
+        self.rows = {}
+        self.reset()
+
+    def reset(self):
+        # Копии записей, как значения в колонках модели таблицы
+        self.rows = {record['_id']: dict(record) for record in self.store.get_records()}
+
+    def __call__(self, changes):
+        if any(kind == RECORDS_RESET for kind, _ in changes):
+            self.reset()
+            return
+        for kind, data in changes:
+            if kind in (RECORD_INSERTED, RECORD_UPDATED):
+                # Неизвестный '_id' модель таблицы добавляет новой строкой
+                self.rows[data['_id']] = data
+            elif kind == RECORD_REMOVED:
+                removed = self.rows.pop(data, None)
+                if removed is not None and self.store.ROWS_SHIFT_ON_REMOVE:
+                    for record in self.rows.values():
+                        if record['_row_number'] > removed['_row_number']:
+                            record['_row_number'] -= 1
+
+
+def write_workbook(path, rows):
+    wb = openpyxl.Workbook()
+    sheet = wb.active
+    for col, (_, label) in enumerate(FIELD_KEYS, 1):
+        sheet.cell(row=1, column=col, value=label)
+    for row in rows:
+        sheet.append([row.get(key, "") for key, _ in FIELD_KEYS])
+    wb.save(path)
+
+
+def test_save_after_external_edit_resets_listeners(tmp_path):
+    path = str(tmp_path / "анкеты.xlsx")
+    write_workbook(path, [{'n': 'Иванов', 'fn': 'Иван', 'cn': '1'},
+                          {'n': 'Петров', 'fn': 'Петр', 'cn': '2'}])
+
+    store = ExcelRecordStore(path)
+    listener = TableListener(store)
+    store.add_listener(listener)
+
+    # Файл изменили в Excel: исправили имя во второй строке
+    wb = openpyxl.load_workbook(path)
+    wb.active.cell(row=3, column=2, value='Павел')
+    wb.save(path)
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    # Поиск по ФИО перечитывает файл до сохранения
+    row_number = store.find_row_by_fullname({'n': 'Иванов', 'fn': 'Иван', 'mn': ''})
+    success, _ = store.save({'_row_number': row_number, 'n': 'Иванов', 'fn': 'Иван', 'cn': '10'})
+
+    assert success
+    records = store.get_records()
+    assert len(listener.rows) == len(records) == 2
+    assert sorted(record['fn'] for record in listener.rows.values()) == ['Иван', 'Павел']
+    assert sorted(record['cn'] for record in listener.rows.values()) == ['10', '2']
+
+
+def test_first_load_does_not_reset(tmp_path):
+    path = str(tmp_path / "анкеты.xlsx")
+    write_workbook(path, [{'n': 'Иванов', 'fn': 'Иван'}])
+
+    store = ExcelRecordStore(path)
+    changes = []
+    store.add_listener(changes.extend)
+
+    store.get_records()
+    store.get_records()
+    assert changes == []
+
+
+def test_import_reports_duplicate_cn_and_keeps_source(tmp_path):
+    source = str(tmp_path / "анкеты.xlsx")
+    mirror = str(tmp_path / "копия.xlsx")
+    write_workbook(source, [{'n': 'Иванов', 'fn': 'Иван', 'cn': '990600'},
+                            {'n': 'Петров', 'fn': 'Петр', 'cn': '990600'}])
+    before = open(source, 'rb').read()
+
+    store = SQLiteRecordStore(str(tmp_path / "анкеты.db"), mirror)
+    success, message = store.import_from_excel(source)
+    store.close()
+
+    assert success
+    assert store_count(tmp_path) == 1
+    assert "строка 3: Петров Петр, УЧО 990600" in message
+    # Исходная книга не тронута, копия из базы пишется в отдельный файл
+    assert open(source, 'rb').read() == before
+    assert [record['n'] for record in iter_excel_records(mirror)] == ['Иванов']
+
+
+def test_import_does_not_overwrite_mirror_source_after_skips(tmp_path):
+    path = str(tmp_path / "анкеты.xlsx")
+    write_workbook(path, [{'n': 'Иванов', 'fn': 'Иван', 'cn': '1'},
+                          {'n': 'Петров', 'fn': 'Петр', 'cn': '1'}])
+
+    store = SQLiteRecordStore(str(tmp_path / "анкеты.db"), path)
+    store.import_from_excel(path)
+    store.close()
+
+    assert len(list(iter_excel_records(path))) == 2
+
+
+def store_count(tmp_path):
+    store = SQLiteRecordStore(str(tmp_path / "анкеты.db"))
+    try:
+        return store.count()
+    finally:
+        store.close()
+
+
+def test_delete_sends_single_change(tmp_path):
+    path = str(tmp_path / "анкеты.xlsx")
+    write_workbook(path, [{'n': f'Фамилия{i}', 'fn': 'Имя', 'cn': str(i)} for i in range(50)])
+
+    store = ExcelRecordStore(path)
+    listener = TableListener(store)
+    store.add_listener(listener)
+    changes = []
+    store.add_listener(changes.extend)
+
+    store.delete(3)
+
+    assert changes == [(RECORD_REMOVED, changes[0][1])]
+    # Номера строк ниже удаленной подписчик сдвигает сам
+    expected = [(i + 2, f'Фамилия{i}') for i in range(50) if i != 1]
+    expected = [(row_number - 1 if row_number > 3 else row_number, n) for row_number, n in expected]
+    assert sorted((record['_row_number'], record['n']) for record in listener.rows.values()) == expected
+    assert sorted((record['_row_number'], record['n']) for record in store.get_records()) == expected
+    assert store.find_row_by_fullname({'n': 'Фамилия2', 'fn': 'Имя', 'mn': ''}) == 3
@@ -0,0 +1,133 @@
+# test_render_engine.py - создание документов и пропуск неизменившихся
+import os
+import threading
+
+import pytest
+from docx import Document
+
+from render_engine import RenderEngine, get_folder_name
+
+
+TEMPLATES = ("Анкета.docx", "Согласие.docx")
+
+FIELDS = {'n': "Иванов", 'fn': "Иван", 'mn': "Иванович", 'cn': "123456", 'reg': "г. Москва"}
+
+
+def write_template(path, text):
+    document = Document()
+    document.add_paragraph(text)
+    document.save(path)
+
+
+@pytest.fixture
+def templates_dir(tmp_path):
+    path = tmp_path / "Шаблоны"
+    path.mkdir()
+    write_template(path / "Анкета.docx", "{{ n }} {{ fn }}, УЧО {{ cn }}")
+    write_template(path / "Согласие.docx", "{{ n_c }} проживает: {{ reg }}")
+    return path
+
+
+@pytest.fixture
+def save_root(tmp_path):
+    path = tmp_path / "документы"
+    path.mkdir()
+    return path
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = RenderEngine(1, False, str(tmp_path / ".templates_cache"))
+    yield engine
+    engine.shutdown()
+
+
+def render(engine, templates_dir, save_root, records=(FIELDS,), **kwargs):
+    return engine.render_records(list(records), str(templates_dir), list(TEMPLATES), str(save_root), **kwargs)
+
+
+def output_path(save_root, template_file, fields=FIELDS):
+    return save_root / get_folder_name(fields) / template_file
+
+
+def test_first_run_creates_all(engine, templates_dir, save_root):
+    summary = render(engine, templates_dir, save_root)
+
+    assert summary == {'records': 1, 'files': 2, 'skipped': 0, 'errors': [], 'cancelled': False}
+    text = Document(str(output_path(save_root, "Анкета.docx"))).paragraphs[0].text
+    assert text == "Иванов Иван, УЧО 123456"
+
+
+def test_unchanged_documents_are_skipped(engine, templates_dir, save_root):
+    render(engine, templates_dir, save_root)
+    summary = render(engine, templates_dir, save_root)
+
+    # Пропущенные документы входят в число файлов записи
+    assert summary['files'] == 2
+    assert summary['skipped'] == 2
+
+
+def test_force_recreates_all(engine, templates_dir, save_root):
+    render(engine, templates_dir, save_root)
+    summary = render(engine, templates_dir, save_root, force=True)
+
+    assert summary['files'] == 2
+    assert summary['skipped'] == 0
+
+
+def test_edited_template_is_recreated(engine, templates_dir, save_root):
+    render(engine, templates_dir, save_root)
+    write_template(templates_dir / "Анкета.docx", "Фамилия: {{ n }}, УЧО {{ cn }}")
+
+    summary = render(engine, templates_dir, save_root)
+
+    assert summary['skipped'] == 1
+    text = Document(str(output_path(save_root, "Анкета.docx"))).paragraphs[0].text
+    assert text == "Фамилия: Иванов, УЧО 123456"
+
+
+def test_only_templates_using_changed_field_are_recreated(engine, templates_dir, save_root):
+    render(engine, templates_dir, save_root)
+
+    # УЧО используется только в анкете
+    summary = render(engine, templates_dir, save_root, [dict(FIELDS, cn="654321")])
+    assert summary['files'] == 2
+    assert summary['skipped'] == 1
+
+    # Поле, которого нет в шаблонах, документы не пересоздает
+    summary = render(engine, templates_dir, save_root, [dict(FIELDS, cn="654321", pn="000000")])
+    assert summary['skipped'] == 2
+
+
+def test_deleted_or_edited_output_is_recreated(engine, templates_dir, save_root):
+    render(engine, templates_dir, save_root)
+    os.remove(output_path(save_root, "Анкета.docx"))
+    output_path(save_root, "Согласие.docx").write_bytes(b"edited by hand")
+
+    summary = render(engine, templates_dir, save_root)
+
+    assert summary['skipped'] == 0
+    assert output_path(save_root, "Анкета.docx").exists()
+    text = Document(str(output_path(save_root, "Согласие.docx"))).paragraphs[0].text
+    assert text == "ИВАНОВ проживает: г. Москва"
+
+
+def test_record_without_name_is_reported(engine, templates_dir, save_root):
+    done = []
+    summary = render(engine, templates_dir, save_root, [FIELDS, {'n': "Петров"}],
+                     on_record_done=lambda name, files: done.append(name))
+
+    assert summary['records'] == 1
+    assert summary['files'] == 2
+    assert summary['errors'] == [("Петров", "Фамилия и имя обязательны")]
+    assert done == ["Иванов Иван Иванович"]
+
+
+def test_cancel_stops_rendering(engine, templates_dir, save_root):
+    cancel_event = threading.Event()
+    cancel_event.set()
+
+    summary = render(engine, templates_dir, save_root, cancel_event=cancel_event)
+
+    assert summary['cancelled']
+    assert summary['files'] == 1
@@ -0,0 +1,36 @@
+# test_template_cache.py - запись документа из кэшированного шаблона
+import zipfile
+
+from docx import Document
+
+from template_cache import TemplateCache
+
+
+def write_template(path):
+    """Шаблон с переменными в тексте и в верхнем колонтитуле"""
+    document = Document()
+    document.sections[0].header.paragraphs[0].text = "{{ n }}"
+    document.add_paragraph("Фамилия: {{ n }}, имя: {{ fn }}")
+    document.save(path)
+
+
+def test_written_package_is_valid_zip(tmp_path):
+    template_path = tmp_path / "Шаблон.docx"
+    output_path = tmp_path / "Документ.docx"
+    write_template(template_path)
+
+    cached = TemplateCache().get(str(template_path))
+    assert cached.package_info is not None
+    cached.render_to_file({'n': "Иванов", 'fn': "Иван"}, str(output_path))
+    # Без перехода на запись через python-docx
+    assert cached.package_info is not None
+
+    with zipfile.ZipFile(output_path) as package:
+        assert package.testzip() is None
+        with zipfile.ZipFile(template_path) as source:
+            assert package.namelist() == source.namelist()
+        document_xml = package.read("word/document.xml").decode("utf-8")
+        assert "Фамилия: Иванов, имя: Иван" in document_xml
+
+    # Документ открывается python-docx
+    assert "Иванов" in Document(str(output_path)).paragraphs[-1].text
@@ -0,0 +1,203 @@
+# test_update_downloader.py - скачивание обновления с докачкой и проверкой SHA-256
+import os
+import hashlib
+import json
+
+import pytest
+import requests
+
+import update_manager
+from update_manager import UpdateDownloader
+
+
+URL = "https://example.com/DocumentFiller_20260101_120000.zip"
+CONTENT = bytes(range(256)) * 64
+SHA256 = hashlib.sha256(CONTENT).hexdigest()
+
+
+class StubRaw:
+    """Тело ответа; fail_at - после скольких байт оборвать соединение"""
+
+    def __init__(self, body, fail_at=None):
+        self.body = body
+        self.position = 0
+        self.fail_at = fail_at
+
+    def read(self, size):
+        if self.fail_at is not None and self.position >= self.fail_at:
+            raise OSError("connection reset")
+        end = self.position + size
+        if self.fail_at is not None:
+            end = min(end, self.fail_at)
+        chunk = self.body[self.position:end]
+        self.position += len(chunk)
+        return chunk
+
+
+class StubResponse:
+    def __init__(self, status_code, headers, body, fail_at=None):
+        self.status_code = status_code
+        self.headers = headers
+        self.raw = StubRaw(body, fail_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"HTTP {self.status_code}", response=self)
+
+
+class StubServer:
+    """Сервер релиза: отдает content с поддержкой Range/If-Range (или без нее)"""
+
+    def __init__(self, content=CONTENT, etag='"v1"', support_range=True, fail_at=None, status_code=200):
+        self.content = content
+        self.etag = etag
+        self.support_range = support_range
+        self.fail_at = fail_at
+        self.status_code = status_code
+        # Ошибка соединения при каждом запросе
+        self.error = None
+        self.requests = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        headers = dict(headers or {})
+        self.requests.append(headers)
+        if self.error is not None:
+            raise self.error
+        # Обрыв соединения - только при первом запросе
+        fail_at, self.fail_at = self.fail_at, None
+
+        if self.status_code != 200:
+            return StubResponse(self.status_code, {}, b"")
+
+        range_header = headers.get('Range')
+        if_range = headers.get('If-Range')
+        if range_header and self.support_range and if_range in (None, self.etag):
+            start = int(range_header[len('bytes='):-1])
+            body = self.content[start:]
+            return StubResponse(206, {
+                'ETag': self.etag,
+                'Content-Length': str(len(body)),
+                'Content-Range': f"bytes {start}-{len(self.content) - 1}/{len(self.content)}"
+            }, body, fail_at)
+
+        return StubResponse(200, {'ETag': self.etag, 'Content-Length': str(len(self.content))},
+                            self.content, fail_at)
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = StubServer()
+    monkeypatch.setattr(requests, "get", server.get)
+    # Повторные попытки без пауз
+    monkeypatch.setattr(update_manager.time, "sleep", lambda delay: None)
+    return server
+
+
+@pytest.fixture
+def downloader(tmp_path):
+    return UpdateDownloader(URL, str(tmp_path / "update.zip"), expected_sha256=SHA256)
+
+
+def write_partial(downloader, data, url=URL, etag='"v1"'):
+    """Недокачанный файл от прошлого запуска"""
+    with open(downloader.part_path, 'wb') as f:
+        f.write(data)
+    with open(downloader.meta_path, 'w', encoding='utf-8') as f:
+        json.dump({"url": url, "etag": etag, "last_modified": None, "total": len(CONTENT)}, f)
+
+
+def assert_installed(downloader, result):
+    assert result == (True, downloader.target_path)
+    with open(downloader.target_path, 'rb') as f:
+        assert f.read() == CONTENT
+    assert not os.path.exists(downloader.part_path)
+    assert not os.path.exists(downloader.meta_path)
+
+
+def assert_not_installed(downloader, result):
+    assert result[0] is False
+    assert not os.path.exists(downloader.target_path)
+
+
+def test_resume_from_partial_file(server, downloader):
+    write_partial(downloader, CONTENT[:1000])
+
+    result = downloader.download()
+
+    assert server.requests[0]['Range'] == "bytes=1000-"
+    assert server.requests[0]['If-Range'] == '"v1"'
+    assert_installed(downloader, result)
+
+
+def test_server_ignoring_range_restarts_from_zero(server, downloader):
+    server.support_range = False
+    write_partial(downloader, CONTENT[:1000])
+
+    assert_installed(downloader, downloader.download())
+
+
+def test_changed_etag_restarts_from_zero(server, downloader):
+    # Файл на сервере заменен - старая часть не должна склеиться с новой
+    server.etag = '"v2"'
+    write_partial(downloader, b"\0" * 1000, etag='"v1"')
+
+    assert_installed(downloader, downloader.download())
+
+
+def test_partial_file_of_other_url_is_not_resumed(server, downloader):
+    write_partial(downloader, b"\0" * 1000, url="https://example.com/old.zip")
+
+    result = downloader.download()
+
+    assert 'Range' not in server.requests[0]
+    assert_installed(downloader, result)
+
+
+def test_retry_resumes_after_connection_reset(server, downloader):
+    server.fail_at = 5000
+
+    result = downloader.download()
+
+    assert len(server.requests) == 2
+    assert server.requests[1]['Range'] == "bytes=5000-"
+    assert_installed(downloader, result)
+
+
+def test_retries_are_limited(server, downloader):
+    server.error = requests.exceptions.ConnectionError("no network")
+    downloader.retries = 2
+
+    result = downloader.download()
+
+    assert len(server.requests) == 3
+    assert_not_installed(downloader, result)
+
+
+def test_client_error_is_not_retried(server, downloader):
+    server.status_code = 404
+
+    result = downloader.download()
+
+    assert len(server.requests) == 1
+    assert_not_installed(downloader, result)
+
+
+@pytest.mark.parametrize("partial", [None, b"\0" * 1000])
+def test_checksum_mismatch_installs_nothing(server, downloader, partial):
+    if partial is not None:
+        # Поврежденная часть от прошлого запуска докачивается, но не проходит проверку
+        write_partial(downloader, partial)
+
+    downloader.expected_sha256 = "0" * 64
+    result = downloader.download()
+
+    assert_not_installed(downloader, result)
+    assert "Контрольная сумма не совпадает" in result[1]
+    # Поврежденный файл удален - следующая попытка начнется с нуля
+    assert not os.path.exists(downloader.part_path)
@@ -0,0 +1,97 @@
+# test_update_manager.py - проверка контрольной суммы архива и манифеста обновления
+import io
+import json
+import hashlib
+
+import requests
+
+from update_manager import UpdateManager, find_release_archive
+
+
+ARCHIVE = "DocumentFiller_20260101_120000.zip"
+HASH = "ab" * 32
+OTHER_HASH = "cd" * 32
+
+
+def test_checksum_matched_by_exact_name():
+    text = f"{OTHER_HASH}  DocumentFiller.exe\n{HASH}  {ARCHIVE}\n"
+    assert UpdateManager.parse_checksum(text, ARCHIVE) == HASH
+
+
+def test_checksum_of_other_file_is_not_accepted():
+    assert UpdateManager.parse_checksum(f"{OTHER_HASH}  v1.2.0.zip\n", ARCHIVE) is None
+    assert UpdateManager.parse_checksum(f"SHA256: {OTHER_HASH}\n", ARCHIVE) is None
+    assert UpdateManager.parse_checksum(f"{OTHER_HASH}\n", ARCHIVE) is None
+
+
+def test_bare_hash_accepted_only_from_own_sha256_file():
+    assert UpdateManager.parse_checksum(f"{HASH}\n", ARCHIVE, single_file=True) == HASH
+
+
+def test_release_archive_is_published_asset():
+    assets = [{"name": "manifest.json", "url": "https://example.com/manifest.json"},
+              {"name": ARCHIVE, "url": f"https://example.com/{ARCHIVE}"}]
+    assert find_release_archive(assets)["name"] == ARCHIVE
+    assert find_release_archive(assets[:1]) is None
+
+
+class StubRelease:
+    """Файлы релиза по URL для requests.get"""
+
+    def __init__(self, files):
+        self.files = files
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        return StubResponse(self.files[url])
+
+
+class StubResponse:
+    def __init__(self, content):
+        self.content = content
+        self.text = content.decode('utf-8')
+        self.status_code = 200
+        self.headers = {'Content-Length': str(len(content))}
+        self.raw = io.BytesIO(content)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def raise_for_status(self):
+        pass
+
+
+MANIFEST = json.dumps({"version": "2.0.0", "files": {"DocumentFiller.exe": {
+    "sha256": HASH, "size": 10, "asset": "DocumentFiller.exe"}}}).encode('utf-8')
+
+
+def fetch_manifest(monkeypatch, sha256sums, manifest=MANIFEST):
+    release = StubRelease({"https://example.com/manifest.json": manifest,
+                           "https://example.com/SHA256SUMS": sha256sums.encode('utf-8')})
+    monkeypatch.setattr(requests, "get", release.get)
+    update_info = {"tag_name": "v2.0.0", "assets": [
+        {"name": "manifest.json", "url": "https://example.com/manifest.json"},
+        {"name": "SHA256SUMS", "url": "https://example.com/SHA256SUMS"}]}
+    return UpdateManager().fetch_release_manifest(update_info)
+
+
+def test_manifest_verified_by_sha256sums(monkeypatch):
+    sha256sums = f"{hashlib.sha256(MANIFEST).hexdigest()}  manifest.json\n"
+    assert fetch_manifest(monkeypatch, sha256sums)["version"] == "2.0.0"
+
+
+def test_tampered_manifest_is_rejected(monkeypatch):
+    sha256sums = f"{hashlib.sha256(MANIFEST).hexdigest()}  manifest.json\n"
+    assert fetch_manifest(monkeypatch, sha256sums, MANIFEST.replace(b"2.0.0", b"6.6.6")) is None
+
+
+def test_manifest_without_checksum_is_not_used(monkeypatch):
+    assert fetch_manifest(monkeypatch, f"{OTHER_HASH}  {ARCHIVE}\n") is None
+
+
+def test_manifest_paths_unsafe_for_update_script_are_rejected():
+    assert UpdateManager.normalize_manifest_path("lib\\Qt5Core.dll") == "lib/Qt5Core.dll"
+    for path in ("../license.db", "C:/Windows/system32.dll", "a%PATH%.dll", "a&del.dll", "a^b.dll"):
+        assert UpdateManager.normalize_manifest_path(path) is None
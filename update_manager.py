@@ -4,14 +4,276 @@ import sys
 import json
 import shutil
 import tempfile
-import requests
 import subprocess
 import re
+import time
+import hashlib
+import urllib.parse
 from pathlib import Path
 from datetime import datetime
 import zipfile
 
 
+# requests импортируется внутри методов, работающих с сетью: он нужен только
+# при проверке и установке обновлений и заметно замедляет запуск программы
+
+# Файл с последним полученным описанием релиза и его ETag
+RELEASE_CACHE_FILE = "release_cache.json"
+
+# Манифест релиза (пути файлов и их SHA-256) и манифест установленной версии
+RELEASE_MANIFEST_ASSET = "manifest.json"
+# Архив программы среди файлов релиза (его создает create_release.py)
+RELEASE_ARCHIVE_PATTERN = re.compile(r'DocumentFiller_.+\.zip', re.IGNORECASE)
+INSTALLED_MANIFEST_FILE = "installed_manifest.json"
+
+# Данные пользователя в папке программы: не попадают в манифест релиза и не заменяются обновлением
+USER_DATA_FILES = (
+    "анкеты_данные.xlsx", "анкеты_данные.db", "анкеты_данные_из_базы.xlsx",
+    "license.db", "license.json", "license_backup.json", "license_actions.log", ".trial_used",
+    "window_geometry.json", RELEASE_CACHE_FILE, INSTALLED_MANIFEST_FILE
+)
+USER_DATA_DIRS = ("Шаблоны", ".templates_cache", "документы")
+# Служебные файлы SQLite рядом с базой
+SQLITE_SUFFIXES = ("-wal", "-shm", "-journal")
+
+# Символы, которые ломают синтаксис BAT-скрипта обновления: такие пути в манифесте не принимаются
+BATCH_UNSAFE_CHARS = '%&^"<>|'
+
+# Сколько раз (раз в секунду) скрипт обновления пытается заменить занятые файлы
+UPDATE_COPY_RETRIES = 60
+# Файл с сообщением скрипта обновления о неудачной замене файлов
+UPDATE_ERROR_FILE = "update_error.txt"
+
+# Сообщение установки, когда все файлы уже совпадают с новой версией
+ALREADY_UP_TO_DATE = "Установлена актуальная версия - обновлять нечего."
+
+# Границы размера порции при скачивании обновления
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+# Сколько раз докачивать файл после обрыва соединения
+DOWNLOAD_RETRIES = 5
+
+
+def is_user_data_path(path):
+    """Путь (относительно папки программы, через '/') указывает на данные пользователя"""
+    parts = [part.lower() for part in path.split('/')]
+    if any(part in (name.lower() for name in USER_DATA_DIRS) for part in parts[:-1]):
+        return True
+
+    name = parts[-1]
+    for suffix in SQLITE_SUFFIXES:
+        if name.endswith(suffix):
+            name = name[:-len(suffix)]
+    return name in (user_file.lower() for user_file in USER_DATA_FILES)
+
+
+def find_release_archive(assets):
+    """Архив программы среди файлов релиза или None"""
+    for asset in assets:
+        if RELEASE_ARCHIVE_PATTERN.fullmatch(asset.get('name', '')):
+            return asset
+    return None
+
+
+class DownloadCancelled(Exception):
+    """Скачивание отменено пользователем"""
+
+
+class UpdateDownloader:
+    """Скачивание файла с докачкой после обрыва (HTTP Range) и проверкой SHA-256.
+
+    Недокачанные данные хранятся в target_path + '.part', поэтому повторный запуск
+    продолжает скачивание с того же места. Размер порции подстраивается под скорость канала.
+    """
+
+    def __init__(self, url, target_path, headers=None, expected_sha256=None,
+                 progress_callback=None, cancel_event=None, retries=DOWNLOAD_RETRIES):
+        self.url = url
+        self.target_path = target_path
+        self.part_path = target_path + ".part"
+        self.meta_path = target_path + ".part.json"
+        self.headers = dict(headers or {})
+        # Сжатие ломает смещения при докачке
+        self.headers['Accept-Encoding'] = 'identity'
+        self.expected_sha256 = expected_sha256.lower() if expected_sha256 else None
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.retries = retries
+        self.chunk_size = 64 * 1024
+
+    def load_meta(self):
+        """Сведения о недокачанном файле: URL, ETag, Last-Modified, размер"""
+        try:
+            if os.path.exists(self.meta_path) and os.path.exists(self.part_path):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                if meta.get("url") == self.url:
+                    return meta
+        except Exception as e:
+            print(f"Ошибка чтения сведений о докачке: {e}")
+        return {}
+
+    def save_meta(self, meta):
+        try:
+            with open(self.meta_path, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+        except Exception as e:
+            print(f"Ошибка сохранения сведений о докачке: {e}")
+
+    def check_cancelled(self):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise DownloadCancelled()
+
+    @staticmethod
+    def adapt_chunk_size(chunk_size, received, elapsed):
+        """Увеличить порцию на быстром канале и уменьшить на медленном"""
+        if received >= chunk_size and elapsed < 0.1:
+            return min(chunk_size * 2, MAX_CHUNK_SIZE)
+        if elapsed > 1.0:
+            return max(chunk_size // 2, MIN_CHUNK_SIZE)
+        return chunk_size
+
+    @staticmethod
+    def parse_content_range(value):
+        """Разобрать заголовок 'bytes начало-конец/размер'"""
+        match = re.match(r'bytes\s+(\d+)-(\d+)/(\d+|\*)', value or '')
+        if not match:
+            return None, None
+        total = int(match.group(3)) if match.group(3) != '*' else None
+        return int(match.group(1)), total
+
+    def report_progress(self, downloaded, total):
+        if self.progress_callback:
+            self.progress_callback(downloaded, total)
+
+    def download_once(self):
+        """Одна попытка скачивания - продолжает с места обрыва, если сервер поддерживает Range"""
+        import requests
+        import urllib3
+
+        meta = self.load_meta()
+        offset = os.path.getsize(self.part_path) if meta else 0
+
+        headers = dict(self.headers)
+        if offset:
+            headers['Range'] = f'bytes={offset}-'
+            validator = meta.get("etag") or meta.get("last_modified")
+            if validator:
+                # Если файл на сервере изменился, сервер вернет его целиком
+                headers['If-Range'] = validator
+
+        with requests.get(self.url, headers=headers, stream=True, timeout=(10, 30)) as response:
+            if response.status_code == 416 and offset and offset == meta.get("total"):
+                # Файл уже скачан полностью
+                self.report_progress(offset, offset)
+                return
+
+            response.raise_for_status()
+
+            if response.status_code == 206:
+                start, total = self.parse_content_range(response.headers.get('Content-Range'))
+                if start != offset:
+                    raise requests.exceptions.ConnectionError(
+                        f"Сервер продолжил скачивание не с того места: {start} вместо {offset}")
+                mode = 'ab'
+                print(f"⏯️ Продолжение скачивания с {offset} байт")
+            else:
+                offset = 0
+                length = response.headers.get('Content-Length')
+                total = int(length) if length else None
+                mode = 'wb'
+
+            self.save_meta({
+                "url": self.url,
+                "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'),
+                "total": total
+            })
+
+            downloaded = offset
+            self.report_progress(downloaded, total)
+            with open(self.part_path, mode) as f:
+                while True:
+                    self.check_cancelled()
+                    started = time.monotonic()
+                    try:
+                        chunk = response.raw.read(self.chunk_size)
+                    except (urllib3.exceptions.HTTPError, OSError) as e:
+                        raise requests.exceptions.ConnectionError(f"Соединение прервано: {e}")
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    downloaded += len(chunk)
+                    self.chunk_size = self.adapt_chunk_size(self.chunk_size, len(chunk),
+                                                            time.monotonic() - started)
+                    self.report_progress(downloaded, total)
+
+            if total and downloaded < total:
+                raise requests.exceptions.ConnectionError(
+                    f"Соединение прервано: получено {downloaded} из {total} байт")
+
+    @staticmethod
+    def file_sha256(path):
+        """Посчитать SHA-256 файла"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def discard(self):
+        """Удалить недокачанный файл"""
+        for path in (self.part_path, self.meta_path):
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                print(f"Ошибка удаления {path}: {e}")
+
+    def download(self):
+        """Скачать файл, повторяя попытки после обрыва.
+
+        Возвращает кортеж (успех, путь к файлу или сообщение об ошибке).
+        """
+        import requests
+
+        attempt = 0
+        while True:
+            try:
+                self.download_once()
+                break
+            except DownloadCancelled:
+                return False, "Скачивание отменено"
+            except requests.exceptions.RequestException as e:
+                status = getattr(e.response, 'status_code', None) if isinstance(e, requests.exceptions.HTTPError) else None
+                attempt += 1
+                if (status is not None and status < 500) or attempt > self.retries:
+                    return False, f"Ошибка скачивания: {str(e)}"
+
+                delay = min(2 ** attempt, 30)
+                print(f"⚠️ Обрыв скачивания ({e}), попытка {attempt}/{self.retries} через {delay} с")
+                if self.cancel_event is not None:
+                    if self.cancel_event.wait(delay):
+                        return False, "Скачивание отменено"
+                else:
+                    time.sleep(delay)
+
+        if self.expected_sha256:
+            actual_sha256 = self.file_sha256(self.part_path)
+            if actual_sha256 != self.expected_sha256:
+                # Поврежденный файл докачивать бессмысленно
+                self.discard()
+                return False, (f"Контрольная сумма не совпадает:\n"
+                               f"ожидалась {self.expected_sha256},\nполучена {actual_sha256}")
+            print("✅ Контрольная сумма SHA-256 совпадает")
+        else:
+            print("⚠️ Контрольная сумма в релизе не опубликована, проверка SHA-256 пропущена")
+
+        os.replace(self.part_path, self.target_path)
+        self.discard()
+        return True, self.target_path
+
+
 class UpdateManager:
     def __init__(self, exe_name=None):
         self.script_dir = self.get_script_dir()
@@ -95,8 +357,100 @@ class UpdateManager:
             print(f"Ошибка извлечения версии из тега: {e}")
             return tag_name
 
-    def check_for_updates(self):
-        """Проверка обновлений через GitHub"""
+    def get_release_cache_path(self):
+        """Путь к кэшу описания релиза"""
+        return os.path.join(self.script_dir, RELEASE_CACHE_FILE)
+
+    def load_release_cache(self):
+        """Загрузить сохраненное описание релиза"""
+        try:
+            cache_path = self.get_release_cache_path()
+            if os.path.exists(cache_path):
+                with open(cache_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки кэша релиза: {e}")
+        return {}
+
+    def save_release_cache(self, cache):
+        """Сохранить описание релиза вместе с ETag и Last-Modified"""
+        try:
+            cache_path = self.get_release_cache_path()
+            temp_path = cache_path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(cache, f, indent=2, ensure_ascii=False)
+            os.replace(temp_path, cache_path)
+        except Exception as e:
+            print(f"Ошибка сохранения кэша релиза: {e}")
+
+    @staticmethod
+    def is_cancelled(cancel_event):
+        return cancel_event is not None and cancel_event.is_set()
+
+    def fetch_latest_release(self, api_url, headers, cancel_event=None):
+        """Получить описание последнего релиза условным запросом.
+
+        Если релиз не изменился (304) или лимит запросов GitHub исчерпан, используется сохраненная копия.
+        Возвращает кортеж (успех, описание релиза или сообщение об ошибке).
+        """
+        import requests
+
+        cache = self.load_release_cache()
+        cached_release = cache.get("release") if cache.get("api_url") == api_url else None
+
+        headers = dict(headers)
+        if cached_release:
+            if cache.get("etag"):
+                headers['If-None-Match'] = cache["etag"]
+            if cache.get("last_modified"):
+                headers['If-Modified-Since'] = cache["last_modified"]
+
+        print(f"🔗 Запрос к GitHub API: {api_url}")
+        response = requests.get(api_url, headers=headers, timeout=(5, 10), stream=True)
+        try:
+            if self.is_cancelled(cancel_event):
+                return False, "Проверка обновлений отменена"
+
+            if response.status_code == 304 and cached_release:
+                print("ℹ️ Описание релиза не изменилось")
+                return True, cached_release
+
+            if response.status_code in (403, 429) and cached_release:
+                # Лимит запросов без авторизации исчерпан - используем сохраненную копию
+                print(f"⚠️ GitHub API ответил {response.status_code}, используется сохраненное описание релиза")
+                return True, cached_release
+
+            if response.status_code == 404:
+                return False, "Релизы не найдены или репозиторий не существует"
+            elif response.status_code != 200:
+                return False, f"Ошибка GitHub API: {response.status_code} - {response.text}"
+
+            # Читаем ответ частями, чтобы проверку можно было прервать
+            body = bytearray()
+            for chunk in response.iter_content(chunk_size=16384):
+                if self.is_cancelled(cancel_event):
+                    return False, "Проверка обновлений отменена"
+                body.extend(chunk)
+
+            release_info = json.loads(bytes(body))
+            self.save_release_cache({
+                "api_url": api_url,
+                "etag": response.headers.get('ETag'),
+                "last_modified": response.headers.get('Last-Modified'),
+                "checked_at": datetime.now().isoformat(),
+                "release": release_info
+            })
+            return True, release_info
+        finally:
+            response.close()
+
+    def check_for_updates(self, cancel_event=None):
+        """Проверка обновлений через GitHub.
+
+        cancel_event (threading.Event) позволяет прервать проверку из другого потока.
+        """
+        import requests
+
         try:
             github_repo = self.config.get("github_repo", "").strip()
             if not github_repo:
@@ -121,15 +475,9 @@ class UpdateManager:
                 'Accept': 'application/vnd.github.v3+json'
             }
 
-            print(f"🔗 Запрос к GitHub API: {api_url}")
-            response = requests.get(api_url, headers=headers, timeout=10)
-
-            if response.status_code == 404:
-                return False, "Релизы не найдены или репозиторий не существует"
-            elif response.status_code != 200:
-                return False, f"Ошибка GitHub API: {response.status_code} - {response.text}"
-
-            release_info = response.json()
+            success, release_info = self.fetch_latest_release(api_url, headers, cancel_event)
+            if not success:
+                return False, release_info
 
             # Извлекаем версию из тега
             tag_name = release_info['tag_name']
@@ -148,6 +496,13 @@ class UpdateManager:
             if self.is_newer_version(latest_version, self.current_version):
                 print(f"🎉 Найдена новая версия: {latest_version} > {self.current_version}")
 
+                assets = [{"name": asset.get('name', ''), "url": asset.get('browser_download_url', '')}
+                          for asset in release_info.get('assets', [])]
+                # Скачивается опубликованный архив программы, а не архив исходного кода
+                archive = find_release_archive(assets)
+                if archive is None:
+                    return False, f"В релизе {tag_name} нет архива программы (DocumentFiller_*.zip)"
+
                 # Формируем информацию об обновлении
                 update_info = {
                     "version": latest_version,
@@ -155,7 +510,10 @@ class UpdateManager:
                     "release_notes": release_info.get('body', ''),
                     "release_name": release_info.get('name', ''),
                     "owner": owner,
-                    "repo": repo
+                    "repo": repo,
+                    "download_url": archive['url'],
+                    "download_name": archive['name'],
+                    "assets": assets
                 }
 
                 return True, update_info
@@ -169,57 +527,329 @@ class UpdateManager:
         except Exception as e:
             return False, f"Ошибка проверки обновлений GitHub: {str(e)}"
 
-    def download_and_install_update(self, update_info, geometry_file=None):
-        """Скачать и установить обновление"""
+    @staticmethod
+    def parse_checksum(text, file_name, single_file=False):
+        """Найти SHA-256 файла в тексте вида '<hash>  <имя файла>'.
+
+        Хэш без имени файла принимается только из отдельного файла <имя>.sha256 (single_file).
+        """
+        lines = (text or '').splitlines()
+        for line in lines:
+            match = re.match(r'\s*([0-9a-fA-F]{64})\s+\*?(\S+)\s*$', line)
+            if match and os.path.basename(match.group(2)) == file_name:
+                return match.group(1).lower()
+
+        hashes = [line.strip() for line in lines if line.strip()]
+        if single_file and len(hashes) == 1 and re.fullmatch(r'[0-9a-fA-F]{64}', hashes[0]):
+            return hashes[0].lower()
+        return None
+
+    def get_published_checksum(self, update_info, file_name):
+        """Получить SHA-256 файла, опубликованный в релизе.
+
+        Ищется по точному имени файла в файлах релиза (<имя>.sha256, SHA256SUMS),
+        затем в описании релиза. Возвращает None, если контрольная сумма не опубликована.
+        """
+        import requests
+
+        headers = {'User-Agent': 'DocumentFiller-Updater/1.0'}
+        for asset in update_info.get('assets', []):
+            name = asset.get('name', '')
+            single_file = name == file_name + '.sha256'
+            if not single_file and name.lower() not in ('sha256sums', 'sha256sums.txt'):
+                continue
+            try:
+                response = requests.get(asset['url'], headers=headers, timeout=(5, 15))
+                response.raise_for_status()
+                checksum = self.parse_checksum(response.text, file_name, single_file)
+                if checksum:
+                    return checksum
+            except requests.exceptions.RequestException as e:
+                print(f"Ошибка загрузки контрольной суммы {name}: {e}")
+
+        return self.parse_checksum(update_info.get('release_notes', ''), file_name)
+
+    def get_download_dir(self):
+        """Постоянная папка для скачивания - недокачанный архив переживает перезапуск программы"""
+        download_dir = os.path.join(tempfile.gettempdir(), "Program_update_download")
+        os.makedirs(download_dir, exist_ok=True)
+        return download_dir
+
+    def fetch_release_manifest(self, update_info):
+        """Скачать манифест релиза (файл manifest.json среди файлов релиза).
+
+        Формат: {"version": "...", "base_url": "...", "files": {"путь": {"sha256": "...", "size": ...,
+        "asset": "имя файла релиза", "url": "..."}}}. Манифест проверяется по SHA256SUMS релиза так же,
+        как архив программы. Возвращает None, если манифест не опубликован или не прошел проверку.
+        """
+        manifest_asset = None
+        for asset in update_info.get('assets', []):
+            if asset.get('name', '').lower() == RELEASE_MANIFEST_ASSET:
+                manifest_asset = asset
+                break
+
+        if not manifest_asset or not manifest_asset.get('url'):
+            return None
+
+        # Хэши файлов берутся из манифеста - без проверки самого манифеста им нельзя доверять
+        expected_sha256 = self.get_published_checksum(update_info, manifest_asset['name'])
+        if not expected_sha256:
+            print("❌ Контрольная сумма манифеста релиза не опубликована - манифест не используется")
+            return None
+
+        manifest_path = os.path.join(self.get_download_dir(),
+                                     f"{update_info.get('tag_name', 'release')}_{RELEASE_MANIFEST_ASSET}")
+        downloader = UpdateDownloader(manifest_asset['url'], manifest_path,
+                                      {'User-Agent': 'DocumentFiller-Updater/1.0'}, expected_sha256)
+        success, result = downloader.download()
+        if not success:
+            print(f"❌ Манифест релиза не используется: {result}")
+            return None
+
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if not isinstance(manifest, dict) or not isinstance(manifest.get('files'), dict):
+                print("❌ Манифест релиза не содержит списка файлов")
+                return None
+            return manifest
+        except ValueError as e:
+            print(f"Ошибка чтения манифеста релиза: {e}")
+            return None
+        finally:
+            os.remove(manifest_path)
+
+    @staticmethod
+    def normalize_manifest_path(path):
+        """Проверить путь из манифеста - только относительные пути внутри папки программы.
+
+        Пути попадают в BAT-скрипт обновления, поэтому символы командной строки не допускаются.
+        """
+        path = path.replace('\\', '/')
+        parts = [part for part in path.split('/') if part not in ('', '.')]
+        if not parts or path.startswith('/') or ':' in parts[0] or '..' in parts:
+            return None
+        if any(char in BATCH_UNSAFE_CHARS for char in path):
+            return None
+        return '/'.join(parts)
+
+    def load_installed_manifest(self):
+        """Загрузить манифест установленной версии"""
+        try:
+            manifest_path = os.path.join(self.script_dir, INSTALLED_MANIFEST_FILE)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, "r", encoding="utf-8") as f:
+                    return json.load(f)
+        except Exception as e:
+            print(f"Ошибка загрузки манифеста установленной версии: {e}")
+        return None
+
+    def build_local_manifest(self, paths):
+        """Посчитать SHA-256 установленных файлов (если манифест установленной версии отсутствует)"""
+        files = {}
+        for path in paths:
+            file_path = os.path.join(self.script_dir, *path.split('/'))
+            if os.path.isfile(file_path):
+                files[path] = {"sha256": UpdateDownloader.file_sha256(file_path),
+                               "size": os.path.getsize(file_path)}
+        return {"files": files}
+
+    def diff_manifests(self, installed_manifest, release_manifest):
+        """Сравнить манифесты - вернуть (измененные или новые файлы, удаленные файлы)"""
+        installed_files = installed_manifest.get('files', {})
+        release_files = release_manifest.get('files', {})
+
+        changed = [path for path, entry in release_files.items()
+                   if installed_files.get(path, {}).get('sha256', '').lower() != entry.get('sha256', '').lower()]
+        removed = [path for path in installed_files if path not in release_files]
+        return changed, removed
+
+    def get_manifest_file_url(self, manifest, path, update_info):
+        """URL файла из манифеста: явный url, base_url манифеста или файл релиза"""
+        entry = manifest['files'][path]
+        if entry.get('url'):
+            return entry['url']
+        if manifest.get('base_url'):
+            return manifest['base_url'].rstrip('/') + '/' + urllib.parse.quote(path)
+
+        asset_name = entry.get('asset', path.replace('/', '__'))
+        for asset in update_info.get('assets', []):
+            if asset.get('name') == asset_name:
+                return asset.get('url')
+        return None
+
+    def download_delta_update(self, update_info, manifest, progress_callback=None, cancel_event=None):
+        """Скачать только файлы, изменившиеся относительно установленной версии.
+
+        Файлы складываются в промежуточную папку с той же структурой, что и папка программы.
+        Возвращает (успех, (папка, измененные файлы, удаленные файлы) или сообщение об ошибке).
+        """
+        release_files = {}
+        for path, entry in manifest['files'].items():
+            normalized = self.normalize_manifest_path(path)
+            if not normalized or not entry.get('sha256'):
+                return False, f"Некорректная запись в манифесте: {path}"
+            # Анкеты, шаблоны, лицензию и настройки пользователя обновление не трогает
+            if is_user_data_path(normalized):
+                print(f"ℹ️ Пропущены данные пользователя: {normalized}")
+                continue
+            release_files[normalized] = entry
+        manifest = dict(manifest, files=release_files)
+
+        installed_manifest = self.load_installed_manifest()
+        if installed_manifest is None:
+            print("ℹ️ Манифест установленной версии не найден, сверяем файлы на диске")
+            installed_manifest = self.build_local_manifest(release_files)
+
+        changed, removed = self.diff_manifests(installed_manifest, manifest)
+        removed = [path for path in removed
+                   if self.normalize_manifest_path(path) == path and not is_user_data_path(path)]
+        print(f"📋 Изменено файлов: {len(changed)} из {len(release_files)}, удалено: {len(removed)}")
+
+        if not changed and not removed:
+            # Перезапускать программу незачем - запоминаем манифест, чтобы не сверять файлы повторно
+            self.save_installed_manifest(manifest, update_info)
+            return True, (None, changed, removed)
+
+        staging_dir = os.path.join(self.get_download_dir(), f"{update_info['tag_name']}_delta")
+        os.makedirs(staging_dir, exist_ok=True)
+
+        total_size = sum(release_files[path].get('size', 0) for path in changed) or None
+        done_size = 0
+        headers = {'User-Agent': 'DocumentFiller-Updater/1.0'}
+
+        for path in changed:
+            url = self.get_manifest_file_url(manifest, path, update_info)
+            if not url:
+                return False, f"Не найден URL для файла {path}"
+
+            target_path = os.path.join(staging_dir, *path.split('/'))
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+
+            if os.path.exists(target_path) and \
+                    UpdateDownloader.file_sha256(target_path) == release_files[path]['sha256'].lower():
+                # Файл уже скачан при прошлой попытке
+                print(f"✅ Уже скачан: {path}")
+            else:
+                print(f"⬇️ Скачивание: {path}")
+                base_size = done_size
+                file_progress = None
+                if progress_callback:
+                    file_progress = lambda downloaded, total: progress_callback(base_size + downloaded, total_size)
+                downloader = UpdateDownloader(url, target_path, headers, release_files[path]['sha256'],
+                                              file_progress, cancel_event)
+                success, result = downloader.download()
+                if not success:
+                    return False, f"{path}: {result}"
+
+            done_size += release_files[path].get('size', 0)
+
+        # Файлы прошлых попыток, которые больше не нужны, не должны попасть в программу
+        for root, dirs, names in os.walk(staging_dir):
+            for name in names:
+                path = os.path.relpath(os.path.join(root, name), staging_dir).replace(os.sep, '/')
+                if path not in release_files or path not in changed:
+                    os.remove(os.path.join(root, name))
+
+        # Новый манифест устанавливается вместе с файлами
+        self.save_installed_manifest(manifest, update_info, staging_dir)
+
+        return True, (staging_dir, changed, removed)
+
+    def save_installed_manifest(self, manifest, update_info, target_dir=None):
+        """Записать манифест установленной версии (по умолчанию - в папку программы)"""
+        try:
+            manifest_path = os.path.join(target_dir or self.script_dir, INSTALLED_MANIFEST_FILE)
+            with open(manifest_path, "w", encoding="utf-8") as f:
+                json.dump({"version": manifest.get('version', update_info.get('version')),
+                           "files": manifest['files']}, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"Ошибка сохранения манифеста установленной версии: {e}")
+            if target_dir:
+                raise
+
+    def install_delta_update(self, update_info, manifest, geometry_file=None,
+                             progress_callback=None, cancel_event=None):
+        """Установить обновление по манифесту - заменяются только измененные файлы"""
+        success, result = self.download_delta_update(update_info, manifest, progress_callback, cancel_event)
+        if not success:
+            return False, result
+
+        staging_dir, changed, removed = result
+        if not changed and not removed:
+            return True, ALREADY_UP_TO_DATE
+
+        current_exe = os.path.join(self.script_dir, self.exe_name)
+
+        bat_script_path = self.create_delta_update_script(current_exe, staging_dir, removed, geometry_file)
+        if not bat_script_path:
+            return False, "Не удалось создать скрипт обновления"
+
+        print(f"✅ BAT-скрипт создан: {bat_script_path}")
+        print("🚀 Запуск скрипта обновления...")
+        subprocess.Popen([bat_script_path], shell=True)
+
+        return True, "Обновление запущено. Программа закроется и будет обновлена автоматически."
+
+    def download_and_install_update(self, update_info, geometry_file=None,
+                                    progress_callback=None, cancel_event=None):
+        """Скачать и установить обновление.
+
+        Если в релизе опубликован манифест, скачиваются только измененные файлы,
+        иначе - архив релиза целиком.
+        progress_callback(скачано, всего) вызывается по мере скачивания,
+        cancel_event (threading.Event) позволяет отменить скачивание.
+        """
         try:
             print("🔄 Начало процесса обновления...")
 
+            manifest = self.fetch_release_manifest(update_info)
+            if manifest is not None:
+                print("📋 Найден манифест релиза - обновляются только измененные файлы")
+                return self.install_delta_update(update_info, manifest, geometry_file,
+                                                 progress_callback, cancel_event)
+
+            # Скачиваем опубликованный архив программы
+            source_zip_url = update_info.get('download_url')
+            zip_name = update_info.get('download_name')
+            if not source_zip_url or not zip_name:
+                return False, "В релизе нет архива программы"
+
+            # Без опубликованной контрольной суммы архив не устанавливается
+            expected_sha256 = self.get_published_checksum(update_info, zip_name)
+            if not expected_sha256:
+                return False, f"Контрольная сумма архива {zip_name} не опубликована в релизе"
+
             # Создаем временную директорию
             temp_dir = tempfile.mkdtemp(prefix="Program_update_")
             print(f"📁 Временная директория: {temp_dir}")
 
-            # Скачиваем архив исходного кода
-            tag_name = update_info['tag_name']
-            owner = update_info['owner']
-            repo = update_info['repo']
-
-            source_zip_url = f"https://github.com/{owner}/{repo}/archive/refs/tags/{tag_name}.zip"
-            zip_path = os.path.join(temp_dir, f"{tag_name}.zip")
+            zip_path = os.path.join(self.get_download_dir(), zip_name)
 
             print(f"⬇️ Скачивание архива: {source_zip_url}")
 
-            # Скачиваем архив
+            # Скачиваем архив с докачкой после обрыва
             headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(source_zip_url, headers=headers, stream=True, timeout=30)
-            response.raise_for_status()
-
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
+            downloader = UpdateDownloader(source_zip_url, zip_path, headers, expected_sha256,
+                                          progress_callback, cancel_event)
+            success, result = downloader.download()
+            if not success:
+                return False, result
 
-            with open(zip_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-                        if total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            print(f"📥 Прогресс загрузки: {progress:.1f}%", end='\r')
-
-            print(f"\n✅ Архив скачан: {zip_path} ({downloaded_size} bytes)")
-
-            # Распаковываем архив
-            extract_dir = os.path.join(temp_dir, "extracted")
-            print(f"🗜️ Распаковка архива в: {extract_dir}")
-
-            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
+            print(f"✅ Архив скачан: {zip_path} ({os.path.getsize(zip_path)} bytes)")
 
-            # Ищем EXE файл в распакованных файлах
+            # Ищем EXE по оглавлению архива и распаковываем только его
             print("🔍 Поиск EXE файла в архиве...")
-            new_exe_path = self.find_exe_in_directory(extract_dir)
+            with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+                exe_member = self.find_exe_in_zip(zip_ref)
+                if exe_member is None:
+                    return False, "EXE файл не найден в архиве"
 
-            if not new_exe_path:
-                return False, "EXE файл не найден в архиве"
+                new_exe_path = os.path.join(temp_dir, os.path.basename(self.get_member_name(exe_member)))
+                print(f"🗜️ Распаковка {self.get_member_name(exe_member)} в: {new_exe_path}")
+                success, message = self.extract_exe_member(zip_ref, exe_member, new_exe_path, cancel_event)
+                if not success:
+                    return False, message
 
             print(f"✅ EXE файл найден: {new_exe_path}")
 
@@ -227,6 +857,9 @@ class UpdateManager:
             if not self.is_valid_exe_file(new_exe_path):
                 return False, "Найденный файл не является валидным EXE"
 
+            # Архив распакован - скачанная копия больше не нужна
+            os.remove(zip_path)
+
             # Получаем путь к текущему EXE
             current_exe = os.path.join(self.script_dir, self.exe_name)
             print(f"🔧 Текущий EXE: {current_exe}")
@@ -312,40 +945,162 @@ del "%~f0"
             print(f"❌ Ошибка создания BAT-скрипта: {e}")
             return None
 
-    def find_exe_in_directory(self, directory):
-        """Найти EXE файл в директории и поддиректориях"""
+    def pop_update_error(self):
+        """Сообщение скрипта обновления о неудачной установке (файл удаляется после чтения) или None"""
+        error_path = os.path.join(self.script_dir, UPDATE_ERROR_FILE)
         try:
-            # Сначала ищем файл с именем DocumentFiller
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_lower = file.lower()
-                    if file_lower == 'Программа.exe':
-                        exe_path = os.path.join(root, file)
-                        print(f"🔍 Найден EXE: {exe_path}")
-                        return exe_path
-
-            # Если не нашли, ищем любой EXE файл с 'document' в названии
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    file_lower = file.lower()
-                    if file_lower.endswith('.exe') and 'document' in file_lower:
-                        exe_path = os.path.join(root, file)
-                        print(f"🔍 Найден EXE (с 'document' в названии): {exe_path}")
-                        return exe_path
-
-            # Если не нашли, ищем любой EXE файл
-            for root, dirs, files in os.walk(directory):
-                for file in files:
-                    if file.lower().endswith('.exe'):
-                        exe_path = os.path.join(root, file)
-                        print(f"🔍 Найден EXE (любой): {exe_path}")
-                        return exe_path
-
+            if not os.path.exists(error_path):
+                return None
+            with open(error_path, "r", encoding="utf-8", errors="replace") as f:
+                message = f.read().strip()
+            os.remove(error_path)
+            return message or None
+        except Exception as e:
+            print(f"Ошибка чтения результата обновления: {e}")
             return None
+
+    def create_delta_update_script(self, current_exe, staging_dir, removed, geometry_file=None):
+        """Создать BAT-скрипт, копирующий измененные файлы из промежуточной папки"""
+        try:
+            exe_name = os.path.basename(current_exe)
+            program_dir = os.path.dirname(current_exe)
+            error_file = os.path.join(program_dir, UPDATE_ERROR_FILE)
+            installed_manifest = os.path.join(program_dir, INSTALLED_MANIFEST_FILE)
+
+            remove_commands = "\n".join(
+                f'del /F /Q "{os.path.join(program_dir, *path.split("/"))}" >nul 2>&1' for path in removed)
+
+            bat_content = f"""@echo off
+chcp 65001 >nul
+title DocumentFiller - Обновление программы
+echo ===============================================
+echo    DocumentFiller - Обновление программы
+echo ===============================================
+echo.
+
+echo Шаг 1: Закрытие текущей программы...
+taskkill /IM "{exe_name}" /F >nul 2>&1
+
+echo Шаг 2: Ожидание завершения процесса...
+:wait_loop
+tasklist /FI "IMAGENAME eq {exe_name}" 2>nul | find /I "{exe_name}" >nul
+if %errorlevel% equ 0 (
+    echo Процесс еще активен, ожидаем 1 секунду...
+    timeout /t 1 /nobreak >nul
+    goto wait_loop
+)
+echo Процесс завершен.
+
+echo Шаг 3: Замена измененных файлов...
+set /a copy_attempt=0
+:copy_files
+timeout /t 1 /nobreak >nul
+xcopy "{staging_dir}\\*" "{program_dir}" /E /Y /I /Q >nul 2>&1
+if %errorlevel% equ 0 goto copy_done
+set /a copy_attempt+=1
+if %copy_attempt% geq {UPDATE_COPY_RETRIES} goto copy_failed
+echo Файлы еще заняты, повторяем попытку %copy_attempt% из {UPDATE_COPY_RETRIES}...
+goto copy_files
+
+:copy_failed
+rem Файлы могли замениться частично - манифест установленной версии больше не верен
+del /F /Q "{installed_manifest}" >nul 2>&1
+echo Не удалось заменить файлы программы (нет места на диске, прав доступа или файлы заняты).> "{error_file}"
+echo Не удалось заменить файлы программы.
+start "" /D "{program_dir}" "{exe_name}"
+del "%~f0" & exit /b 1
+
+:copy_done
+{remove_commands}
+echo Файлы успешно заменены.
+
+echo Шаг 4: Очистка временных файлов...
+rmdir /s /q "{staging_dir}" >nul 2>&1
+
+echo Шаг 5: Запуск обновленной программы...
+start "" /D "{program_dir}" "{exe_name}"
+
+echo Шаг 6: Обновление завершено успешно!
+timeout /t 2 /nobreak >nul
+
+del "%~f0"
+"""
+
+            bat_path = os.path.join(self.script_dir, "update_documentfiller.bat")
+            with open(bat_path, 'w', encoding='utf-8') as f:
+                f.write(bat_content)
+
+            return bat_path
+
         except Exception as e:
-            print(f"❌ Ошибка поиска EXE файла: {e}")
+            print(f"❌ Ошибка создания BAT-скрипта: {e}")
             return None
 
+    @staticmethod
+    def get_member_name(member):
+        """Имя файла в архиве (имена без флага UTF-8 из Windows-архиваторов записаны в cp866)"""
+        if not member.flag_bits & 0x800:
+            try:
+                return member.filename.encode('cp437').decode('cp866')
+            except UnicodeError:
+                pass
+        return member.filename
+
+    def find_exe_in_zip(self, zip_ref):
+        """Найти EXE в оглавлении архива, не распаковывая его"""
+        exe_members = [member for member in zip_ref.infolist()
+                       if not member.is_dir() and self.get_member_name(member).lower().endswith('.exe')]
+
+        # Сначала ищем файл с именем программы
+        for member in exe_members:
+            file_lower = os.path.basename(self.get_member_name(member)).lower()
+            if file_lower in ('программа.exe', self.exe_name.lower()):
+                print(f"🔍 Найден EXE: {self.get_member_name(member)}")
+                return member
+
+        # Если не нашли, ищем любой EXE файл с 'document' в названии
+        for member in exe_members:
+            if 'document' in os.path.basename(self.get_member_name(member)).lower():
+                print(f"🔍 Найден EXE (с 'document' в названии): {self.get_member_name(member)}")
+                return member
+
+        # Если не нашли, берем любой EXE файл
+        if exe_members:
+            print(f"🔍 Найден EXE (любой): {self.get_member_name(exe_members[0])}")
+            return exe_members[0]
+
+        return None
+
+    def extract_exe_member(self, zip_ref, member, target_path, cancel_event=None):
+        """Распаковать один файл архива потоком с проверкой сигнатуры MZ и CRC.
+
+        Сигнатура проверяется по первым байтам - неверный файл не распаковывается целиком.
+        CRC проверяется zipfile при чтении последнего блока.
+        """
+        try:
+            with zip_ref.open(member) as source, open(target_path, 'wb') as target:
+                header = source.read(2)
+                if header != b'MZ':
+                    print("❌ Неверная сигнатура EXE файла")
+                    target.close()
+                    os.remove(target_path)
+                    return False, "Найденный файл не является валидным EXE"
+
+                target.write(header)
+                for block in iter(lambda: source.read(1024 * 1024), b''):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise DownloadCancelled()
+                    target.write(block)
+
+            return True, target_path
+
+        except (zipfile.BadZipFile, DownloadCancelled) as e:
+            if os.path.exists(target_path):
+                os.remove(target_path)
+            if isinstance(e, DownloadCancelled):
+                return False, "Установка обновления отменена"
+            return False, f"Архив поврежден: {str(e)}"
+
     def is_valid_exe_file(self, file_path):
         """Проверить, является ли файл валидным EXE"""
         try:
@@ -3,12 +3,12 @@ import os
 import re
 from datetime import datetime
 from PyQt5.QtWidgets import (QLineEdit, QDialog, QVBoxLayout, QHBoxLayout,
-                             QLabel, QPushButton, QFormLayout, QTableWidget,
-                             QTableWidgetItem, QHeaderView, QAbstractItemView,
-                             QMessageBox, QWidget)
-from PyQt5.QtCore import Qt, QSettings, QTimer  # Добавлен QTimer
+                             QLabel, QPushButton, QFormLayout, QHeaderView, QAbstractItemView,
+                             QMessageBox, QWidget, QTableView)
+from PyQt5.QtCore import (Qt, QSettings, QTimer, QAbstractTableModel, QModelIndex,
+                          QSortFilterProxyModel)
 from PyQt5.QtGui import QFont, QKeyEvent
-import openpyxl
+from record_store import RECORD_INSERTED, RECORD_UPDATED, RECORD_REMOVED
 
 
 class ValidatedLineEdit(QLineEdit):
@@ -178,18 +178,297 @@ class EditRecordDialog(QDialog):
             return {}
 
 
-class RecordsTable(QTableWidget):
+class RecordsTableModel(QAbstractTableModel):
+    """Модель таблицы записей: значения хранятся по колонкам, ячейки не создаются заранее"""
+
+    # Роль для получения постоянного идентификатора записи ('_id')
+    RecordIdRole = Qt.UserRole + 1
+
+    def __init__(self, field_keys, parent=None):
+        super().__init__(parent)
+        self.field_keys = list(field_keys)
+        self.headers = [label for _, label in self.field_keys] + ["RowNum"]
+        self.columns = [[] for _ in self.field_keys]
+        self.row_numbers = []
+        self.ids = []
+        self._rows_by_id = None
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def columnCount(self, parent=QModelIndex()):
+        # Последняя колонка - скрытый номер строки
+        return 0 if parent.isValid() else len(self.field_keys) + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+
+        row, col = index.row(), index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole, Qt.ToolTipRole):
+            if col < len(self.columns):
+                return self.columns[col][row]
+            return str(self.row_numbers[row])
+        if role == self.RecordIdRole:
+            return self.ids[row]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal and section < len(self.headers):
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def row_values(self, record):
+        """Значения записи по колонкам таблицы"""
+        return [record.get(key, "") or "" for key, _ in self.field_keys]
+
+    def set_records(self, records):
+        """Заменить все записи модели"""
+        self.beginResetModel()
+        self.columns = [[record.get(key, "") or "" for record in records] for key, _ in self.field_keys]
+        self.row_numbers = [record['_row_number'] for record in records]
+        self.ids = [record.get('_id', record['_row_number']) for record in records]
+        self.apply_order(self.sorted_rows())
+        self.endResetModel()
+
+    def sort_values(self):
+        """Значения колонки сортировки (None - сортировка не задана)"""
+        if self.sort_column < 0 or self.sort_column > len(self.columns):
+            return None
+        return self.columns[self.sort_column] if self.sort_column < len(self.columns) else self.row_numbers
+
+    def sorted_rows(self):
+        """Порядок строк для текущей сортировки"""
+        rows = range(len(self.ids))
+        values = self.sort_values()
+        if values is None:
+            return list(rows)
+        return sorted(rows, key=values.__getitem__, reverse=self.sort_order == Qt.DescendingOrder)
+
+    def apply_order(self, order):
+        """Переставить строки в заданном порядке"""
+        self.columns = [[column[row] for row in order] for column in self.columns]
+        self.row_numbers = [self.row_numbers[row] for row in order]
+        self.ids = [self.ids[row] for row in order]
+        self._rows_by_id = None
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        """Отсортировать строки одной сортировкой списка (без сравнения ячеек через Qt)"""
+        self.sort_column = column
+        self.sort_order = order
+
+        self.layoutAboutToBeChanged.emit()
+        order_rows = self.sorted_rows()
+        new_rows = {old_row: new_row for new_row, old_row in enumerate(order_rows)}
+        self.apply_order(order_rows)
+
+        # Выделение и текущая строка остаются на тех же записях
+        old_indexes = self.persistentIndexList()
+        new_indexes = [self.index(new_rows[index.row()], index.column()) for index in old_indexes]
+        self.changePersistentIndexList(old_indexes, new_indexes)
+        self.layoutChanged.emit()
+
+    def row_of(self, record_id):
+        """Строка модели для идентификатора записи"""
+        if self._rows_by_id is None:
+            self._rows_by_id = {record_id: row for row, record_id in enumerate(self.ids)}
+        return self._rows_by_id.get(record_id)
+
+    def insert_position(self, values, row_number, skip_row=None):
+        """Позиция строки с такими значениями, при которой сохраняется текущая сортировка.
+
+        skip_row - строка, которая не учитывается (перемещаемая запись).
+        """
+        sort_values = self.sort_values()
+        count = len(self.ids) - (1 if skip_row is not None else 0)
+        if sort_values is None:
+            return count
+
+        value = values[self.sort_column] if self.sort_column < len(values) else row_number
+        descending = self.sort_order == Qt.DescendingOrder
+
+        # Двоичный поиск: новая строка встает после равных значений
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            current = sort_values[middle if skip_row is None or middle < skip_row else middle + 1]
+            if (value > current) if descending else (value < current):
+                high = middle
+            else:
+                low = middle + 1
+        return low
+
+    def insert_record(self, record):
+        """Добавить запись на место по текущей сортировке"""
+        values = self.row_values(record)
+        row = self.insert_position(values, record['_row_number'])
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        for column, value in zip(self.columns, values):
+            column.insert(row, value)
+        self.row_numbers.insert(row, record['_row_number'])
+        self.ids.insert(row, record.get('_id', record['_row_number']))
+        self._rows_by_id = None
+        self.endInsertRows()
+
+    def update_record(self, record):
+        """Обновить запись; если изменилось значение колонки сортировки, строка перемещается"""
+        record_id = record.get('_id', record['_row_number'])
+        row = self.row_of(record_id)
+        if row is None:
+            self.insert_record(record)
+            return
+
+        values = self.row_values(record)
+        sort_values = self.sort_values()
+        old_sort_value = sort_values[row] if sort_values is not None else None
+
+        for column, value in zip(self.columns, values):
+            column[row] = value
+        self.row_numbers[row] = record['_row_number']
+        self.dataChanged.emit(self.index(row, 0), self.index(row, self.columnCount() - 1))
+
+        if sort_values is None or sort_values[row] == old_sort_value:
+            return
+
+        # Позиция среди остальных строк; перемещение в Qt задается в координатах до перемещения
+        new_row = self.insert_position(values, record['_row_number'], skip_row=row)
+        if new_row == row:
+            return
+
+        destination = new_row + 1 if new_row > row else new_row
+        if not self.beginMoveRows(QModelIndex(), row, row, QModelIndex(), destination):
+            return
+        for column in self.columns + [self.row_numbers, self.ids]:
+            column.insert(new_row, column.pop(row))
+        self._rows_by_id = None
+        self.endMoveRows()
+
+    def remove_record(self, record_id, shift_rows=False):
+        """Удалить запись по идентификатору.
+
+        shift_rows - номера строк ниже удаленной уменьшаются на единицу (удаление строки в Excel).
+        """
+        row = self.row_of(record_id)
+        if row is None:
+            return
+
+        removed_number = self.row_numbers[row]
+        self.beginRemoveRows(QModelIndex(), row, row)
+        for column in self.columns + [self.row_numbers, self.ids]:
+            del column[row]
+        self._rows_by_id = None
+        self.endRemoveRows()
+
+        if shift_rows and self.ids:
+            # Порядок строк от сдвига не меняется - достаточно одного обновления колонки номеров
+            self.row_numbers = [number - 1 if number > removed_number else number
+                                for number in self.row_numbers]
+            row_number_column = len(self.columns)
+            self.dataChanged.emit(self.index(0, row_number_column),
+                                  self.index(len(self.ids) - 1, row_number_column))
+
+    def apply_changes(self, changes, shift_rows=False):
+        """Применить изменения хранилища (вставка, изменение, удаление) без полной перезагрузки.
+
+        shift_rows - хранилище сдвигает номера строк после удаления (ROWS_SHIFT_ON_REMOVE).
+        """
+        for kind, data in changes:
+            if kind == RECORD_INSERTED:
+                self.insert_record(data)
+            elif kind == RECORD_UPDATED:
+                self.update_record(data)
+            elif kind == RECORD_REMOVED:
+                self.remove_record(data, shift_rows)
+
+    def get_record(self, record_id):
+        """Собрать запись по идентификатору"""
+        row = self.row_of(record_id)
+        if row is None:
+            return None
+        return self.record_at(row)
+
+    def record_at(self, row):
+        """Собрать запись по строке модели"""
+        record = {key: self.columns[col][row] for col, (key, _) in enumerate(self.field_keys)}
+        record['_row_number'] = self.row_numbers[row]
+        record['_id'] = self.ids[row]
+        return record
+
+    def get_records(self):
+        """Все записи в порядке сортировки таблицы"""
+        return [self.record_at(row) for row in range(len(self.ids))]
+
+
+class RecordsProxyModel(QSortFilterProxyModel):
+    """Прокси таблицы записей: сортировку выполняет модель с данными"""
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sourceModel().sort(column, order)
+
+
+class RecordsTable(QTableView):
     """Таблица записей с сохранением состояния"""
 
-    def __init__(self, settings, parent=None):
+    # Сколько строк просматривать при подборе ширины колонок по содержимому
+    RESIZE_PRECISION = 200
+
+    def __init__(self, settings, field_keys, parent=None):
         super().__init__(parent)
         self.settings = settings
+
+        self.records_model = RecordsTableModel(field_keys, self)
+        self.proxy_model = RecordsProxyModel(self)
+        self.proxy_model.setSourceModel(self.records_model)
+        self.setModel(self.proxy_model)
+
         self.setSortingEnabled(True)
         self.setFont(QFont("Segoe UI", 14))  # Увеличенный шрифт для таблицы
 
+        # Высота строк одинаковая - представлению не нужно измерять каждую строку
+        self.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.horizontalHeader().setResizeContentsPrecision(self.RESIZE_PRECISION)
+        self.setColumnHidden(self.columnCount() - 1, True)
+
         # Загружаем состояние сразу после создания
         QTimer.singleShot(100, self.load_state)
 
+    def columnCount(self):
+        return self.records_model.columnCount()
+
+    def rowCount(self):
+        return self.proxy_model.rowCount()
+
+    def set_records(self, records):
+        """Показать записи в таблице (сортировка сохраняется)"""
+        self.records_model.set_records(records)
+
+    def apply_changes(self, changes, shift_rows=False):
+        """Применить изменения записей, сохраняя выделение, прокрутку и сортировку"""
+        self.records_model.apply_changes(changes, shift_rows)
+
+    def get_record(self, record_id):
+        """Найти запись по идентификатору"""
+        return self.records_model.get_record(record_id)
+
+    def get_records(self):
+        """Все записи таблицы"""
+        return self.records_model.get_records()
+
+    def record_id_at(self, visual_row):
+        """Идентификатор записи для строки в порядке отображения"""
+        index = self.proxy_model.index(visual_row, 0)
+        if not index.isValid():
+            return None
+        return self.proxy_model.data(index, RecordsTableModel.RecordIdRole)
+
+    def selected_record_ids(self):
+        """Идентификаторы выбранных записей в порядке отображения"""
+        rows = sorted({index.row() for index in self.selectionModel().selectedRows()})
+        return [self.record_id_at(row) for row in rows]
+
     def load_state(self):
         """Загрузить состояние таблицы - УЛУЧШЕННАЯ ВЕРСИЯ"""
         try: